@@ -0,0 +1,254 @@
+#!/usr/bin/env python
+'''
+Last updated: 2026-Oct-17
+
+Offline processing benchmark on deterministic synthetic datasets sized like the real ones:
+    - SPAD: acquisition folders of RAW<n>.bin files of 1000 packed 512x512 1-bit frames each, with the
+      DONE footer, of a low-light scene (photon probability 0.5% to 30% per frame),
+    - stereo: ZED2-sized (1280x720 by default) stereo_left/right_<timestamp>_<id>.png pairs of a
+      textured ground plane, with the right frames offset in time by up to 1 ms.
+The datasets are generated once per size and seed into --data and reused by later runs, so results of
+different commits are measured on the same files.
+
+Timed, for every dataset size (and worker count where it applies):
+    decode          unpack_frames() of all the frames, in chunks of 1000 (spad_reader.py)
+    decode_loop     one np.unpackbits per frame, as the display loops of the capture scripts did
+    aggregate       count_photons() of consecutive 255-frame windows (digitize_bin.py)
+    digitize        digitize_acquisition() to 8-bit PNGs
+    pairing         build_pairs() by ID and by timestamp, scanning the folders (stereo_index.py)
+    disparity       compute_disparity() of every pair, per method, in this process
+    disparity_maps  compute_disparity_maps() into a disparity volume, per method (disparity.py)
+    color_code      color_code_disparity() of every map
+
+The in-process measurements (decode, decode_loop, aggregate, disparity, color_code) are run once
+untimed, so that none of them is measured on cold pages, and the fastest of --repeats runs is kept.
+The others (pools of worker processes, folder scans) are timed end to end, once.
+
+Results are printed and written as JSON (--json) with the commit, versions and settings. Given the
+JSON of another run (--baseline), the speedup of every measurement is printed as well.
+
+Example:
+    python bench_offline.py --bin-files 1 4 --pairs 20 100 --workers 1 4 --json bench_offline.json
+    python bench_offline.py --bin-files 1 4 --pairs 20 100 --workers 1 4 --baseline bench_offline.json
+
+'''
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import subprocess
+import contextlib
+import cv2
+import numpy as np
+
+from stereo_index import build_pairs
+from disparity import create_matcher, compute_disparity, compute_disparity_maps, color_code_disparity, load_pair
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "spad512-reader"))
+from spad_reader import open_acquisition, unpack_frames, FRAME_BYTES, FOOTER
+from digitize_bin import count_photons, digitize_acquisition
+
+LOCAL_DIR = os.path.dirname(os.path.abspath(__file__))
+FRAMES_PER_FILE = 1000
+STEREO_FPS = 15
+COMPLETE = ".complete" # written last, so an interrupted generation is started again
+
+## ------- SYNTHETIC DATASETS -------
+def make_spad_dataset(folder, n_files, seed=0):
+    """Acquisition folder of n_files RAW .bin files of 1000 frames with DONE footers"""
+    if os.path.exists(os.path.join(folder, COMPLETE)):
+        return folder
+    shutil.rmtree(folder, ignore_errors=True)
+    os.makedirs(folder)
+
+    y, x = np.mgrid[0:512, 0:512].astype(np.float32)
+    disk = ((x - 300)**2 + (y - 220)**2 < 120**2).astype(np.float32) # lit crater rim
+    probability = 0.005 + 0.05 * x / 512 + 0.25 * disk * (0.5 + 0.5 * np.sin(x / 9) * np.cos(y / 13))
+    rng = np.random.default_rng(seed)
+    for k in range(n_files):
+        with open(os.path.join(folder, f"RAW{k:05d}.bin"), 'wb') as f:
+            for _ in range(0, FRAMES_PER_FILE, 100):
+                f.write(np.packbits(rng.random((100, 512, 512), dtype=np.float32) < probability, axis=-1).tobytes())
+            f.write(FOOTER)
+    open(os.path.join(folder, COMPLETE), 'w').close()
+    return folder
+
+def make_stereo_dataset(folder, n_pairs, width=1280, height=720, seed=0):
+    """left/ and right/ folders of n_pairs ZED2-style grayscale PNG pairs"""
+    if os.path.exists(os.path.join(folder, COMPLETE)):
+        return os.path.join(folder, "left"), os.path.join(folder, "right")
+    shutil.rmtree(folder, ignore_errors=True)
+    for side in ("left", "right"):
+        os.makedirs(os.path.join(folder, side))
+
+    rng = np.random.default_rng(seed)
+    # texture larger than a frame, the camera moves over it from pair to pair
+    coarse = cv2.resize(rng.random(((height + 64) // 8, (width + 2 * n_pairs + 64) // 8), dtype=np.float32),
+                        (width + 2 * n_pairs + 64, height + 64), interpolation=cv2.INTER_CUBIC)
+    texture = np.clip(160 * coarse + rng.normal(0, 20, coarse.shape), 0, 255).astype(np.float32)
+    # ground plane: disparity grows from 4 px at the top to 60 px at the bottom
+    disparity = np.linspace(4, 60, height, dtype=np.float32)[:, np.newaxis] + np.zeros((1, width), dtype=np.float32)
+    map_y, map_x = np.mgrid[0:height, 0:width].astype(np.float32)
+
+    t0 = 1726830927.0
+    for i in range(n_pairs):
+        left = texture[32:32 + height, 2 * i + 32:2 * i + 32 + width]
+        right = cv2.remap(left, map_x + disparity, map_y, cv2.INTER_LINEAR, borderMode=cv2.BORDER_REFLECT)
+        for side, image, t in (("left", left, t0 + i / STEREO_FPS), ("right", right, t0 + i / STEREO_FPS + rng.uniform(0, 0.001))):
+            sec, frac = f"{t:.9f}".split(".")
+            cv2.imwrite(os.path.join(folder, side, f"stereo_{side}_{sec}.{frac}_{i}.png"), image.astype(np.uint8))
+    open(os.path.join(folder, COMPLETE), 'w').close()
+    return os.path.join(folder, "left"), os.path.join(folder, "right")
+
+## ------- BENCHMARKS -------
+def timed(fn, *args, repeats=1, warmup=False, **kwargs):
+    """
+    (seconds, result) of fn, with its printed output discarded: the fastest of repeats runs, after an
+    untimed run if warmup (so the first measurement does not pay for cold pages and caches)
+    """
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        if warmup:
+            fn(*args, **kwargs)
+        best = None
+        for _ in range(max(repeats, 1)):
+            start = time.perf_counter()
+            result = fn(*args, **kwargs)
+            seconds = time.perf_counter() - start
+            best = seconds if best is None else min(best, seconds)
+        return best, result
+
+def record(results, benchmark, size, seconds, items, unit, workers=None, method=None, mbytes=None):
+    r = {'benchmark': benchmark, 'size': size, 'workers': workers, 'method': method,
+         'seconds': seconds, 'items': items, 'unit': unit, 'per_second': items / max(seconds, 1e-9)}
+    if mbytes is not None:
+        r['mb_per_s'] = mbytes / max(seconds, 1e-9)
+    results.append(r)
+    print(f"   {benchmark:<15} {size:>6} {method or '':<9} {'' if workers is None else workers:>3}  "
+          f"{seconds * 1000:10.1f} ms  {r['per_second']:10.1f} {unit}/s" + (f"  {r['mb_per_s']:8.1f} MB/s" if mbytes is not None else ""))
+
+def bench_spad(folder, size, workers_list, work_dir, results, repeats=3):
+    with open_acquisition(folder) as acq:
+        n_frames = len(acq)
+        mbytes = n_frames * FRAME_BYTES / 1e6
+
+        def decode():
+            for _, packed in acq.iter_chunks(FRAMES_PER_FILE):
+                unpack_frames(packed)
+        record(results, 'decode', size, timed(decode, repeats=repeats, warmup=True)[0], n_frames, "frames", mbytes=mbytes)
+
+        def decode_loop():
+            for s, packed in acq.iter_chunks(FRAMES_PER_FILE):
+                data = packed.reshape(-1)
+                for i in range(len(packed)):
+                    np.unpackbits(np.array(data[i*512*64:(i+1)*512*64], dtype="uint8")).reshape(512, 512)
+        record(results, 'decode_loop', size, timed(decode_loop, repeats=repeats, warmup=True)[0], n_frames, "frames", mbytes=mbytes)
+
+        def aggregate():
+            for s in range(0, n_frames - 254, 255):
+                count_photons(acq.window(s, s + 255))
+        images = n_frames // 255
+        record(results, 'aggregate', size, timed(aggregate, repeats=repeats, warmup=True)[0], images, "images", mbytes=images * 255 * FRAME_BYTES / 1e6)
+
+    for workers in workers_list:
+        output = os.path.join(work_dir, f"png_{size}_{workers}")
+        seconds, written = timed(digitize_acquisition, folder, 8, output, workers)
+        record(results, 'digitize', size, seconds, written, "images", workers=workers, mbytes=written * 255 * FRAME_BYTES / 1e6)
+        shutil.rmtree(output, ignore_errors=True)
+
+def bench_stereo(left_dir, right_dir, size, methods, workers_list, work_dir, results, repeats=3):
+    manifest = os.path.join(work_dir, "stereo_manifest.npz")
+    for mode in ("id", "timestamp"):
+        seconds, (pairs, _) = timed(build_pairs, left_dir, right_dir, mode, manifest=manifest, refresh=True, verbose=False)
+        record(results, 'pairing', size, seconds, len(pairs), "pairs", method=mode)
+
+    images = [load_pair(pair) for pair in pairs]
+    for method in methods:
+        stereo = create_matcher(method)
+        def disparity():
+            return [compute_disparity(stereo, left_img, right_img) for left_img, right_img in images]
+        seconds, maps = timed(disparity, repeats=repeats, warmup=True)
+        record(results, 'disparity', size, seconds, len(images), "pairs", method=method)
+
+        for workers in workers_list:
+            output = os.path.join(work_dir, f"disparity_{size}_{method}_{workers}")
+            seconds, _ = timed(compute_disparity_maps, left_dir, right_dir, output, method, workers,
+                               volume=os.path.join(output, "volume.npy"), recompute=True)
+            record(results, 'disparity_maps', size, seconds, len(pairs), "pairs", workers=workers, method=method)
+            shutil.rmtree(output, ignore_errors=True)
+
+    colored = os.path.join(work_dir, "colored_disparity")
+    def color_code():
+        for i, disparity_map in enumerate(maps):
+            color_code_disparity(disparity_map, i, colored)
+    record(results, 'color_code', size, timed(color_code, repeats=repeats, warmup=True)[0], len(maps), "maps")
+    shutil.rmtree(colored, ignore_errors=True)
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=LOCAL_DIR, capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {'commit': commit, 'time': time.time(), 'python': platform.python_version(), 'numpy': np.__version__,
+            'opencv': cv2.__version__, 'platform': platform.platform(), 'cpus': os.cpu_count()}
+
+def compare(results, baseline_path):
+    """Prints the speedup of every measurement also found in a previous run's JSON"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    key = lambda r: (r['benchmark'], r['size'], r['workers'], r['method'])
+    previous = {key(r): r for r in baseline['results']}
+    print(f"Speedup against {baseline_path} (commit {baseline['environment'].get('commit')}):")
+    for r in results:
+        b = previous.get(key(r))
+        if b is not None:
+            print(f"   {r['benchmark']:<15} {r['size']:>6} {r['method'] or '':<9} {'' if r['workers'] is None else r['workers']:>3}  "
+                  f"{b['seconds'] / max(r['seconds'], 1e-9):6.2f}x")
+
+def main():
+    parser = argparse.ArgumentParser(description="user input")
+    parser.add_argument('--bin-files', type=int, nargs='*', help="SPAD dataset sizes, in .bin files of 1000 frames", required=False, default=[1, 4])
+    parser.add_argument('--pairs', type=int, nargs='*', help="Stereo dataset sizes, in pairs", required=False, default=[20, 100])
+    parser.add_argument('--stereo-size', type=int, nargs=2, help="Width and height of the stereo images", required=False, default=[1280, 720])
+    parser.add_argument('-m', '--methods', type=str, nargs='+', help="Disparity methods", required=False, default=["SBM", "SGBM"])
+    parser.add_argument('-w', '--workers', type=int, nargs='+', help="Worker counts of the parallel stages", required=False, default=[1, 4])
+    parser.add_argument('-r', '--repeats', type=int, help="Runs of the in-process measurements after a warm-up run (the fastest is kept)", required=False, default=3)
+    parser.add_argument('--seed', type=int, help="Seed of the synthetic datasets", required=False, default=0)
+    parser.add_argument('--data', type=str, help="Folder of the synthetic datasets (kept between runs)", required=False,
+                        default=os.path.join(tempfile.gettempdir(), "spice_bench_data"))
+    parser.add_argument('--json', type=str, help="Write the results to this JSON file", required=False, default=None)
+    parser.add_argument('--baseline', type=str, help="JSON of a previous run to compare against", required=False, default=None)
+
+    args = parser.parse_args()
+
+    results = []
+    work_dir = tempfile.mkdtemp(prefix="spice_bench_")
+    try:
+        for n in args.bin_files:
+            start = time.perf_counter()
+            folder = make_spad_dataset(os.path.join(args.data, f"spad_{n}files_seed{args.seed}"), n, args.seed)
+            print(f"SPAD dataset: {n} x {FRAMES_PER_FILE} frames ({time.perf_counter() - start:.1f} s to prepare)")
+            bench_spad(folder, n * FRAMES_PER_FILE, args.workers, work_dir, results, args.repeats)
+
+        width, height = args.stereo_size
+        for n in args.pairs:
+            start = time.perf_counter()
+            left_dir, right_dir = make_stereo_dataset(os.path.join(args.data, f"stereo_{n}pairs_{width}x{height}_seed{args.seed}"),
+                                                      n, width, height, args.seed)
+            print(f"Stereo dataset: {n} pairs of {width}x{height} ({time.perf_counter() - start:.1f} s to prepare)")
+            bench_stereo(left_dir, right_dir, n, args.methods, args.workers, work_dir, results, args.repeats)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'environment': environment(), 'settings': vars(args), 'results': results}, f, indent=2)
+        print(f"Results saved as '{args.json}'")
+    if args.baseline:
+        compare(results, args.baseline)
+
+if __name__ == "__main__":
+    main()
@@ -1,101 +1,481 @@
 #!/usr/bin/env python
 '''
-Last updated: 2024-Oct-05
+Last updated: 2026-Oct-17
+
+Computes disparity maps for the ZED2 stereo pairs of a trajectory.
+
+Pairs can be processed by a pool of worker processes (--workers). Each worker builds its matcher once
+per method and parameter set and reuses it for all of its pairs, and writes its outputs directly.
+Every pair is processed independently with the same parameters, so the outputs do not depend on the
+number of workers.
+
+Within a worker, the next pairs are decoded and the previous outputs encoded on threads while the
+current pair is matched (--prefetch, see pipeline.py). The time spent decoding, computing and encoding
+is reported per stage.
 '''
 import os
-import re
-import sys
+import time
+import argparse
 import cv2
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 
-def compute_disparity_maps(left_dir, right_dir, output_dir='disparity_map', method = "SBM") -> None:
+from stereo_index import build_pairs
+from pipeline import run_pipeline, run_sequential
+from metrics import Metrics
+from disparity_volume import DisparityVolume
+from disparity_cache import CACHE_NAME, DisparityCache, matcher_signature, pair_key
+
+# Matchers already built in this process, by method and parameters
+_MATCHERS = {}
+
+def create_matcher(method="SBM", nDispFactor=None):
+    """
+    Creates the StereoBM (SBM), StereoSGBM (SGBM) or coarse-to-fine SGBM (PYRAMID) object used for all
+    the pairs. nDispFactor widens the full search range (in steps of 16 disparities), default 1 (SBM),
+    2 (SGBM) or 8 (PYRAMID).
+    """
+    if method == "SBM":
+        # Create a StereoBM object
+        window_size = 15
+        nDispFactor = nDispFactor or 1
+        stereo = cv2.StereoBM_create(numDisparities=16*nDispFactor, blockSize=window_size)
+
+    elif method == "SGBM":
+        # Semi-Global Matching Method (SGM/SGBM)
+        window_size = 15
+        min_disp = 16
+        nDispFactor = nDispFactor or 2
+        num_disp = 16*nDispFactor-min_disp
+        stereo = cv2.StereoSGBM_create(minDisparity = min_disp,
+                                       numDisparities = num_disp,
+                                       blockSize = window_size,
+                                       P1 = 8*3*window_size**2,
+                                       P2 = 32*3*window_size**2,
+                                       disp12MaxDiff = 1,
+                                       uniquenessRatio = 15,
+                                       speckleWindowSize = 100,
+                                       speckleRange = 2,
+                                       preFilterCap = 63,
+                                       mode=cv2.STEREO_SGBM_MODE_SGBM)
+
+    elif method == "PYRAMID":
+        stereo = PyramidMatcher(nDispFactor or 8)
+
+    else:
+        raise ValueError(f"No method called {method}. Choose either SBM, SGBM or PYRAMID.")
+
+    return stereo
+
+class PyramidMatcher:
+    """
+    Coarse-to-fine SGBM with the interface of the OpenCV matchers (compute, get/setMinDisparity,
+    get/setNumDisparities, which set the full search range).
+
+    The pair is first matched after `levels` pyrDown steps over the full range (scaled down). The
+    coarse disparity is upsampled and, for every tile of tile x tile pixels, the full-resolution
+    search is limited to the band it covers plus margin coarse pixels. Tiles are matched with the
+    context the matcher needs around them, so memory is bounded by the tile size, and tiles without
+    any valid coarse disparity are searched over the full range. Invalid pixels come back as
+    (minDisparity - 1) * 16, as with StereoSGBM.
+
+    The coarse pass only pays off over a wide search range: below min_disparities (80, measured with
+    bench_offline.py's synthetic pairs at 640x360 and 1280x720) the pair is matched with plain SGBM.
+    """
+
+    def __init__(self, nDispFactor=8, levels=1, tile=256, margin=2, min_disparities=80):
+        self.fine = create_matcher("SGBM", nDispFactor)
+        self.coarse = create_matcher("SGBM", nDispFactor)
+        self.min_disp = self.fine.getMinDisparity()
+        self.num_disp = self.fine.getNumDisparities()
+        self.levels = levels
+        self.tile = tile
+        self.margin = margin
+        self.min_disparities = min_disparities
+
+    def getMinDisparity(self):
+        return self.min_disp
+
+    def getNumDisparities(self):
+        return self.num_disp
+
+    def setMinDisparity(self, min_disp):
+        self.min_disp = min_disp
+
+    def setNumDisparities(self, num_disp):
+        self.num_disp = num_disp
+
+    def coarse_disparity(self, left_img, right_img):
+        """Coarse disparity in full-resolution pixels, upsampled to the image size (NaN where invalid)"""
+        scale = 2 ** self.levels
+        for _ in range(self.levels):
+            left_img, right_img = cv2.pyrDown(left_img), cv2.pyrDown(right_img)
+
+        min_disp = self.min_disp // scale
+        self.coarse.setMinDisparity(min_disp)
+        self.coarse.setNumDisparities(16 * int(np.ceil(self.num_disp / scale / 16)))
+        coarse = self.coarse.compute(left_img, right_img)
+
+        coarse_px = coarse.astype(np.float32) * (scale / 16)
+        coarse_px[coarse < 16 * min_disp] = np.nan
+        return coarse_px
+
+    def compute(self, left_img, right_img):
+        if self.num_disp < self.min_disparities:
+            self.fine.setMinDisparity(self.min_disp)
+            self.fine.setNumDisparities(self.num_disp)
+            return self.fine.compute(left_img, right_img)
+
+        height, width = left_img.shape[:2]
+        coarse = cv2.resize(self.coarse_disparity(left_img, right_img), (width, height), interpolation=cv2.INTER_NEAREST)
+
+        scale = 2 ** self.levels
+        full_min, full_max = self.min_disp, self.min_disp + self.num_disp
+        context = self.fine.getBlockSize() // 2 + 1
+        disparity_map = np.full((height, width), 16 * (full_min - 1), dtype=np.int16)
+
+        for y0 in range(0, height, self.tile):
+            for x0 in range(0, width, self.tile):
+                y1, x1 = min(y0 + self.tile, height), min(x0 + self.tile, width)
+                band = coarse[y0:y1, x0:x1]
+                band = band[np.isfinite(band)]
+                if band.size:
+                    low = max(full_min, int(np.floor(band.min() - self.margin * scale)))
+                    high = min(full_max, int(np.ceil(band.max() + self.margin * scale)))
+                    num_disp = min(self.num_disp, 16 * max(1, int(np.ceil((high - low) / 16))))
+                    low = min(low, full_max - num_disp)
+                else:
+                    low, num_disp = full_min, self.num_disp
+
+                # match the tile with the rows around it and the columns its disparities reach
+                ya, yb = max(0, y0 - context), min(height, y1 + context)
+                xa, xb = max(0, x0 - low - num_disp - context), min(width, x1 + context)
+                self.fine.setMinDisparity(low)
+                self.fine.setNumDisparities(num_disp)
+                tile = self.fine.compute(left_img[ya:yb, xa:xb], right_img[ya:yb, xa:xb])
+                tile = tile[y0 - ya:y1 - ya, x0 - xa:x1 - xa]
+                disparity_map[y0:y1, x0:x1] = np.where(tile < 16 * low, 16 * (full_min - 1), tile)
+
+        return disparity_map
+
+def get_matcher(method="SBM", nDispFactor=None):
+    """Returns this process' matcher for the method, creating it on first use"""
+    key = (method, nDispFactor)
+    if key not in _MATCHERS:
+        _MATCHERS[key] = create_matcher(method, nDispFactor)
+    return _MATCHERS[key]
+
+def compute_disparity(stereo, left_img, right_img):
+    """
+    Computes the disparity map of a pair as uint16, with invalid disparities set to 0 for every method.
+    (Invalid SGBM pixels used to be kept at (minDisparity - 1) * 16, i.e. 240 with the default range.)
+    """
+    # Compute the disparity map
+    disparity_map = stereo.compute(left_img, right_img)
+
+    # Invalid pixels come back as (minDisparity - 1) * 16: set them to 0
+    disparity_map[disparity_map < 16 * stereo.getMinDisparity()] = 0
+
+    # Normalize disparity values to be in the range suitable for 16-bit images
+    return np.uint16(disparity_map)
+
+class DisparityRange:
+    """
+    Search range of a matcher narrowed from one pair to the next of a sequence.
+
+    After each pair, the next search covers the band of valid disparities found (percentiles, in
+    pixels) plus margin, rounded out to multiples of 16 and clamped to the matcher's full range.
+    If a narrowed search leaves more than max_increase more invalid pixels than the last full search,
+    the pair is matched again with the full range, which is then used to estimate the next band.
+    """
+
+    def __init__(self, stereo, margin=8, percentiles=(1, 99), max_increase=0.05):
+        self.stereo = stereo
+        self.full = (stereo.getMinDisparity(), stereo.getNumDisparities())
+        self.current = self.full
+        self.margin = margin
+        self.percentiles = percentiles
+        self.max_increase = max_increase
+        self.full_invalid = None # invalid fraction of the last full search
+        self.searched = 0 # disparities searched, to compare with the full range
+        self.fallbacks = 0
+
+    def _set(self, search_range):
+        self.stereo.setMinDisparity(int(search_range[0]))
+        self.stereo.setNumDisparities(int(search_range[1]))
+
+    def restore(self):
+        """Puts the full range back into the (shared) matcher"""
+        self._set(self.full)
+
+    def compute(self, left_img, right_img, metrics=None):
+        """Matches a pair with the current range, falling back to the full range if needed"""
+        self._set(self.current)
+        disparity_map = compute_disparity(self.stereo, left_img, right_img)
+        self.searched += self.current[1]
+        invalid = np.count_nonzero(disparity_map == 0) / disparity_map.size
+
+        if self.current != self.full:
+            if self.full_invalid is None or invalid <= self.full_invalid + self.max_increase:
+                self._update(disparity_map)
+                return disparity_map
+            self.fallbacks += 1
+            self._set(self.full)
+            metrics = metrics or Metrics()
+            disparity_map = metrics.time('fallback_seconds', compute_disparity, self.stereo, left_img, right_img)
+            self.searched += self.full[1]
+            invalid = np.count_nonzero(disparity_map == 0) / disparity_map.size
+
+        self.full_invalid = invalid
+        self._update(disparity_map)
+        return disparity_map
+
+    def _update(self, disparity_map):
+        valid = disparity_map[disparity_map > 0]
+        if valid.size == 0:
+            self.current = self.full
+            return
+        low, high = np.percentile(valid, self.percentiles) / 16
+        full_min, full_num = self.full
+        low = max(full_min, int(np.floor((low - self.margin) / 16)) * 16)
+        high = min(full_min + full_num, int(np.ceil((high + self.margin) / 16)) * 16)
+        self.current = (low, max(16, high - low))
+        if self.current[0] + self.current[1] > full_min + full_num:
+            self.current = (full_min + full_num - self.current[1], self.current[1])
+
+def load_pair(pair):
+    """Loads the left and right images of a (fileID, left path, right path) pair in grayscale"""
+    _, left_image_path, right_image_path = pair
+    left_img = cv2.imread(left_image_path, cv2.IMREAD_GRAYSCALE)
+    right_img = cv2.imread(right_image_path, cv2.IMREAD_GRAYSCALE)
+    return left_img, right_img
+
+def save_disparity(fileID, disparity_map, output_dir):
+    """Saves the disparity map as a 16-bit PNG and its color-coded version"""
+    # Define the output file path for the disparity map
+    disparity_map_filename = os.path.join(output_dir, f'disparity_{fileID}.png')
+    cv2.imwrite(disparity_map_filename, disparity_map)
+
+    color_code_disparity(disparity_map, fileID)
+
+def _process_pairs(args):
+    """
+    Loads, computes and saves a batch of pairs, either one stage after the other or through the
+    prefetching pipeline. With incremental, the search range of each pair is narrowed from the
+    previous one (see DisparityRange). Maps are saved as PNGs in output_dir or, if volume is given,
+    written into that disparity volume. Returns ([(fileID, disparity map or None)], metrics snapshot,
+    (disparities searched, full search disparities, fallbacks)).
+    """
+    pairs, output_dir, method, return_map, prefetch, nDispFactor, incremental, volume = args
+    stereo = get_matcher(method, nDispFactor)
+    volume = DisparityVolume(volume, 'r+') if volume else None
+    search = DisparityRange(stereo) if incremental else None
+    metrics = Metrics()
+
+    def compute(pair, images):
+        left_img, right_img = images
+        if left_img is None or right_img is None:
+            print(f"Error: Could not load image pair ({os.path.basename(pair[1])}, {os.path.basename(pair[2])}). Skipping.")
+            return None
+        if search:
+            return search.compute(left_img, right_img, metrics)
+        return compute_disparity(stereo, left_img, right_img)
+
+    def save(pair, disparity_map):
+        if disparity_map is None:
+            return
+        if volume:
+            volume.write(pair[0], disparity_map)
+        else:
+            save_disparity(pair[0], disparity_map, output_dir)
+
+    if prefetch:
+        stream = run_pipeline(pairs, load_pair, compute, save, prefetch, metrics=metrics)
+    else:
+        stream = run_sequential(pairs, load_pair, compute, save, metrics=metrics)
+
+    results = []
+    try:
+        for pair, disparity_map in stream:
+            if disparity_map is not None:
+                results.append((pair[0], disparity_map if return_map else None))
+    finally:
+        if search:
+            search.restore()
+        if volume:
+            volume.flush()
+
+    full = stereo.getNumDisparities() * len(results)
+    searched = (search.searched, full, search.fallbacks) if search else (full, full, 0)
+    return results, metrics.snapshot(), searched
+
+def _image_size(pairs):
+    """(height, width) of the first left image that can be read"""
+    for _, left_image_path, _ in pairs:
+        left_img = cv2.imread(left_image_path, cv2.IMREAD_GRAYSCALE)
+        if left_img is not None:
+            return left_img.shape[:2]
+    raise ValueError("None of the left images could be loaded.")
+
+def _init_worker():
+    # one process per core already, avoid oversubscribing with OpenCV's own threads
+    cv2.setNumThreads(1)
+
+def compute_disparity_maps(left_dir, right_dir, output_dir='disparity_map', method = "SBM", workers=1,
+                           return_maps=False, batch_size=8, match="id", tolerance=0.005, prefetch=0,
+                           nDispFactor=None, incremental=False, volume=None, recompute=False, content_hash=False,
+                           recolor=False, metrics_path=None, metrics_interval=0):
     """
     Computes disparity maps for multiple stereo image pairs stored in left and right directories.
     Saves the output disparity maps as PNG images in the specified output directory.
+
+    Pairs are matched by frame ID (match="id") or by nearest timestamp within tolerance seconds
+    (match="timestamp"), see stereo_index.py. With workers > 1 the pairs are processed in batches of
+    batch_size by a pool of processes.
+    With prefetch > 0, the next prefetch pairs are decoded on reader threads while the current one is
+    computed, and outputs are encoded by write-behind threads (see pipeline.py).
+    With incremental, the search range of each pair is narrowed from the previous pair's result
+    (see DisparityRange); each batch starts with a full search, so use large batches.
+    With volume (a file name in the output data folder), the maps are written into one memory-mapped
+    disparity volume instead of PNGs, and colorized separately (see disparity_volume.py).
+
+    Pairs whose inputs (size and mtime, or contents with content_hash) and matcher parameters match
+    the output's cache manifest and whose raw output exists are skipped, unless recompute (see
+    disparity_cache.py). Missing color-coded maps of skipped pairs, or all of them with recolor, are
+    made again from the stored raw disparities.
+
+    Stage times and pair counts are printed at the end and, with metrics_path, written as JSON or
+    Prometheus text (see metrics.py), also every metrics_interval s if > 0.
+    Returns a dict {fileID: disparity map} if return_maps, otherwise None.
     """
     output_dir = os.path.join(OUTPUT_DATA_PATH, output_dir)
-    pattern_left = re.compile(r"stereo_left_(\d+).(\d+)_(\d+)\.png")
-    pattern_right = re.compile(r"stereo_right_(\d+).(\d+)_(\d+)\.png")
 
     os.makedirs(output_dir, exist_ok=True)
+    signature = matcher_signature(create_matcher(method, nDispFactor), method, incremental) # also fails early on unknown methods
 
-    # Get a sorted list of filenames in the left directory
-    left_images = sorted(os.listdir(left_dir))
-    right_images = sorted(os.listdir(right_dir))
-
-    # Loop through the left images and process each corresponding pair
-    for left_image_name in left_images:
-        # Extract left_image fileID
-        fileID = pattern_left.match(left_image_name).group(3)
-
-        # Derive the corresponding right image
-        for right_image_name in right_images:
-            rightID = pattern_right.match(right_image_name).group(3)
-            if rightID == fileID:
-                right_image_name = right_image_name
-                break
-            else:
-                right_image_name = None
-
-        # Check if the corresponding right image exists
-        if right_image_name is None:
-            print(f"Warning: No matching right image for {left_image_name}.")
-            sys.exit(1) 
-
-        left_image_path = os.path.join(left_dir, left_image_name)
-        right_image_path = os.path.join(right_dir, right_image_name)
-
-        # Load the left and right images in grayscale
-        left_img = cv2.imread(left_image_path, cv2.IMREAD_GRAYSCALE)
-        right_img = cv2.imread(right_image_path, cv2.IMREAD_GRAYSCALE)
+    # Pair left and right images (by frame ID or nearest timestamp). Frames without a pair are skipped.
+    pairs, unmatched = build_pairs(left_dir, right_dir, match, tolerance)
+    for left_image_name in unmatched['left']:
+        print(f"Warning: No matching right image for {left_image_name}.")
+
+    start = time.perf_counter()
+    if volume:
+        volume = os.path.join(OUTPUT_DATA_PATH, volume)
+        height, width = _image_size(pairs)
+        stored = DisparityVolume.open_or_create(volume, [fileID for fileID, _, _ in pairs], height, width)
+        cache = DisparityCache(os.path.splitext(volume)[0] + "_cache.jsonl")
+    else:
+        stored = None
+        cache = DisparityCache(os.path.join(output_dir, CACHE_NAME))
+
+    # Skip the pairs already saved with the same inputs and parameters
+    keys = {pair[0]: pair_key(pair, signature, content_hash) for pair in pairs}
+    disparity_maps = {}
+    todo, recolored = [], 0
+    for pair in pairs:
+        fileID = pair[0]
+        raw = os.path.join(output_dir, f'disparity_{fileID}.png')
+        colored = os.path.join(OUTPUT_DATA_PATH, 'colored_disparity', f'colordisparity_{fileID}.png')
+        saved = stored.index['written'][stored.position(fileID)] if stored else os.path.exists(raw)
+        if recompute or not saved or not cache.valid(fileID, keys[fileID]):
+            todo.append(pair)
+            continue
+
+        disparity_map = None
+        if stored:
+            disparity_map = stored[fileID] if return_maps else None
+        elif return_maps or recolor or not os.path.exists(colored):
+            disparity_map = cv2.imread(raw, cv2.IMREAD_UNCHANGED)
+            if recolor or not os.path.exists(colored):
+                color_code_disparity(disparity_map, fileID)
+                recolored += 1
+        if return_maps:
+            disparity_maps[fileID] = disparity_map
+    metrics = Metrics()
+    metrics.inc('pairs_skipped', len(pairs) - len(todo))
+    if metrics_path and metrics_interval > 0:
+        metrics.start_periodic(metrics_path, metrics_interval)
+    if len(todo) < len(pairs):
+        print(f"[INFO] {len(pairs) - len(todo)} pairs already saved with the same inputs and parameters, skipped ({recolored} recolored).")
 
+    batches = [(todo[i:i + batch_size], output_dir, method, return_maps, prefetch, nDispFactor, incremental, volume)
+               for i in range(0, len(todo), batch_size)]
+    if workers == 1:
+        results = map(_process_pairs, batches)
+    else:
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+        results = pool.map(_process_pairs, batches)
+
+    processed = 0
+    searched, full, fallbacks = 0, 0, 0
+    for batch, snapshot, search in results:
+        metrics.merge(snapshot)
+        cache.record([(fileID, keys[fileID]) for fileID, _ in batch])
+        metrics.inc('pairs_processed', len(batch))
+        searched, full, fallbacks = searched + search[0], full + search[1], fallbacks + search[2]
+        for fileID, disparity_map in batch:
+            if not volume:
+                print(f"Disparity map saved as '{os.path.join(output_dir, f'disparity_{fileID}.png')}'")
+            processed += 1
+            if return_maps:
+                disparity_maps[fileID] = disparity_map
+
+    if workers != 1:
+        pool.shutdown()
+    cache.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"Processed {processed}/{len(todo)} pairs with {method} in {elapsed:.2f} s "
+          f"({processed / max(elapsed, 1e-9):.2f} pairs/s, {workers or os.cpu_count()} workers, "
+          f"{'prefetch ' + str(prefetch) if prefetch else 'no prefetch'})")
+    if volume:
+        print(f"Disparity volume saved as '{volume}'")
+    if incremental:
+        print(f"Incremental search: {searched / max(full, 1):.0%} of the full range searched, {fallbacks} fallbacks to the full range")
+    print(metrics.report())
+    if metrics_path:
+        metrics.stop_periodic()
+        metrics.set('pairs_per_second', processed / max(elapsed, 1e-9))
+        metrics.write(metrics_path)
+        print(f"Metrics saved as '{metrics_path}'")
+
+    return disparity_maps if return_maps else None
+
+def compare_methods(left_dir, right_dir, reference="SGBM", candidate="PYRAMID", nDispFactor=8, num_pairs=20,
+                    match="id", tolerance=0.005):
+    """
+    Matches num_pairs pairs (evenly spread over the trajectory) with both methods and the same search
+    range, and prints the time per pair, the density (valid pixels) of each method, and the mean
+    error and fraction of bad pixels (> 1 px off) of the candidate where both are valid.
+    """
+    pairs, _ = build_pairs(left_dir, right_dir, match, tolerance, verbose=False)
+    pairs = [pairs[i] for i in np.unique(np.linspace(0, len(pairs) - 1, min(num_pairs, len(pairs))).astype(int))]
+    matchers = {m: create_matcher(m, nDispFactor) for m in (reference, candidate)}
+    times = {m: 0.0 for m in matchers}
+    density = {m: 0.0 for m in matchers}
+    error, bad, compared = 0.0, 0, 0
+
+    for pair in pairs:
+        left_img, right_img = load_pair(pair)
         if left_img is None or right_img is None:
-            print(f"Error: Could not load image pair ({left_image_name}, {right_image_name}). Skipping.")
             continue
+        maps = {}
+        for m, stereo in matchers.items():
+            start = time.perf_counter()
+            maps[m] = compute_disparity(stereo, left_img, right_img)
+            times[m] += time.perf_counter() - start
+            density[m] += np.count_nonzero(maps[m]) / maps[m].size
+        both = (maps[reference] > 0) & (maps[candidate] > 0)
+        diff = np.abs(maps[reference][both].astype(np.float32) - maps[candidate][both]) / 16
+        error += diff.sum()
+        bad += np.count_nonzero(diff > 1)
+        compared += diff.size
 
-        if method == "SBM":
-            # Create a StereoBM object
-            window_size = 15 
-            nDispFactor = 1 
-            stereo = cv2.StereoBM_create(numDisparities=16*nDispFactor, blockSize=window_size)
-        
-        elif method == "SGBM":
-            # Semi-Global Matching Method (SGM/SGBM)
-            window_size = 15
-            min_disp = 16
-            nDispFactor = 2 
-            num_disp = 16*nDispFactor-min_disp
-            stereo = cv2.StereoSGBM_create(minDisparity = min_disp, 
-                                           numDisparities = num_disp,
-                                           blockSize = window_size,
-                                           P1 = 8*3*window_size**2,
-                                           P2 = 32*3*window_size**2,
-                                           disp12MaxDiff = 1,
-                                           uniquenessRatio = 15,
-                                           speckleWindowSize = 100,
-                                           speckleRange = 2, 
-                                           preFilterCap = 63,
-                                           mode=cv2.STEREO_SGBM_MODE_SGBM)
-
-        else: 
-            print("No method called ", "{:s}".format(method), ". Choose either SBM or SGBM.")
-            quit
-
-        # Compute the disparity map
-        disparity_map = stereo.compute(left_img, right_img)
-
-        # Set negative disparity values to 0 to mark them as invalid
-        disparity_map[disparity_map < 0] = 0
-
-        # Normalize disparity values to be in the range suitable for 16-bit images
-        disparity_map = np.uint16(disparity_map)
-
-        # Define the output file path for the disparity map
-        disparity_map_filename = os.path.join(output_dir, f'disparity_{fileID}.png')
-        cv2.imwrite(disparity_map_filename, disparity_map)
-        print(f"Disparity map saved as '{disparity_map_filename}'")
-
-        color_code_disparity(disparity_map, fileID)
+    print(f"{len(pairs)} pairs, {matchers[reference].getNumDisparities()} disparities")
+    for m in matchers:
+        print(f"   {m:<8} {1000 * times[m] / max(len(pairs), 1):8.1f} ms/pair  density {density[m] / max(len(pairs), 1):6.1%}")
+    print(f"   {candidate} vs {reference}: {times[reference] / max(times[candidate], 1e-9):.2f}x faster, "
+          f"mean error {error / max(compared, 1):.3f} px, bad pixels (> 1 px) {bad / max(compared, 1):.2%}")
 
 def color_code_disparity(disparity_map, fileID, output_color_map_path = 'colored_disparity'):
 
@@ -125,4 +505,33 @@ LEFT_IMAGE_PATH = os.path.join(LOCAL_DIR, "./stereo/left")
 RIGT_IMAGE_PATH = os.path.join(LOCAL_DIR, "./stereo/right")
 OUTPUT_DATA_PATH = os.path.join(LOCAL_DIR, "./stereo")
 
-disparity_map = compute_disparity_maps(LEFT_IMAGE_PATH, RIGT_IMAGE_PATH, "disparity_map", "SBM")
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="user input")
+    parser.add_argument('-m', '--method', type=str, help="Matching method (SBM, SGBM or PYRAMID)", required=False, default="SBM")
+    parser.add_argument('-w', '--workers', type=int, help="Number of worker processes (0 = all cores)", required=False, default=1)
+    parser.add_argument('--match', type=str, choices=['id', 'timestamp'], help="Pair left and right images by frame ID or timestamp", required=False, default="id")
+    parser.add_argument('-p', '--prefetch', type=int, help="Pairs decoded ahead while computing (0 = no pipelining)", required=False, default=4)
+    parser.add_argument('-n', '--ndisp', type=int, help="Full search range in multiples of 16 disparities", required=False, default=None)
+    parser.add_argument('-i', '--incremental', action='store_true', help="Narrow the search range of each pair from the previous one")
+    parser.add_argument('-b', '--batch', type=int, help="Pairs per batch (incremental search restarts every batch)", required=False, default=8)
+    parser.add_argument('--tolerance', type=float, help="Max. timestamp difference in s when pairing by timestamp", required=False, default=0.005)
+    parser.add_argument('-v', '--volume', action='store_true', help="Write one memory-mapped disparity volume (disparity_volume.npy) instead of PNGs")
+    parser.add_argument('--recompute', action='store_true', help="Recompute all pairs, even those already saved with the same inputs and parameters")
+    parser.add_argument('--hash', action='store_true', help="Identify input images by a hash of their contents instead of size and mtime")
+    parser.add_argument('--recolor', action='store_true', help="Make the color-coded maps of already saved pairs again from their raw disparities")
+    parser.add_argument('--metrics', type=str, help="Write run metrics to this file (.prom/.txt: Prometheus text, otherwise JSON)", required=False, default=None)
+    parser.add_argument('--metrics-interval', type=float, help="Also write the metrics every this many s (0 = only at the end)", required=False, default=0)
+    parser.add_argument('--compare', type=int, help="Only compare the speed and accuracy of PYRAMID against SGBM on this many pairs", required=False, default=0)
+    args = parser.parse_args()
+
+    if args.compare:
+        compare_methods(LEFT_IMAGE_PATH, RIGT_IMAGE_PATH, nDispFactor=args.ndisp or 8, num_pairs=args.compare,
+                        match=args.match, tolerance=args.tolerance)
+        raise SystemExit
+
+    disparity_map = compute_disparity_maps(LEFT_IMAGE_PATH, RIGT_IMAGE_PATH, "disparity_map", args.method, args.workers or None,
+                                           batch_size=args.batch, match=args.match, tolerance=args.tolerance, prefetch=args.prefetch,
+                                           nDispFactor=args.ndisp, incremental=args.incremental,
+                                           volume="disparity_volume.npy" if args.volume else None,
+                                           recompute=args.recompute, content_hash=args.hash, recolor=args.recolor,
+                                           metrics_path=args.metrics, metrics_interval=args.metrics_interval)
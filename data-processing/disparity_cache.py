@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+'''
+Last updated: 2026-Oct-17
+
+Resumable cache of the disparity maps computed by disparity.py.
+
+Each output folder (or disparity volume) has a manifest, an append-only JSON lines file with one
+record {"id": fileID, "key": key} per pair whose outputs have been saved. The key is a hash of:
+    - the identity of both input images: size and modification time, or a hash of their contents,
+    - the matcher signature: method and every parameter that changes the output.
+A pair is skipped when its key matches the manifest and its raw disparity output still exists, so
+rerunning after a crash resumes where the run stopped, and rerunning with other parameters only
+recomputes what changed. Records are appended once a batch is saved; a truncated last line (crash
+while writing) is ignored.
+
+The key does not cover the colorization: if the color-coded map of a cached pair is missing, it is
+made again from the stored raw disparity without matching the pair.
+
+'''
+import os
+import json
+import hashlib
+
+CACHE_NAME = ".disparity_cache.jsonl"
+
+def file_identity(path, content_hash=False):
+    """'<size>:<mtime ns>' of a file, or 'blake2b:<digest>' of its contents"""
+    if content_hash:
+        h = hashlib.blake2b(digest_size=16)
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        return "blake2b:" + h.hexdigest()
+    st = os.stat(path)
+    return f"{st.st_size}:{st.st_mtime_ns}"
+
+def matcher_signature(stereo, method, incremental=False):
+    """Method and parameters of a matcher, as read back from it (OpenCV matchers or PyramidMatcher)"""
+    params = {'method': method, 'incremental': bool(incremental)}
+    for name in ('MinDisparity', 'NumDisparities', 'BlockSize', 'P1', 'P2', 'Disp12MaxDiff', 'UniquenessRatio',
+                 'SpeckleWindowSize', 'SpeckleRange', 'PreFilterCap', 'Mode', 'TextureThreshold'):
+        getter = getattr(stereo, 'get' + name, None)
+        if getter is not None:
+            params[name] = getter()
+    for name in ('levels', 'tile', 'margin', 'min_disparities'):
+        if hasattr(stereo, name):
+            params[name] = getattr(stereo, name)
+    return params
+
+def pair_key(pair, signature, content_hash=False):
+    """Cache key of a (fileID, left path, right path) pair for a matcher signature"""
+    _, left_image_path, right_image_path = pair
+    identity = [file_identity(left_image_path, content_hash), file_identity(right_image_path, content_hash), signature]
+    return hashlib.sha1(json.dumps(identity, sort_keys=True).encode('utf8')).hexdigest()
+
+class DisparityCache:
+    """Manifest of the pairs already saved in an output folder or volume (last record per ID wins)"""
+
+    def __init__(self, path):
+        self.path = path
+        self.keys = {}
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                        self.keys[record['id']] = record['key']
+                    except (ValueError, KeyError):
+                        pass # truncated or foreign line
+        self._file = None
+
+    def __len__(self):
+        return len(self.keys)
+
+    def valid(self, fileID, key):
+        return self.keys.get(fileID) == key
+
+    def record(self, entries):
+        """Appends (fileID, key) records and flushes them to disk"""
+        if self._file is None:
+            self._file = open(self.path, 'a')
+        for fileID, key in entries:
+            self.keys[fileID] = key
+            self._file.write(json.dumps({'id': fileID, 'key': key}) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
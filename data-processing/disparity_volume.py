@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+'''
+Last updated: 2026-Oct-17
+
+Disparity volume: the disparity maps of a trajectory in one memory-mapped .npy file of shape
+(frames, H, W) uint16, written by disparity.py --volume instead of two PNGs per pair.
+
+Next to it, <name>_index.npy holds one record per frame (frame ID and whether it has been written),
+so frames can be read by position or by ID without decoding anything. Both files are plain .npy
+files, readable with np.load(path, mmap_mode='r').
+
+Colors come from one global lookup table (disparity -> BGR, JET by default) built for a fixed
+maximum disparity, so the same disparity has the same color in every frame. Frames can be colorized
+on demand (colorize) or all at once in a separate pass (colorize_volume, or this script).
+
+Example:
+    volume = DisparityVolume('./stereo/disparity_volume.npy')
+    disparity_map = volume['1234']
+    python disparity_volume.py ./stereo/disparity_volume.npy -o ./stereo/colored_disparity
+
+'''
+import os
+import argparse
+import cv2
+import numpy as np
+
+INDEX_DTYPE = np.dtype([('id', 'U32'), ('written', '?')])
+
+def index_path(path):
+    return os.path.splitext(path)[0] + "_index.npy"
+
+class DisparityVolume:
+    """
+    Memory-mapped disparity volume. mode is 'r' (read only) or 'r+' (to write frames, e.g. from
+    worker processes, each with its own DisparityVolume).
+    """
+
+    def __init__(self, path, mode='r'):
+        self.path = path
+        self.data = np.load(path, mmap_mode=mode)
+        self.index = np.load(index_path(path), mmap_mode=mode)
+        self.ids = self.index['id']
+        self._positions = {fileID: i for i, fileID in enumerate(self.ids.tolist())}
+
+    @classmethod
+    def create(cls, path, file_ids, height, width):
+        """Preallocates a volume for the frame IDs (in order), returns it open for writing"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        data = np.lib.format.open_memmap(path, mode='w+', dtype=np.uint16, shape=(len(file_ids), height, width))
+        del data
+        index = np.lib.format.open_memmap(index_path(path), mode='w+', dtype=INDEX_DTYPE, shape=(len(file_ids),))
+        index['id'] = file_ids
+        index['written'] = False
+        index.flush()
+        del index
+        return cls(path, 'r+')
+
+    @classmethod
+    def open_or_create(cls, path, file_ids, height, width):
+        """Reopens an existing volume for writing if it has the same frame IDs and size, otherwise creates it"""
+        if os.path.exists(path) and os.path.exists(index_path(path)):
+            try:
+                volume = cls(path, 'r+')
+                if volume.data.shape == (len(file_ids), height, width) and volume.ids.tolist() == list(file_ids):
+                    return volume
+            except (OSError, ValueError):
+                pass
+        return cls.create(path, file_ids, height, width)
+
+    def __len__(self):
+        return len(self.data)
+
+    def position(self, fileID):
+        return self._positions[str(fileID)]
+
+    def __getitem__(self, fileID):
+        """Disparity map of a frame ID (a view into the volume)"""
+        return self.data[self.position(fileID)]
+
+    def written(self):
+        """Frame IDs already written"""
+        return self.ids[self.index['written']]
+
+    def write(self, fileID, disparity_map):
+        i = self.position(fileID)
+        self.data[i] = disparity_map
+        self.index['written'][i] = True
+
+    def flush(self):
+        self.data.flush()
+        self.index.flush()
+
+    def max_disparity(self, chunk_frames=64):
+        """Largest disparity in the volume, read in chunks of frames"""
+        return max((int(self.data[i:i + chunk_frames].max()) for i in range(0, len(self), chunk_frames)), default=0)
+
+def global_lut(max_disparity, colormap=cv2.COLORMAP_JET):
+    """(65536, 3) BGR table mapping uint16 disparities in [0, max_disparity] onto the color map"""
+    values = np.arange(65536, dtype=np.float64) * 255 / max(max_disparity, 1)
+    normalized = np.uint8(np.clip(values, 0, 255)).reshape(-1, 1)
+    return cv2.applyColorMap(normalized, colormap).reshape(-1, 3)
+
+def colorize(disparity_map, lut):
+    """BGR image of a uint16 disparity map through a global LUT"""
+    return lut[disparity_map]
+
+def colorize_volume(volume, output_dir, max_disparity=None, colormap=cv2.COLORMAP_JET):
+    """
+    Writes colordisparity_<fileID>.png for every written frame of the volume, all with the same LUT
+    (default maximum: the largest disparity in the volume).
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    lut = global_lut(max_disparity or volume.max_disparity(), colormap)
+    written = 0
+    for i, fileID in enumerate(volume.ids.tolist()):
+        if volume.index['written'][i]:
+            cv2.imwrite(os.path.join(output_dir, f'colordisparity_{fileID}.png'), colorize(volume.data[i], lut))
+            written += 1
+    return written
+
+def main():
+    parser = argparse.ArgumentParser(description="user input")
+    parser.add_argument('volume', type=str, help="Disparity volume (.npy)")
+    parser.add_argument('-o', '--output', type=str, help="Output folder of the color-coded maps", required=False, default=None)
+    parser.add_argument('-x', '--max', type=int, help="Disparity (x16) mapped to the top of the color map (default: volume max.)", required=False, default=None)
+
+    args = parser.parse_args()
+
+    volume = DisparityVolume(args.volume)
+    output_dir = args.output or os.path.join(os.path.dirname(os.path.abspath(args.volume)), 'colored_disparity')
+    written = colorize_volume(volume, output_dir, args.max)
+    print(f"{written}/{len(volume)} color-coded disparity maps saved in '{output_dir}'")
+
+if __name__ == "__main__":
+    main()
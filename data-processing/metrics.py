@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+'''
+Last updated: 2026-Oct-17
+
+Lightweight run metrics shared by the acquisition scripts and disparity.py: histograms (latencies,
+sizes, queue depths), counters and gauges, written at the end of a run or periodically as JSON or
+Prometheus text (node_exporter textfile format).
+
+Histograms use power-of-two buckets, so recording a value is a frexp and a dict update under a lock
+(about a microsecond) and any unit fits: seconds, bytes or items. Quantiles are estimated within a
+factor of two from the buckets; count, sum and max are exact. By convention, names end with the unit
+(e.g. recv_latency_seconds, batch_bytes).
+
+Metrics of other processes (worker pools, the saving process) are merged through snapshot() and
+merge(), which only use plain types and pickle cheaply.
+
+Example:
+    metrics = Metrics()
+    data = metrics.time('recv_latency_seconds', receiver.request)
+    metrics.observe('batch_bytes', len(data))
+    metrics.write('acquisition_metrics.prom')
+
+'''
+import os
+import json
+import math
+import time
+import threading
+
+PROMETHEUS_EXTENSIONS = (".prom", ".txt")
+
+def _bucket(value):
+    """Exponent e of the smallest power of two 2**e >= value (None for values <= 0)"""
+    if value <= 0:
+        return None
+    mantissa, exponent = math.frexp(value)
+    return exponent - 1 if mantissa == 0.5 else exponent
+
+class Metrics:
+    """Thread-safe histograms, counters and gauges of a run"""
+
+    def __init__(self, prefix="spice_"):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self.histograms = {} # name -> {'buckets': {exponent: count}, 'zero': n, 'count': n, 'sum': s, 'max': m}
+        self.counters = {}
+        self.gauges = {}
+        self._periodic = None
+
+    def observe(self, name, value):
+        """Adds a value to a histogram"""
+        e = _bucket(value)
+        with self._lock:
+            h = self.histograms.get(name)
+            if h is None:
+                h = self.histograms[name] = {'buckets': {}, 'zero': 0, 'count': 0, 'sum': 0.0, 'max': 0.0}
+            if e is None:
+                h['zero'] += 1
+            else:
+                h['buckets'][e] = h['buckets'].get(e, 0) + 1
+            h['count'] += 1
+            h['sum'] += value
+            h['max'] = max(h['max'], value)
+
+    def time(self, name, fn, *args):
+        """Calls fn(*args) and adds its duration in s to a histogram"""
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def inc(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def set(self, name, value):
+        with self._lock:
+            self.gauges[name] = value
+
+    def snapshot(self):
+        """Copy of all the metrics as plain dicts (picklable, JSON-serializable once keys are str)"""
+        with self._lock:
+            return {
+                'histograms': {n: {**h, 'buckets': dict(h['buckets'])} for n, h in self.histograms.items()},
+                'counters': dict(self.counters),
+                'gauges': dict(self.gauges),
+            }
+
+    def merge(self, snapshot):
+        """Adds the metrics of another Metrics' snapshot (e.g. from a worker process)"""
+        with self._lock:
+            for name, other in snapshot['histograms'].items():
+                h = self.histograms.setdefault(name, {'buckets': {}, 'zero': 0, 'count': 0, 'sum': 0.0, 'max': 0.0})
+                for e, n in other['buckets'].items():
+                    h['buckets'][int(e)] = h['buckets'].get(int(e), 0) + n
+                h['zero'] += other['zero']
+                h['count'] += other['count']
+                h['sum'] += other['sum']
+                h['max'] = max(h['max'], other['max'])
+            for name, n in snapshot['counters'].items():
+                self.counters[name] = self.counters.get(name, 0) + n
+            self.gauges.update(snapshot['gauges'])
+
+    @staticmethod
+    def quantile(h, q):
+        """Upper bound of the bucket holding the q-quantile of a histogram (capped at its max)"""
+        rank = q * h['count']
+        seen = h['zero']
+        if seen >= rank:
+            return 0.0
+        for e in sorted(h['buckets']):
+            seen += h['buckets'][e]
+            if seen >= rank:
+                return min(2.0 ** e, h['max'])
+        return h['max']
+
+    def report(self):
+        """Text table of the histograms (times in ms) and counters"""
+        snapshot = self.snapshot()
+        lines = []
+        for name, h in snapshot['histograms'].items():
+            scale, unit, label = (1000, "ms", name[:-len("_seconds")]) if name.endswith("_seconds") else (1, "", name)
+            lines.append(f"   {label:<20} {h['count']:>7} x  avg {scale * h['sum'] / max(h['count'], 1):10.2f}{unit:<2}  "
+                         f"p50 {scale * self.quantile(h, 0.5):10.2f}{unit:<2}  p99 {scale * self.quantile(h, 0.99):10.2f}{unit:<2}  "
+                         f"max {scale * h['max']:10.2f}{unit}")
+        for name, n in snapshot['counters'].items():
+            lines.append(f"   {name:<20} {n:>7}")
+        return "\n".join(lines)
+
+    def to_prometheus(self):
+        snapshot = self.snapshot()
+        lines = []
+        for name, h in snapshot['histograms'].items():
+            metric = self.prefix + name
+            lines.append(f"# TYPE {metric} histogram")
+            cumulative = h['zero']
+            lines.append(f'{metric}_bucket{{le="0"}} {cumulative}')
+            for e in sorted(h['buckets']):
+                cumulative += h['buckets'][e]
+                lines.append(f'{metric}_bucket{{le="{2.0 ** e!r}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{le="+Inf"}} {h["count"]}')
+            lines.append(f"{metric}_sum {h['sum']:.9g}")
+            lines.append(f"{metric}_count {h['count']}")
+        for name, n in snapshot['counters'].items():
+            lines.append(f"# TYPE {self.prefix + name}_total counter")
+            lines.append(f"{self.prefix + name}_total {n}")
+        for name, value in snapshot['gauges'].items():
+            lines.append(f"# TYPE {self.prefix + name} gauge")
+            lines.append(f"{self.prefix + name} {value:.9g}")
+        return "\n".join(lines) + "\n"
+
+    def to_json(self):
+        snapshot = self.snapshot()
+        for name, h in snapshot['histograms'].items():
+            h['p50'], h['p90'], h['p99'] = (self.quantile(h, q) for q in (0.5, 0.9, 0.99))
+            h['buckets'] = {repr(2.0 ** e): n for e, n in sorted(h['buckets'].items())}
+        snapshot['time'] = time.time()
+        return json.dumps(snapshot, indent=2)
+
+    def write(self, path):
+        """Writes the metrics as Prometheus text (.prom, .txt) or JSON (any other extension), atomically"""
+        text = self.to_prometheus() if path.endswith(PROMETHEUS_EXTENSIONS) else self.to_json()
+        tmp = path + ".tmp"
+        with open(tmp, 'w') as f:
+            f.write(text)
+        os.replace(tmp, path)
+
+    def start_periodic(self, path, interval):
+        """Writes the metrics every interval s from a background thread until stop_periodic()"""
+        stop = threading.Event()
+
+        def run():
+            while not stop.wait(interval):
+                self.write(path)
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        self._periodic = (stop, thread)
+
+    def stop_periodic(self):
+        if self._periodic is not None:
+            stop, thread = self._periodic
+            stop.set()
+            thread.join()
+            self._periodic = None
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+'''
+Last updated: 2026-Oct-17
+
+Streaming pipeline used by disparity.py to overlap image decoding, disparity computation and image
+encoding, which would otherwise take turns on the CPU and the disk:
+
+    reader threads  --(next K decoded items)-->  compute (caller thread)  -->  write-behind threads
+
+OpenCV releases the GIL while reading, computing and writing images, so threads are enough to keep
+all the stages busy. The number of items decoded ahead (prefetch) and of pending writes are bounded,
+so memory stays bounded too. Every stage is timed into a Metrics histogram (see metrics.py).
+
+'''
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import Metrics
+
+def run_sequential(items, load, compute, save, metrics=None):
+    """Same as run_pipeline() but one stage after the other on the calling thread"""
+    metrics = metrics or Metrics()
+    for item in items:
+        loaded = metrics.time('decode_seconds', load, item)
+        result = metrics.time('compute_seconds', compute, item, loaded)
+        metrics.time('encode_seconds', save, item, result)
+        yield item, result
+
+def run_pipeline(items, load, compute, save, prefetch=4, readers=2, writers=2, metrics=None):
+    """
+    For each item, in order: load(item) on a reader thread (up to prefetch items ahead),
+    compute(item, loaded) on the calling thread, then save(item, result) on a writer thread.
+    Yields (item, result) in order. The stages are timed as decode_seconds, compute_seconds and
+    encode_seconds, and the time the caller waits for a decoded item or for a free writer as
+    wait_decode_seconds and wait_encode_seconds.
+    """
+    metrics = metrics or Metrics()
+    items = iter(items)
+    pending_loads = deque()
+    pending_saves = deque()
+    max_pending_saves = 2 * writers
+
+    with ThreadPoolExecutor(readers) as read_pool, ThreadPoolExecutor(writers) as write_pool:
+
+        def fill():
+            while len(pending_loads) < prefetch:
+                item = next(items, None)
+                if item is None:
+                    return
+                pending_loads.append((item, read_pool.submit(metrics.time, 'decode_seconds', load, item)))
+
+        fill()
+        while pending_loads:
+            item, future = pending_loads.popleft()
+            loaded = metrics.time('wait_decode_seconds', future.result)
+            fill()
+
+            result = metrics.time('compute_seconds', compute, item, loaded)
+
+            # write-behind, bounded: wait for the oldest write if too many are pending
+            while len(pending_saves) >= max_pending_saves:
+                metrics.time('wait_encode_seconds', pending_saves.popleft().result)
+            pending_saves.append(write_pool.submit(metrics.time, 'encode_seconds', save, item, result))
+
+            yield item, result
+
+        while pending_saves:
+            metrics.time('wait_encode_seconds', pending_saves.popleft().result)
@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+'''
+Last updated: 2026-Oct-17
+
+Index of the ZED2 stereo frames of a trajectory (stereo_{left,right}_<timestamp>_<id>.png).
+
+Each folder is scanned once into arrays of file names, timestamps (integer ns) and frame IDs sorted by
+ID. Left and right frames are then paired either by ID or by nearest timestamp within a tolerance, using
+sorted searches (O(n log n)) instead of comparing every left frame against every right frame.
+
+As in clean_delayed_frames.m, frames whose timestamp goes back in time when sorted by ID are flagged
+as delayed. Gaps larger than gap_factor times the median frame period are flagged as well.
+
+The scan is cached in a manifest (.npz) next to the images, valid as long as neither folder changes,
+so later runs do not need to list or parse the folders again.
+
+Example:
+    pairs, unmatched = build_pairs('./stereo/left', './stereo/right', mode='timestamp', tolerance=0.005)
+
+'''
+import os
+import re
+import numpy as np
+
+FRAME_PATTERN = re.compile(r"stereo_(left|right)_(\d+)\.(\d+)_(\d+)\.png$")
+MANIFEST_NAME = ".stereo_manifest.npz"
+
+def parse_timestamp(sec, frac):
+    """'1726830927', '999999046' -> 1726830927999999046 ns"""
+    return int(sec) * 1_000_000_000 + int(frac[:9].ljust(9, '0'))
+
+def scan_folder(folder, side):
+    """
+    Lists the stereo_<side>_*.png files of a folder. Returns a dict of arrays sorted by frame ID:
+    names, timestamps (ns), ids.
+    """
+    names, timestamps, ids = [], [], []
+    for name in os.listdir(folder):
+        m = FRAME_PATTERN.match(name)
+        if m is None or m.group(1) != side:
+            continue
+        names.append(name)
+        timestamps.append(parse_timestamp(m.group(2), m.group(3)))
+        ids.append(int(m.group(4)))
+
+    ids = np.array(ids, dtype=np.int64)
+    order = np.argsort(ids, kind='stable')
+    return {
+        'names': np.array(names, dtype=str)[order],
+        'timestamps': np.array(timestamps, dtype=np.int64)[order],
+        'ids': ids[order],
+    }
+
+def flag_frames(frames, gap_factor=1.5):
+    """
+    Flags frames (sorted by ID) whose timestamp is earlier than the previous frame's (delayed) and
+    frames that follow a gap larger than gap_factor times the median frame period (gap).
+    """
+    dt = np.diff(frames['timestamps'])
+    delayed = np.concatenate(([False], dt < 0))
+    positive = dt[dt > 0]
+    period = np.median(positive) if len(positive) else 0
+    gap = np.concatenate(([False], dt > gap_factor * period)) if period else np.zeros(len(delayed), dtype=bool)
+    return {'delayed': delayed, 'gap': gap, 'period_ns': int(period)}
+
+def pair_by_id(left, right):
+    """Indices (into left and right) of the frames with the same ID"""
+    _, li, ri = np.intersect1d(left['ids'], right['ids'], assume_unique=False, return_indices=True)
+    return li, ri
+
+def pair_by_timestamp(left, right, tolerance_ns):
+    """
+    Indices (into left and right) of the frames paired by nearest timestamp within tolerance_ns. Each
+    right frame is used at most once; if several left frames share the same nearest right frame, the
+    closest one keeps it.
+    """
+    order = np.argsort(right['timestamps'], kind='stable')
+    rts = right['timestamps'][order]
+    lts = left['timestamps']
+    if not len(rts) or not len(lts):
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    pos = np.searchsorted(rts, lts)
+    before = np.clip(pos - 1, 0, len(rts) - 1)
+    after = np.clip(pos, 0, len(rts) - 1)
+    use_after = np.abs(rts[after] - lts) < np.abs(rts[before] - lts)
+    nearest = np.where(use_after, after, before)
+    error = np.abs(rts[nearest] - lts)
+
+    li = np.flatnonzero(error <= tolerance_ns)
+    ri = nearest[li]
+
+    # one left frame per right frame: keep the closest
+    keep = np.lexsort((error[li], ri))
+    ri_sorted = ri[keep]
+    first = np.concatenate(([True], ri_sorted[1:] != ri_sorted[:-1]))
+    li, ri = li[keep][first], ri_sorted[first]
+
+    back = np.argsort(li)
+    return li[back], order[ri[back]]
+
+def _signature(folder):
+    return os.stat(folder).st_mtime_ns
+
+def load_or_scan(left_dir, right_dir, manifest=None, refresh=False):
+    """
+    Returns (left, right) frame arrays, from the manifest if it is up to date, otherwise by scanning
+    both folders and saving a new manifest (default: <left_dir>/../.stereo_manifest.npz).
+    """
+    if manifest is None:
+        manifest = os.path.join(os.path.dirname(os.path.abspath(left_dir)), MANIFEST_NAME)
+    signature = np.array([_signature(left_dir), _signature(right_dir)], dtype=np.int64)
+
+    if not refresh and os.path.exists(manifest):
+        try:
+            with np.load(manifest) as m:
+                if np.array_equal(m['signature'], signature):
+                    left = {k: m['left_' + k] for k in ('names', 'timestamps', 'ids')}
+                    right = {k: m['right_' + k] for k in ('names', 'timestamps', 'ids')}
+                    return left, right
+        except (OSError, KeyError, ValueError):
+            pass # unreadable or old manifest, scan again
+
+    left = scan_folder(left_dir, 'left')
+    right = scan_folder(right_dir, 'right')
+    try:
+        np.savez(manifest, signature=signature,
+                 **{'left_' + k: v for k, v in left.items()},
+                 **{'right_' + k: v for k, v in right.items()})
+    except OSError as e:
+        print(f"Warning: could not save stereo manifest '{manifest}': {e}")
+    return left, right
+
+def file_id(name):
+    """Frame ID of a file name as written in the name (stereo_left_<ts>_<id>.png -> '<id>')"""
+    return os.path.splitext(name)[0].rsplit('_', 1)[1]
+
+def build_pairs(left_dir, right_dir, mode="id", tolerance=0.005, manifest=None, refresh=False, verbose=True):
+    """
+    Pairs the left and right frames of a trajectory by 'id' or by 'timestamp' (nearest within
+    tolerance seconds). Returns (pairs, unmatched):
+        pairs     - list of (fileID, left path, right path) sorted by left frame ID
+        unmatched - dict with the names of the left and right frames without a pair
+    """
+    left, right = load_or_scan(left_dir, right_dir, manifest, refresh)
+
+    if mode == "id":
+        li, ri = pair_by_id(left, right)
+    elif mode == "timestamp":
+        li, ri = pair_by_timestamp(left, right, int(round(tolerance * 1e9)))
+    else:
+        raise ValueError(f"Unknown pairing mode '{mode}'. Choose either id or timestamp.")
+
+    pairs = [(file_id(ln), os.path.join(left_dir, ln), os.path.join(right_dir, rn))
+             for ln, rn in zip(left['names'][li].tolist(), right['names'][ri].tolist())]
+
+    unmatched = {
+        'left': np.delete(left['names'], li).tolist(),
+        'right': np.delete(right['names'], ri).tolist(),
+    }
+
+    if verbose:
+        lf, rf = flag_frames(left), flag_frames(right)
+        print(f"[INFO] {len(left['names'])} left and {len(right['names'])} right frames, {len(pairs)} pairs ({mode}).")
+        if unmatched['left'] or unmatched['right']:
+            print(f"[WARNING] {len(unmatched['left'])} left and {len(unmatched['right'])} right frames without a pair.")
+        if lf['delayed'].any() or rf['delayed'].any():
+            print(f"[WARNING] Delayed (out-of-order) frames: {int(lf['delayed'].sum())} left, {int(rf['delayed'].sum())} right.")
+        if lf['gap'].any() or rf['gap'].any():
+            print(f"[INFO] Frame gaps: {int(lf['gap'].sum())} left, {int(rf['gap'].sum())} right.")
+
+    return pairs, unmatched
@@ -0,0 +1,49 @@
+import os
+import json
+import numpy as np
+
+from bench_offline import make_spad_dataset, make_stereo_dataset, timed, record, compare, FRAMES_PER_FILE
+from stereo_index import build_pairs
+from spad_reader import open_acquisition
+
+def test_spad_dataset(tmp_path):
+    folder = make_spad_dataset(str(tmp_path / "spad"), 1)
+    with open_acquisition(folder) as acq:
+        assert len(acq) == FRAMES_PER_FILE
+        density = np.unpackbits(acq.window(0, 10)).mean()
+    assert 0.005 < density < 0.3
+    # generated once: a second call reuses the files
+    mtime = os.path.getmtime(os.path.join(folder, "RAW00000.bin"))
+    make_spad_dataset(folder, 1)
+    assert os.path.getmtime(os.path.join(folder, "RAW00000.bin")) == mtime
+
+def test_stereo_dataset(tmp_path):
+    left_dir, right_dir = make_stereo_dataset(str(tmp_path / "a"), 6, width=160, height=120)
+    other, _ = make_stereo_dataset(str(tmp_path / "b"), 6, width=160, height=120)
+    assert sorted(os.listdir(left_dir)) == sorted(os.listdir(other)) # deterministic
+    by_id, _ = build_pairs(left_dir, right_dir, "id", manifest=str(tmp_path / "id.npz"))
+    by_timestamp, unmatched = build_pairs(left_dir, right_dir, "timestamp", 0.005, manifest=str(tmp_path / "ts.npz"))
+    assert by_timestamp == by_id and len(by_id) == 6
+    assert unmatched == {'left': [], 'right': []}
+
+def test_timed():
+    calls = []
+    def work(x, scale=1):
+        calls.append(x)
+        print("not shown")
+        return x * scale
+    seconds, result = timed(work, 3, scale=2, repeats=3, warmup=True)
+    assert result == 6 and len(calls) == 4 and seconds >= 0
+
+def test_compare(tmp_path, capsys):
+    baseline, results = [], []
+    record(baseline, "decode", 4, 2.0, 4000, "frames")
+    record(results, "decode", 4, 0.5, 4000, "frames", mbytes=128)
+    record(results, "aggregate", 4, 1.0, 15, "images")
+    assert results[0]['per_second'] == 8000 and results[0]['mb_per_s'] == 256
+    path = tmp_path / "baseline.json"
+    path.write_text(json.dumps({'environment': {'commit': 'abc'}, 'results': baseline}))
+    capsys.readouterr()
+    compare(results, str(path))
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == 2 and lines[1].split()[-1] == "4.00x"
@@ -0,0 +1,85 @@
+import cv2
+import numpy as np
+import pytest
+
+import disparity
+from disparity import DisparityRange, create_matcher, compute_disparity_maps
+from disparity_cache import matcher_signature
+from disparity_volume import DisparityVolume
+
+def stereo_pair(disparity=30, width=320, height=240, seed=0):
+    """Textured left image and the right image seen disparity px to the left"""
+    rng = np.random.default_rng(seed)
+    coarse = cv2.resize(rng.random((height // 4, (width + disparity) // 4), dtype=np.float32),
+                        (width + disparity, height), interpolation=cv2.INTER_CUBIC)
+    texture = np.clip(160 * coarse + rng.normal(0, 20, coarse.shape), 0, 255).astype(np.uint8)
+    return texture[:, :width].copy(), texture[:, disparity:disparity + width].copy()
+
+@pytest.mark.parametrize("method", ["SBM", "SGBM"])
+def test_disparity_range(method):
+    left, right = stereo_pair()
+    stereo = create_matcher(method, 4)
+    search = DisparityRange(stereo)
+    full = search.full
+    for _ in range(3):
+        disparity_map = search.compute(left, right)
+        valid = disparity_map[disparity_map > 0]
+        assert valid.size > disparity_map.size // 2
+        assert abs(np.median(valid) / 16 - 30) <= 1
+    # the band found narrows the search, without falling back to the full range
+    assert search.current[1] < full[1]
+    assert search.fallbacks == 0
+    search.restore()
+    assert (stereo.getMinDisparity(), stereo.getNumDisparities()) == full
+
+def write_sequence(folder, n_pairs, disparity=30):
+    for side in ("left", "right"):
+        (folder / side).mkdir()
+    for i in range(n_pairs):
+        left, right = stereo_pair(disparity, seed=i)
+        cv2.imwrite(str(folder / "left" / f"stereo_left_1726830927.{i:06d}_{i}.png"), left)
+        cv2.imwrite(str(folder / "right" / f"stereo_right_1726830927.{i:06d}_{i}.png"), right)
+    return str(folder / "left"), str(folder / "right")
+
+def test_incremental_maps(tmp_path, monkeypatch):
+    monkeypatch.setattr(disparity, "OUTPUT_DATA_PATH", str(tmp_path)) # color-coded maps
+    left_dir, right_dir = write_sequence(tmp_path, 4)
+    maps = {}
+    for incremental in (False, True):
+        maps[incremental] = compute_disparity_maps(left_dir, right_dir, str(tmp_path / f"out_{incremental}"), "SGBM",
+                                                   return_maps=True, nDispFactor=4, incremental=incremental)
+    assert sorted(maps[True]) == sorted(maps[False]) and len(maps[True]) == 4
+    for file_id, full in maps[False].items():
+        narrowed = maps[True][file_id]
+        # invalid pixels are 0 in both, never (minDisparity - 1) * 16
+        assert not np.any(full == 16 * 15) and not np.any(narrowed == 16 * 15)
+        both = (full > 0) & (narrowed > 0)
+        assert np.count_nonzero(both) > full.size // 2
+        assert np.mean(np.abs(full[both].astype(np.int32) - narrowed[both]) > 16) < 0.01
+
+def test_pyramid_signature():
+    pyramid = create_matcher("PYRAMID")
+    signature = matcher_signature(pyramid, "PYRAMID")
+    pyramid.min_disparities = 0 # always the coarse pass
+    assert matcher_signature(pyramid, "PYRAMID") != signature
+
+def test_workers(tmp_path, monkeypatch):
+    monkeypatch.setattr(disparity, "OUTPUT_DATA_PATH", str(tmp_path))
+    left_dir, right_dir = write_sequence(tmp_path, 5)
+    serial = compute_disparity_maps(left_dir, right_dir, "serial", "SBM", workers=1, return_maps=True, nDispFactor=4)
+    parallel = compute_disparity_maps(left_dir, right_dir, "parallel", "SBM", workers=2, return_maps=True,
+                                      batch_size=2, nDispFactor=4)
+    assert sorted(parallel) == sorted(serial) and len(serial) == 5
+    for file_id, disparity_map in serial.items():
+        assert np.array_equal(parallel[file_id], disparity_map)
+        assert (tmp_path / "parallel" / f"disparity_{file_id}.png").exists()
+
+def test_volume_maps(tmp_path, monkeypatch):
+    monkeypatch.setattr(disparity, "OUTPUT_DATA_PATH", str(tmp_path))
+    left_dir, right_dir = write_sequence(tmp_path, 3)
+    maps = compute_disparity_maps(left_dir, right_dir, "png", "SBM", return_maps=True, nDispFactor=4)
+    compute_disparity_maps(left_dir, right_dir, "png", "SBM", nDispFactor=4, volume="volume.npy")
+    volume = DisparityVolume(str(tmp_path / "volume.npy"))
+    assert sorted(volume.written().tolist()) == sorted(maps)
+    for file_id, disparity_map in maps.items():
+        assert np.array_equal(volume[file_id], disparity_map)
@@ -0,0 +1,37 @@
+import cv2
+import numpy as np
+
+from disparity_volume import DisparityVolume, global_lut, colorize, colorize_volume
+
+def test_volume(tmp_path):
+    path = str(tmp_path / "volume.npy")
+    volume = DisparityVolume.create(path, ['3', '7', '12'], 4, 5)
+    volume.write('7', np.full((4, 5), 320, dtype=np.uint16))
+    volume.write(12, np.arange(20, dtype=np.uint16).reshape(4, 5))
+    volume.flush()
+
+    volume = DisparityVolume(path)
+    assert len(volume) == 3
+    assert volume.written().tolist() == ['7', '12']
+    assert np.all(volume['7'] == 320) and np.all(volume['3'] == 0)
+    assert volume.max_disparity(chunk_frames=2) == 320
+    assert np.array_equal(np.load(path), volume.data) # plain .npy
+
+    # same IDs and size: reopened with its frames, otherwise created again
+    assert DisparityVolume.open_or_create(path, ['3', '7', '12'], 4, 5).written().tolist() == ['7', '12']
+    assert len(DisparityVolume.open_or_create(path, ['3', '7'], 4, 5).written()) == 0
+
+def test_colorize(tmp_path):
+    lut = global_lut(320)
+    assert lut.shape == (65536, 3)
+    # the same disparity has the same color in every frame, whatever the frame's own range
+    a = colorize(np.array([[0, 160, 320]], dtype=np.uint16), lut)
+    b = colorize(np.array([[160, 1000]], dtype=np.uint16), lut)
+    assert np.array_equal(a[0, 1], b[0, 0])
+    assert np.array_equal(b[0, 1], lut[320])
+
+    volume = DisparityVolume.create(str(tmp_path / "volume.npy"), ['1', '2'], 4, 5)
+    volume.write('2', np.full((4, 5), 160, dtype=np.uint16))
+    assert colorize_volume(volume, str(tmp_path / "colored"), max_disparity=320) == 1
+    image = cv2.imread(str(tmp_path / "colored" / "colordisparity_2.png"))
+    assert np.array_equal(image[0, 0], lut[160])
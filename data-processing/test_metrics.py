@@ -0,0 +1,64 @@
+import json
+import pickle
+import numpy as np
+import pytest
+
+from metrics import Metrics, _bucket
+
+@pytest.mark.parametrize("value, exponent", [(1, 0), (2, 1), (3, 2), (0.5, -1), (0.3, -1), (1e-3, -9), (0, None), (-1, None)])
+def test_bucket(value, exponent):
+    assert _bucket(value) == exponent
+
+def test_quantiles():
+    # the quantiles are the upper bounds of power-of-two buckets: within a factor 2 of the exact values
+    values = np.random.default_rng(0).lognormal(-5, 1, 5000)
+    metrics = Metrics()
+    for v in values:
+        metrics.observe('latency_seconds', v)
+    h = metrics.snapshot()['histograms']['latency_seconds']
+    assert h['count'] == 5000 and h['sum'] == pytest.approx(values.sum())
+    for q in (0.5, 0.9, 0.99):
+        exact = np.quantile(values, q)
+        assert exact <= Metrics.quantile(h, q) < 2 * exact
+    assert Metrics.quantile(h, 1.0) == h['max'] == values.max()
+
+def test_merge():
+    a, b, both = Metrics(), Metrics(), Metrics()
+    for i, v in enumerate([0, 0.001, 0.02, 0.5, 3.0, 0.004]):
+        (a if i % 2 else b).observe('x', v)
+        both.observe('x', v)
+    a.inc('pairs', 2)
+    b.inc('pairs', 3)
+    b.set('rate', 1.5)
+    # worker snapshots go through pickle, and JSON turns the bucket keys into str
+    a.merge(pickle.loads(pickle.dumps(b.snapshot())))
+    snapshot = a.snapshot()
+    merged, expected = snapshot['histograms']['x'], both.snapshot()['histograms']['x']
+    assert merged.pop('sum') == pytest.approx(expected.pop('sum'))
+    assert merged == expected
+    assert snapshot['counters'] == {'pairs': 5} and snapshot['gauges'] == {'rate': 1.5}
+
+    c = Metrics()
+    c.merge(json.loads(json.dumps(b.snapshot())))
+    assert c.snapshot()['histograms']['x']['buckets'] == b.snapshot()['histograms']['x']['buckets']
+
+def test_write(tmp_path):
+    metrics = Metrics()
+    metrics.observe('decode_seconds', 0.003)
+    metrics.observe('decode_seconds', 0)
+    metrics.inc('pairs_processed', 4)
+    metrics.set('pairs_per_second', 2.5)
+
+    metrics.write(str(tmp_path / "run.prom"))
+    text = (tmp_path / "run.prom").read_text()
+    assert 'spice_decode_seconds_bucket{le="0"} 1' in text
+    assert 'spice_decode_seconds_bucket{le="0.00390625"} 2' in text
+    assert 'spice_decode_seconds_bucket{le="+Inf"} 2' in text
+    assert "spice_pairs_processed_total 4" in text
+    assert "spice_pairs_per_second 2.5" in text
+
+    metrics.write(str(tmp_path / "run.json"))
+    data = json.loads((tmp_path / "run.json").read_text())
+    assert data['histograms']['decode_seconds']['p99'] == 0.003
+    assert data['counters'] == {'pairs_processed': 4}
+    assert not (tmp_path / "run.json.tmp").exists()
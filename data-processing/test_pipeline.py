@@ -0,0 +1,51 @@
+import time
+import random
+import threading
+
+from pipeline import run_pipeline, run_sequential
+from metrics import Metrics
+
+class Stages:
+    """load/compute/save stubs with random delays that record what is in flight"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.loaded, self.computed, self.saved = set(), [], {}
+        self.max_ahead = 0
+
+    def load(self, item):
+        time.sleep(random.uniform(0, 0.005))
+        with self.lock:
+            self.loaded.add(item)
+            self.max_ahead = max(self.max_ahead, len(self.loaded) - len(self.computed))
+        return item * 10
+
+    def compute(self, item, loaded):
+        self.computed.append(item)
+        return loaded + 1
+
+    def save(self, item, result):
+        time.sleep(random.uniform(0, 0.005))
+        with self.lock:
+            self.saved[item] = result
+
+def test_pipeline():
+    stages = Stages()
+    metrics = Metrics()
+    results = list(run_pipeline(range(40), stages.load, stages.compute, stages.save, prefetch=3, metrics=metrics))
+    assert results == [(i, i * 10 + 1) for i in range(40)]
+    assert stages.computed == list(range(40))
+    assert stages.saved == dict(results) # every write finished when the generator ends
+    assert stages.max_ahead <= 3 + 1 # the item being computed and prefetch more
+    snapshot = metrics.snapshot()
+    for name in ('decode_seconds', 'compute_seconds', 'encode_seconds'):
+        assert snapshot['histograms'][name]['count'] == 40
+
+def test_sequential():
+    stages = Stages()
+    assert list(run_sequential(range(5), stages.load, stages.compute, stages.save)) == [(i, i * 10 + 1) for i in range(5)]
+    assert len(stages.saved) == 5
+
+def test_empty():
+    stages = Stages()
+    assert list(run_pipeline([], stages.load, stages.compute, stages.save)) == []
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from stereo_index import parse_timestamp, scan_folder, flag_frames, pair_by_timestamp, build_pairs
+
+def frames(timestamps, ids=None):
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    ids = np.arange(len(timestamps)) if ids is None else np.asarray(ids)
+    return {'names': np.array([f"f{i}" for i in ids]), 'timestamps': timestamps, 'ids': ids}
+
+def brute_force_pairs(left, right, tolerance_ns):
+    """Nearest right frame of every left frame within tolerance, the closest left frame keeps it"""
+    best = {}
+    for li, t in enumerate(left['timestamps']):
+        if not len(right['timestamps']):
+            break
+        errors = np.abs(right['timestamps'] - t)
+        ri = int(np.argmin(errors))
+        if errors[ri] <= tolerance_ns and (ri not in best or errors[ri] < best[ri][1]):
+            best[ri] = (li, errors[ri])
+    pairs = sorted((li, ri) for ri, (li, _) in best.items())
+    return [li for li, _ in pairs], [ri for _, ri in pairs]
+
+@pytest.mark.parametrize("seed", range(5))
+def test_pair_by_timestamp(seed):
+    rng = np.random.default_rng(seed)
+    period = 66_666_667 # 15 fps
+    left = frames(np.arange(200) * period + rng.integers(-20_000_000, 20_000_000, 200))
+    right = frames(rng.permutation(np.arange(190) * period + rng.integers(-20_000_000, 20_000_000, 190)))
+    li, ri = pair_by_timestamp(left, right, 10_000_000)
+    expected = brute_force_pairs(left, right, 10_000_000)
+    assert (li.tolist(), ri.tolist()) == expected
+    assert len(set(ri.tolist())) == len(ri)
+
+def test_pair_by_timestamp_empty():
+    li, ri = pair_by_timestamp(frames([1, 2]), frames([]), 10)
+    assert len(li) == len(ri) == 0
+
+def test_parse_timestamp():
+    assert parse_timestamp('1726830927', '999999046') == 1726830927999999046
+    assert parse_timestamp('1726830927', '5') == 1726830927500000000
+
+def test_flag_frames():
+    flags = flag_frames(frames([0, 10, 20, 15, 30, 70, 80]))
+    assert flags['delayed'].tolist() == [False, False, False, True, False, False, False]
+    assert flags['gap'].tolist() == [False, False, False, False, False, True, False]
+    assert flags['period_ns'] == 10
+
+def test_build_pairs(tmp_path):
+    for side in ("left", "right"):
+        (tmp_path / side).mkdir()
+    for i, frac in enumerate(["000000000", "066666667", "133333333", "200000000"]):
+        (tmp_path / "left" / f"stereo_left_1726830927.{frac}_{i}.png").touch()
+        if i != 2:
+            # right frames 1 ms later, with their own numbering
+            (tmp_path / "right" / f"stereo_right_1726830927.{int(frac) + 1_000_000:09d}_{i + 10}.png").touch()
+    (tmp_path / "left" / "notes.txt").touch()
+
+    pairs, unmatched = build_pairs(str(tmp_path / "left"), str(tmp_path / "right"), "timestamp", 0.005)
+    assert [fileID for fileID, _, _ in pairs] == ['0', '1', '3']
+    assert pairs[1][2].endswith("stereo_right_1726830927.067666667_11.png")
+    assert unmatched == {'left': ['stereo_left_1726830927.133333333_2.png'], 'right': []}
+
+    pairs, unmatched = build_pairs(str(tmp_path / "left"), str(tmp_path / "right"), "id")
+    assert pairs == [] and len(unmatched['left']) == 4
+    assert scan_folder(str(tmp_path / "left"), 'left')['ids'].tolist() == [0, 1, 2, 3]
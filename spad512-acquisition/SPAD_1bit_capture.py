@@ -20,6 +20,10 @@ import argparse
 import numpy as np
 from PIL import Image
 
+from spad_receiver import SpadReceiver, CameraError, save_batch
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data-processing"))
+from metrics import Metrics
+
 parser = argparse.ArgumentParser(description="user input")
 parser.add_argument('-f', '--folder', type=str, help="Subfolder name", required=True )
 parser.add_argument('-b','--bit', type=int, help="Bit depth", required=True)
@@ -28,6 +32,9 @@ parser.add_argument('-e', '--exposure', type=float, help="Exposure time in us",
 parser.add_argument('-d1', '--display1', action='store_true', help="Display 1-bit image")
 parser.add_argument('-d8', '--display8', action='store_true', help="Display 8-bit image")
 parser.add_argument('-s', '--save', action='store_true', help="Save image as PNG")
+parser.add_argument('-p', '--port', type=int, help="Camera server port", required=False, default=9999)
+parser.add_argument('-k', '--chunk', type=int, help="Socket read size in bytes", required=False, default=262144)
+parser.add_argument('-m', '--metrics', type=str, help="Write run metrics to this file (.prom/.txt: Prometheus text, otherwise JSON)", required=False, default=None)
 
 args = parser.parse_args()
 print("Bit depth: ", "{:d}".format(args.bit), "-bit")
@@ -85,53 +92,49 @@ def next_filename_simple(directory, base_name="img", extension=".PNG"):
 def main():
 
     ## ------- OPEN TCP/IP CONNECTION -------
-    # connection to the localhost, port 9999
-    # make sure to change the port number if other is used to connect to the camera
+    # connection to the localhost, port 9999 by default
+    # make sure to change the port number (--port) if other is used to connect to the camera
     t = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    t.connect(('127.0.0.1', 9999))
+    t.connect(('127.0.0.1', args.port))
+
+    receiver = SpadReceiver(t, args.bit, args.exposure, args.images, chunk_size=args.chunk) # preallocates the whole batch. Try different chunk sizes (bytes).
 
     # read the server response
-    data = t.recv(8192)
+    data = receiver.greeting()
     print(data.decode('utf8'))
     
     ## ------- IMAGE ACQUISTIION -------
+    metrics = Metrics()
     start = time.time()
-    # make intensity images
-    command = bytes("I," + str(args.bit) + "," + str(args.exposure) + "," + str(args.images) + ",0" + ",1" + ",0" + ",1" + '\n', "utf8") # for 1-bit binary image streaming with overlap, no frame triggering
-    t.send(command)
-
-    data = bytearray() # initialize empty bytearray 1D. Note that data will be saved in bytes not in bits. Needs to be unpack later. 
-
-    # look for the response (i.e., camera returns "DONE")
-    while 1:
-        datablock = t.recv(262144) # read data from socket. Try different buffer sizes (bytes). Defalt = 32KB of data at a time.
-        data.extend(datablock) # append received data to bytearray
-        
-        # we stream binary pixel values, either 0 for no data, or 255 for a 1 (each byte represents one pixel)
-        
-        if datablock[-4:] == bytearray("DONE", 'utf8'): # check the last 4 bytes of datablock
-            
-            print("Process complete")
-            break
-            
-        elif datablock[-5:] == bytearray("ERROR", 'utf8'):
-            
-            print(datablock[-160:])
-            print("Completed the run with errors")
-            quit()
+    # make intensity images and look for the response (i.e., camera returns "DONE")
+    # data will be saved in bytes not in bits. Needs to be unpack later.
+    try:
+        data = metrics.time('recv_latency_seconds', receiver.request)
+        print("Process complete")
+
+    except CameraError as e:
+        print(e.tail)
+        print("Completed the run with errors")
+        quit()
 
     # close communication channel, get read time
     t.close()
     read = time.time()
     print("Read time: ", "{:.2f}".format((read - start)*1000), " ms")
 
+    metrics.observe('batch_bytes', len(data))
+
     start = time.time();
-    data = np.array(data, dtype=np.uint8)
     filename = next_filename(directory,f"SPAD_{args.exposure}us_{time.time()}_",".bin")
-    data.tofile(os.path.join(directory,filename))
+    metrics.time('save_latency_seconds', save_batch, os.path.join(directory,filename), data, len(data))
+    data = np.frombuffer(data, dtype=np.uint8) # no copy, view of the receive buffer
     read = time.time()
     print("Saving file time: ", "{:.2f}".format((read - start)*1000), " ms")
 
+    if args.metrics:
+        metrics.write(args.metrics)
+        print(f"Metrics saved as '{args.metrics}'")
+
     ## ------- DEBUGGING/CHECKING DATA -------
 
     if args.save and not args.display1 and not args.display8:
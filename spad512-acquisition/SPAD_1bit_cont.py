@@ -17,12 +17,23 @@ import sys
 import socket
 import time
 import argparse
-import threading
 import queue
+import multiprocessing
 import numpy as np
 from PIL import Image
 
-frame_queue = queue.Queue()
+from spad_receiver import SpadReceiver, CameraError, batch_buffer_size, save_batch
+from frame_ring import FrameRing, POLICIES
+from batch_scheduler import BatchScheduler, SCHEDULE_POLICIES
+from live_preview import LivePreview
+from batch_saver import save_frames
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "spad512-reader"))
+from spad_container import CODECS, CONTAINER_EXT
+from spad_reader import unpack_frames, IMG_HEIGHT, ROW_BYTES, FRAME_BYTES
+from digitize_bin import count_photons
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data-processing"))
+from metrics import Metrics
 
 directory = os.path.join(".", "data")
 
@@ -41,73 +52,64 @@ def next_filename(directory, base_name="img", extension=".PNG"):
 
     return f"{base_name}{next_num}{extension}"
 
-def acquire_frames(t, args):
-    start = time.time()
+def acquire_frames(t, args, ring, metrics, preview=None):
     frame_number = 0
     images_per_request = args.images
-    frame_interval = 1 / args.fps # interval between frames in seconds
+    receiver = SpadReceiver(t, 1, args.exposure, images_per_request, chunk_size=args.chunk or 65536) # try different chunk sizes (bytes)
+    # batches start on a fixed time grid of the monotonic clock (see batch_scheduler.py)
+    scheduler = BatchScheduler(args.fps, args.time, args.schedule)
 
-    while time.time() - start < args.time:
-        start_frame_time = time.time()
+    for tick, deadline in scheduler:
+        start_frame_time = time.monotonic()
         print(f'Acquiring frame {frame_number}')
 
-        #send the command
-        command = bytes("I,1," + str(args.exposure) + "," + str(images_per_request) + ",0" + ",1" + ",0" + ",1" + '\n', "utf8") # for 1-bit binary image streaming with overlap, no frame triggering
-        t.send(command)
-
-        data = bytearray() # initialize empty bytearray 1D. Note that data will be saved in bytes not in bits. Needs to be unpack later. 
-        
-        # look for the response (i.e., camera returns "DONE")
-        while 1:
-            datablock = t.recv(65536) # read data from socket. Try different buffer sizes ( 32768 bytes). Defalt = 32KB of data at a time.         
-            data.extend(datablock) # append received data to bytearray
-                                                                        
-            # we stream binary pixel values, either 0 for no data, or 255 for a 1 (each byte represents one pixel)
-                                                                        
-            if datablock[-4:] == bytearray("DONE", 'utf8'): # check the last 4 bytes of datablock
-                frame_timestamp = time.time()
-                
+        #get a free buffer from the ring. If the ring is full and the batch is dropped (drop-newest),
+        #it is still received, into the receiver's own scratch buffer, to keep the stream in sync
+        slot = ring.acquire()
+        buffer = receiver.buffer if slot is None else slot[1]
+
+        #send the command and look for the response (i.e., camera returns "DONE")
+        try:
+            data = metrics.time('recv_latency_seconds', receiver.request, buffer) # memoryview of the received data. Note that data will be saved in bytes not in bits. Needs to be unpack later.
+            frame_timestamp = scheduler.wall(receiver.done_time)
+            metrics.observe('batch_bytes', len(data))
+
+            if slot is None:
+                print(f"   Frame {frame_number} dropped, saving is falling behind")
+                metrics.inc('batches_dropped')
+            else:
                 print(f"   Frame {frame_number} acquisition complete")
-
-                frame_queue.put((frame_number, frame_timestamp, data)) #add frame to queue
-                
-                break
-                                                                            
-            elif datablock[-5:] == bytearray("ERROR", 'utf8'):
-                                                                            
-                print(datablock[-160:])
-                print(f"   Frame {frame_number} completed with errors")
-                #quit()
-        
-        end_frame_time = time.time()
-        elapsed_time = end_frame_time - start_frame_time
+                depth = ring.commit(slot[0], frame_number, frame_timestamp, len(data)) #hand the buffer over to the saver
+                metrics.observe('ring_depth', depth)
+                # the newest batch goes to the preview as soon as it is committed, even if saving falls
+                # behind. Only copied when the preview is idle and due (at most --preview-fps times per s)
+                if preview is not None and preview.offer(data):
+                    metrics.inc('previews')
+
+        except CameraError as e:
+            print(e.tail)
+            print(f"   Frame {frame_number} completed with errors")
+            metrics.inc('camera_errors')
+            if slot is not None:
+                ring.cancel(slot[0])
+
+        data = buffer = slot = None # do not hold on to the shared memory once the slot is handed over
+        scheduler.record(tick, deadline, receiver.sent_time, receiver.done_time)
+        if scheduler.period: # back to back, there is no deadline to be late for
+            metrics.observe('start_jitter_seconds', max(0, receiver.sent_time - deadline))
+
+        elapsed_time = time.monotonic() - start_frame_time
+        metrics.observe('batch_seconds', elapsed_time)
         print(f"   Total frame {frame_number} time: ", "{:.2f}".format(elapsed_time*1000), " ms")
 
         frame_number += 1
-        sleep_time = max(0, frame_interval - elapsed_time)
-        time.sleep(sleep_time)
-
-    read = time.time()
-    print("Acquisition time: ", "{:.2f}".format((read - start)*1000), " ms")
 
-def save_frames():
-    saving_start = time.time()
-    while 1:
-        frame_number, frame_timestamp, data = frame_queue.get()
-
-        if data is None: #finish acquisition
-            break
-
-        # save data to file
-        data = np.array(data, dtype=np.uint8)
-        
-        filename = f'RAW_{frame_timestamp}.bin'
-        path = os.path.join(directory,filename)
-        data.tofile(path)
-        
-        frame_queue.task_done()
-    saving_end = time.time()
-    print("Saving time: ", "{:.2f}".format((saving_end - saving_start)*1000), " ms")
+    print("Acquisition time: ", "{:.2f}".format((time.monotonic() - scheduler.start)*1000), " ms")
+    print(scheduler.report())
+    stats = scheduler.stats()
+    metrics.set('achieved_rate', stats.get('achieved_rate', 0))
+    metrics.inc('missed_deadlines', stats['missed'])
+    return scheduler
 
 def main():
 
@@ -120,6 +122,20 @@ def main():
     parser.add_argument('-d1', '--display1', action='store_true', help="Display 1-bit image")
     parser.add_argument('-d8', '--display8', action='store_true', help="Display 8-bit image")
     parser.add_argument('-s', '--save', action='store_true', help="Save image as PNG")
+    parser.add_argument('-p', '--port', type=int, help="Camera server port", required=False, default=9999)
+    parser.add_argument('-k', '--chunk', type=int, help="Socket read size in bytes (default: 65536 long, 32768 single)", required=False, default=None)
+    parser.add_argument('-r', '--ring', type=int, help="Number of batch buffers kept in memory while saving", required=False, default=8)
+    parser.add_argument('-c', '--container', action='store_true', help="Save a long acquisition as a single indexed .spad file")
+    parser.add_argument('-z', '--compression', type=str, choices=list(CODECS), help="Compression of the .spad file", required=False, default="none")
+    parser.add_argument('--policy', type=str, choices=POLICIES, help="What to do when all the batch buffers are in use", required=False, default="block")
+    parser.add_argument('--schedule', type=str, choices=SCHEDULE_POLICIES, help="When a batch overruns its period: skip the missed ticks or catch up", required=False, default="skip")
+    parser.add_argument('-m', '--metrics', type=str, help="Write run metrics to this file (.prom/.txt: Prometheus text, otherwise JSON)", required=False, default=None)
+    parser.add_argument('--preview', type=str, help="Live preview image, updated during long acquisitions (e.g. ./data/preview.png)", required=False, default=None)
+    parser.add_argument('--preview-bit', type=int, help="Bit depth of the live preview", required=False, default=8)
+    parser.add_argument('--preview-scale', type=int, help="Live preview decimation (scale x scale pixels averaged)", required=False, default=2)
+    parser.add_argument('--preview-fps', type=float, help="Maximum live preview updates per s", required=False, default=2)
+    parser.add_argument('--stats', action='store_true', help="Compute per-pixel photon statistics and hot/dead pixels while saving (long acquisitions)")
+    parser.add_argument('--metrics-interval', type=float, help="Also write the acquisition metrics every this many s (0 = only at the end)", required=False, default=0)
 
     args = parser.parse_args()
     print("Bit depth: 1-bit")
@@ -127,6 +143,8 @@ def main():
 
     if args.long and not args.time:
         parser.error('--time and --fps are required for long acquisitions')
+    if args.long and (args.display1 or args.display8):
+        parser.error('--display1/--display8 show a single acquisition, use --preview for long acquisitions')
         
     if args.long:
         print(f'Total acquisition time: {args.time} s')
@@ -135,96 +153,112 @@ def main():
         print("Number of 1-bit frames: ", "{:d}".format(args.images), " frames")
 
     ## ------- OPEN TCP/IP CONNECTION -------
-    # connection to the localhost, port 9999
-    # make sure to change the port number if other is used to connect to the camera
+    # connection to the localhost, port 9999 by default
+    # make sure to change the port number (--port) if other is used to connect to the camera
     t = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    t.connect(('127.0.0.1', 9999))
+    t.connect(('127.0.0.1', args.port))
     t.setblocking(True) #ensure socket is in blocking mode, fill the buffer as much as possible
     t.settimeout(0.5) # set to 1 second to allow sufficient time to retrieve data
 
     # read the server response
     data = t.recv(8192)
     print(data.decode('utf8'))
+
+    metrics = Metrics()
             
     
     ## ------- SINGLE IMAGE ACQUISTIION -------
     if not args.long:
         start = time.time()
-        # make intensity images
-        command = bytes("I,1," + str(args.exposure) + "," + str(args.images) + ",0" + ",1" + ",0" + ",1" + '\n', "utf8") # for 1-bit binary image streaming with overlap, no frame triggering
-        t.send(command)
+        # make intensity images and look for the response (i.e., camera returns "DONE")
+        receiver = SpadReceiver(t, 1, args.exposure, args.images, chunk_size=args.chunk or 32768) # try different chunk sizes (bytes)
+        try:
+            data = metrics.time('recv_latency_seconds', receiver.request) # note that data will be saved in bytes not in bits. Needs to be unpack later.
+            print("Process complete")
 
-        data = bytearray() # initialize empty bytearray 1D. Note that data will be saved in bytes not in bits. Needs to be unpack later. 
-
-        # look for the response (i.e., camera returns "DONE")
-        while 1:
-            datablock = t.recv(32768) # read data from socket. Try different buffer sizes (bytes). Defalt = 32KB of data at a time.
-            data.extend(datablock) # append received data to bytearray
-            
-            # we stream binary pixel values, either 0 for no data, or 255 for a 1 (each byte represents one pixel)
-            
-            if datablock[-4:] == bytearray("DONE", 'utf8'): # check the last 4 bytes of datablock
-                
-                print("Process complete")
-                break
-                
-            elif datablock[-5:] == bytearray("ERROR", 'utf8'):
-                
-                print(datablock[-160:])
-                print("Completed the run with errors")
-                quit()
+        except CameraError as e:
+            print(e.tail)
+            print("Completed the run with errors")
+            quit()
 
         # close communication channel, get read time
         t.close()
         read = time.time()
         print("Read time: ", "{:.2f}".format((read - start)*1000), " ms")
 
+        metrics.observe('batch_bytes', len(data))
+
         start = time.time();
-        data = np.array(data, dtype=np.uint8)
-        data.tofile('RAW00002.bin')
+        metrics.time('save_latency_seconds', save_batch, 'RAW00002.bin', data, len(data))
+        data = np.frombuffer(data, dtype=np.uint8) # no copy, view of the receive buffer
         read = time.time()
         print("Saving file time: ", "{:.2f}".format((read - start)*1000), " ms")
         
     else:
         ## ------ CONTINUOUS ACQUISITION --------        
-        #start threads
-        acquisition_thread = threading.Thread(target=acquire_frames, args=(t,args))
-        saving_thread = threading.Thread(target=save_frames)
-
-        acquisition_thread.start()
-        saving_thread.start()
-
-        acquisition_thread.join()
-        frame_queue.put((None, None)) #signal to stop saving threads
-        saving_thread.join()
+        #fixed number of batch buffers shared with the saving process, so memory stays constant
+        ring = FrameRing(args.ring, batch_buffer_size(1, args.images), args.policy)
+
+        #acquire in this process, save in another one
+        container = None
+        metadata = {'exposure_us': args.exposure, 'images_per_batch': args.images, 'fps': args.fps, 'bit': 1}
+        if args.container:
+            container = f'SPAD_{args.exposure}us_{time.time()}{CONTAINER_EXT}'
+            print(f'Saving to {os.path.join(directory, container)}')
+
+        stats_file = f'photon_stats_{time.time()}.npz' if args.stats else None
+        preview = None
+        if args.preview:
+            preview = LivePreview(args.preview, batch_buffer_size(1, args.images), args.preview_bit, args.preview_scale, args.preview_fps)
+            preview.start()
+            print(f"Live preview: {args.preview}")
+
+        metrics_queue = multiprocessing.Queue()
+        saving_process = multiprocessing.Process(target=save_frames, args=(ring, directory, container, metadata, args.compression, metrics_queue, stats_file))
+        saving_process.start()
+        if args.metrics and args.metrics_interval > 0:
+            metrics.start_periodic(args.metrics, args.metrics_interval)
+
+        scheduler = None
+        try:
+            scheduler = acquire_frames(t, args, ring, metrics, preview)
+        finally:
+            ring.close_input() #signal the saver to stop once all batches are saved
+            saving_process.join()
+            metrics.stop_periodic()
+            if preview is not None:
+                preview.stop()
+        try:
+            metrics.merge(metrics_queue.get(timeout=1))
+        except queue.Empty:
+            print("Warning: no metrics from the saving process")
+
+        stats = ring.stats()
+        print(f"Batches saved: {stats['released']}, dropped: {stats['dropped']}, late: {stats['late']}, max. ring depth: {stats['max_depth']}/{stats['slots']}")
+        ring.close()
+        if scheduler is not None and scheduler.records:
+            times_file = os.path.join(directory, f'batch_times_{scheduler.wall_start}.csv')
+            scheduler.save(times_file)
+            print(f"Batch times saved as '{times_file}'")
         
         # close communication channel, get read time
         t.close()
 
+    print(metrics.report())
+    if args.metrics:
+        metrics.write(args.metrics)
+        print(f"Metrics saved as '{args.metrics}'")
+
     ## ------- DEBUGGING/CHECKING DATA -------
 
     if args.save and not args.display1 and not args.display8:
             parser.error('Either --display1 or --display8 are required for saving the image')
 
-    if args.display1: # display the last 1-bit image
-    
-        data = data[:-4] # remove DONE from the end of the data
-        datamap = np.zeros((512, 512, args.images), dtype=np.uint8) # initialize 3D array
-
-        for i in range(args.images): 
-            img_index_old = i*512*64 # each byte of data received contains 8 pixels in 1-bit format (or 8 bits; 512/8 = 64) 
-            img_index = (i+1)*512*64
-                
-            dataint = np.array(data[img_index_old:img_index], dtype = "uint8") # extract frame data from byte array
-            
-            databit = np.unpackbits(dataint) # unpack single bit values from data
+    if args.display1 or args.display8:
+        frames = np.frombuffer(data, dtype=np.uint8, count=args.images * FRAME_BYTES).reshape(args.images, IMG_HEIGHT, ROW_BYTES) # without DONE
 
-            datamap[:,:,i] = databit.reshape(512,512) # reshape to 2d array and add to datamap
-
-        bit_image = databit*255
-        im = Image.new('L', (512, 512), "black") # create new grayscale image and write the data to an image file
-        im.putdata(bit_image)
-        im = im.transpose(Image.Transpose.ROTATE_90)
+    if args.display1: # display the last 1-bit image
+        im = Image.fromarray(unpack_frames(frames[-1]) * np.uint8(255)) # rotated as the exported frames
         im.show()
 
         if args.save: 
@@ -237,21 +271,7 @@ def main():
             im.save(os.path.join(folder,filename))
             
     if args.display8: #display 8-bit image
-        data = data[:-4]
-        datamap = np.zeros(512*512)
-                           
-        for i in range(args.images): 
-            img_index_old = i*512*64 
-            img_index = (i+1)*512*64
-                
-            dataint = np.array(data[img_index_old:img_index], dtype = "uint8") 
-            databit = np.unpackbits(dataint)    
-
-            datamap += databit
-
-        im = Image.new('L', (512, 512), "black") # create new grayscale image and write the data to an image file
-        im.putdata(datamap)
-        im = im.transpose(Image.Transpose.ROTATE_90)
+        im = Image.fromarray(np.minimum(count_photons(frames), 255).astype(np.uint8)) # photons of all the frames, saturated at 255
         im.show()
         
         if args.save: 
@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+'''
+Last updated: 2026-Oct-17
+
+Multi-exposure sweep over a single connection to the SPAD512s, replacing multiexposure_launcher_SPAD.bat
+(one SPAD_1bit_capture.py run per exposure).
+
+The camera is connected to once, the batches of all exposures are received back to back into the
+shared ring buffers of SPAD_1bit_cont.py, and saved by a separate process (batch_saver.py) while the
+next exposure is being captured. All the batches go into one indexed .spad container (see
+spad_container.py); its metadata lists the sweep and the exposure of every chunk (chunk_exposure_us),
+so the frames of each exposure can be found without reading the data (exposure_frames()). A batch
+that fails with ERROR is requested again (--retries) so that the chunks always follow the sweep.
+
+The dead time between consecutive batches (DONE of one batch -> command of the next) is reported at
+the end.
+
+Example:
+    python SPAD_sweep.py -f target -i 256 -x 0.1 0.2 0.5 1 1.2 -n 1
+    python SPAD_sweep.py -f target -i 256 -x 0.1 0.5 1 -n 4 2 1 -z zlib
+
+'''
+import os
+import sys
+import queue
+import socket
+import time
+import argparse
+import multiprocessing
+
+from spad_receiver import SpadReceiver, CameraError, batch_buffer_size
+from frame_ring import FrameRing
+from batch_saver import save_frames
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "spad512-reader"))
+from spad_container import SpadContainer, CODECS, CONTAINER_EXT
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data-processing"))
+from metrics import Metrics
+
+def sweep_plan(exposures, repeats):
+    """Exposure of every batch: each exposure repeated (repeats is one count for all or one per exposure)"""
+    if len(repeats) == 1:
+        repeats = repeats * len(exposures)
+    if len(repeats) != len(exposures):
+        raise ValueError("Give either one repeat count or one per exposure")
+    return [e for e, n in zip(exposures, repeats) for _ in range(n)], repeats
+
+def exposure_frames(container):
+    """{exposure (us): [(first frame, stop frame) of each of its batches]} of a sweep container"""
+    if not isinstance(container, SpadContainer):
+        container = SpadContainer(container)
+    plan = container.metadata['chunk_exposure_us']
+    frames = {}
+    for k, exposure in enumerate(plan[:len(container.index)]):
+        frames.setdefault(exposure, []).append((int(container.offsets[k]), int(container.offsets[k + 1])))
+    return frames
+
+def run_sweep(t, plan, args, ring, metrics):
+    """Requests every batch of the plan in order and hands it over to the saver. Returns the number of batches."""
+    receiver = SpadReceiver(t, 1, plan[0], args.images, chunk_size=args.chunk)
+    wall_anchor = time.time() - time.monotonic()
+    last_done = None
+
+    for k, exposure in enumerate(plan):
+        receiver.set_exposure(exposure)
+        slot, buffer = ring.acquire() # block policy: waits for the saver if all buffers are in use
+
+        for attempt in range(args.retries + 1):
+            try:
+                data = metrics.time('recv_latency_seconds', receiver.request, buffer)
+                break
+            except CameraError as e:
+                print(e.tail)
+                print(f"   Batch {k} ({exposure} us) completed with errors, attempt {attempt + 1}/{args.retries + 1}")
+                metrics.inc('camera_errors')
+        else:
+            ring.cancel(slot)
+            raise RuntimeError(f"Batch {k} ({exposure} us) failed {args.retries + 1} times, sweep stopped")
+
+        if last_done is not None:
+            metrics.observe('dead_time_seconds', receiver.sent_time - last_done)
+        last_done = receiver.done_time
+        metrics.observe('batch_bytes', len(data))
+        ring.commit(slot, k, wall_anchor + receiver.done_time, len(data))
+        data = buffer = None
+        print(f"   Batch {k}: {exposure} us, {1000 * (receiver.done_time - receiver.sent_time):.2f} ms")
+
+    return len(plan)
+
+def main():
+    parser = argparse.ArgumentParser(description="user input")
+    parser.add_argument('-f', '--folder', type=str, help="Subfolder name", required=True)
+    parser.add_argument('-i', '--images', type=int, help="Number of images per batch", required=True)
+    parser.add_argument('-x', '--exposures', type=float, nargs='+', help="Exposure times in us", required=False, default=[0.1, 0.2, 0.5, 1, 1.2])
+    parser.add_argument('-n', '--repeats', type=int, nargs='+', help="Batches per exposure (one value for all, or one per exposure)", required=False, default=[1])
+    parser.add_argument('-z', '--compression', type=str, choices=list(CODECS), help="Compression of the .spad file", required=False, default="none")
+    parser.add_argument('-r', '--ring', type=int, help="Number of batch buffers kept in memory while saving", required=False, default=8)
+    parser.add_argument('--retries', type=int, help="Times a batch that fails with ERROR is requested again", required=False, default=2)
+    parser.add_argument('-p', '--port', type=int, help="Camera server port", required=False, default=9999)
+    parser.add_argument('-k', '--chunk', type=int, help="Socket read size in bytes", required=False, default=262144)
+    parser.add_argument('-m', '--metrics', type=str, help="Write run metrics to this file (.prom/.txt: Prometheus text, otherwise JSON)", required=False, default=None)
+
+    args = parser.parse_args()
+    try:
+        plan, repeats = sweep_plan(args.exposures, args.repeats)
+    except ValueError as e:
+        parser.error(str(e))
+
+    directory = os.path.join(".", "data", "SPAD", args.folder)
+    os.makedirs(directory, exist_ok=True)
+    container = f'SWEEP_{time.time()}{CONTAINER_EXT}'
+    metadata = {'bit': 1, 'images_per_batch': args.images, 'sweep': [[e, n] for e, n in zip(args.exposures, repeats)],
+                'chunk_exposure_us': plan}
+    print(f"Sweep: {', '.join(f'{e} us x{n}' for e, n in zip(args.exposures, repeats))}, {args.images} frames per batch")
+    print(f"Saving to {os.path.join(directory, container)}")
+
+    ## ------- OPEN TCP/IP CONNECTION -------
+    t = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    t.connect(('127.0.0.1', args.port))
+    print(t.recv(8192).decode('utf8'))
+
+    # save in another process, one exposure while the next one is captured
+    metrics = Metrics()
+    ring = FrameRing(args.ring, batch_buffer_size(1, args.images), "block")
+    metrics_queue = multiprocessing.Queue()
+    saving_process = multiprocessing.Process(target=save_frames, args=(ring, directory, container, metadata, args.compression, metrics_queue))
+    saving_process.start()
+
+    start = time.monotonic()
+    try:
+        run_sweep(t, plan, args, ring, metrics)
+    finally:
+        capture_time = time.monotonic() - start
+        ring.close_input()
+        saving_process.join()
+        t.close()
+        try:
+            metrics.merge(metrics_queue.get(timeout=1))
+        except queue.Empty:
+            print("Warning: no metrics from the saving process")
+        ring.close()
+
+    dead = metrics.snapshot()['histograms'].get('dead_time_seconds')
+    print(f"Sweep time: {capture_time * 1000:.2f} ms for {len(plan)} batches"
+          + (f", mean dead time between batches {1000 * dead['sum'] / dead['count']:.2f} ms" if dead else ""))
+    print(metrics.report())
+    if args.metrics:
+        metrics.write(args.metrics)
+        print(f"Metrics saved as '{args.metrics}'")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+'''
+Last updated: 2026-Oct-17
+
+Saving process shared by SPAD_1bit_cont.py and SPAD_sweep.py.
+
+save_frames() takes the batches committed to a FrameRing (see frame_ring.py) and writes them straight
+from the shared buffers, either as one RAW_<timestamp>.bin per batch or into a single .spad container
+(see spad_container.py). It can also update per-pixel photon statistics (photon_stats.py) before each
+slot is released, and sends its metrics back through metrics_queue. It returns once the producer calls ring.close_input().
+
+Example:
+    saving_process = multiprocessing.Process(target=save_frames, args=(ring, directory, container, metadata))
+    saving_process.start()
+
+'''
+import os
+import sys
+import time
+
+from spad_receiver import save_batch
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "spad512-reader"))
+from spad_container import SpadContainerWriter
+from photon_stats import PhotonStats
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data-processing"))
+from metrics import Metrics
+
+def save_frames(ring, directory, container=None, metadata=None, compression="none", metrics_queue=None, stats_file=None):
+    saving_start = time.time()
+    metrics = Metrics()
+    # per-pixel photon statistics updated from the ring buffers before they are released (see photon_stats.py)
+    stats = PhotonStats(exposure_us=(metadata or {}).get('exposure_us')) if stats_file else None
+    # either one RAW_<timestamp>.bin per batch or a single indexed container for the whole acquisition
+    writer = None
+    if container:
+        writer = SpadContainerWriter(os.path.join(directory, container), metadata, compression)
+
+    while 1:
+        item = ring.get()
+
+        if item is None: #finish acquisition
+            break
+
+        slot, frame_number, frame_timestamp, nbytes = item
+
+        # save data to file, straight from the shared ring buffer
+        if writer is not None:
+            metrics.time('save_latency_seconds', writer.append, ring.view(slot)[:nbytes], frame_timestamp)
+        else:
+            filename = f'RAW_{frame_timestamp}.bin'
+            path = os.path.join(directory,filename)
+            metrics.time('save_latency_seconds', save_batch, path, ring.view(slot), nbytes)
+        if stats is not None:
+            metrics.time('stats_latency_seconds', stats.update, ring.view(slot)[:nbytes])
+
+        ring.release(slot)
+    if writer is not None:
+        writer.close()
+    if stats is not None:
+        stats.save(os.path.join(directory, stats_file))
+        print(stats.summary())
+        print(f"Photon statistics saved as '{os.path.join(directory, stats_file)}'")
+    saving_end = time.time()
+    print("Saving time: ", "{:.2f}".format((saving_end - saving_start)*1000), " ms")
+    ring.close()
+    if metrics_queue is not None:
+        metrics_queue.put(metrics.snapshot()) # merged into the acquisition metrics
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+'''
+Last updated: 2026-Oct-17
+
+Fixed-rate batch scheduler for SPAD_1bit_cont.py.
+
+Batches are started at absolute ticks start + k / rate of the monotonic clock instead of sleeping for
+the remainder of each period, so timing errors do not accumulate. When a batch overruns its period:
+    - skip: the ticks more than late_tolerance in the past are skipped (and counted as missed), the
+      next batch starts at the next tick (right away if it is only slightly late), so the batches stay
+      on the original time grid,
+    - catch-up: the late ticks are run back to back until the schedule is caught up, so the number of
+      batches is kept.
+
+Each batch is recorded with its tick, deadline, command-send and completion times (monotonic, and
+converted to wall-clock time through a single anchor taken at the start, so the wall-clock timestamps
+do not jump if the system clock is adjusted during the acquisition). At the end, stats() gives the
+achieved rate, the start jitter (send time - deadline) percentiles and the missed deadlines (not for
+batches back to back, rate = 0, which have no deadlines), and
+save() writes the records as CSV, to sync the SPAD batches with the other sensors. ticks() yields the
+same ticks without sleeping, for event loops (multi_acquisition.py).
+
+Example:
+    scheduler = BatchScheduler(rate=10, duration=60, policy="skip")
+    for tick, deadline in scheduler:
+        data = receiver.request()
+        scheduler.record(tick, deadline, receiver.sent_time, receiver.done_time)
+    print(scheduler.report())
+
+'''
+import math
+import time
+import numpy as np
+
+SCHEDULE_POLICIES = ("skip", "catch-up")
+
+class BatchScheduler:
+    """
+    Yields (tick, deadline) at each tick of a rate (batches per second) for duration seconds. rate = 0
+    starts the batches back to back. late_tolerance (s) is how late a batch may start without counting
+    as a missed deadline.
+    """
+
+    def __init__(self, rate, duration, policy="skip", late_tolerance=0.002, clock=time.monotonic):
+        if policy not in SCHEDULE_POLICIES:
+            raise ValueError(f"Unknown schedule policy '{policy}'. Choose one of {', '.join(SCHEDULE_POLICIES)}.")
+        self.period = 1 / rate if rate > 0 else 0
+        self.duration = duration
+        self.policy = policy
+        self.late_tolerance = late_tolerance
+        self.clock = clock
+        self.start = None
+        self.wall_start = None
+        self.skipped = 0
+        self.records = [] # (tick, deadline, sent, done), monotonic clock
+
+    def anchor(self, start=None, wall_start=None):
+        """
+        Starts the time grid at start (scheduler's clock, default: now) and wall_start (wall clock).
+        Schedulers given the same anchor convert their times to the same wall-clock timestamps.
+        """
+        self.start = self.clock() if start is None else start
+        self.wall_start = time.time() if wall_start is None else wall_start
+
+    def __iter__(self):
+        for tick, deadline, wait in self.ticks():
+            if wait > 0:
+                time.sleep(wait)
+            yield tick, deadline
+
+    def ticks(self):
+        """
+        Yields (tick, deadline, wait) without sleeping: the caller waits wait s before starting the batch
+        (e.g. with asyncio.sleep). Anchored now unless anchor() was called before.
+        """
+        if self.start is None:
+            self.anchor()
+        tick = 0
+        while 1:
+            deadline = self.start + tick * self.period
+            now = self.clock()
+            if (deadline if self.period else now) - self.start >= self.duration:
+                return
+
+            yield tick, deadline, deadline - now
+            tick += 1
+
+            if self.policy == "skip" and self.period:
+                # next tick at most late_tolerance in the past: a slightly late tick starts right away
+                due = math.ceil((self.clock() - self.late_tolerance - self.start) / self.period)
+                if due > tick:
+                    self.skipped += due - tick
+                    tick = due
+
+    def record(self, tick, deadline, sent, done):
+        """Adds a batch: command-send and completion times on the scheduler's clock (done None if failed)"""
+        self.records.append((tick, deadline, sent, np.nan if done is None else done))
+
+    def wall(self, t):
+        """Wall-clock time of a time on the scheduler's clock"""
+        return self.wall_start + (t - self.start)
+
+    def stats(self):
+        if not self.records:
+            return {'batches': 0, 'skipped': self.skipped, 'missed': self.skipped}
+        records = np.array(self.records, dtype=np.float64)
+        sent, deadlines = records[:, 2], records[:, 1]
+        jitter = sent - deadlines
+        result = {
+            'batches': len(records),
+            'requested_rate': 1 / self.period if self.period else 0.0,
+            'achieved_rate': float((len(sent) - 1) / (sent[-1] - sent[0])) if len(sent) > 1 and sent[-1] > sent[0] else 0.0,
+            'late': int(np.count_nonzero(jitter > self.late_tolerance)) if self.period else 0,
+            'skipped': self.skipped,
+        }
+        if self.period: # back to back, every deadline is the start: there is no start jitter
+            result.update({
+                'jitter_p50_ms': float(np.percentile(jitter, 50) * 1000),
+                'jitter_p90_ms': float(np.percentile(jitter, 90) * 1000),
+                'jitter_p99_ms': float(np.percentile(jitter, 99) * 1000),
+                'jitter_max_ms': float(jitter.max() * 1000),
+            })
+        result['missed'] = result['late'] + result['skipped']
+        return result
+
+    def report(self):
+        s = self.stats()
+        if not s['batches']:
+            return "No batches acquired"
+        if not self.period:
+            return f"Batches: {s['batches']} back to back, rate {s['achieved_rate']:.3f} per s"
+        return (f"Batches: {s['batches']}, rate {s['achieved_rate']:.3f}/{s['requested_rate']:g} per s, "
+                f"start jitter p50 {s['jitter_p50_ms']:.2f} ms, p90 {s['jitter_p90_ms']:.2f} ms, p99 {s['jitter_p99_ms']:.2f} ms, "
+                f"max {s['jitter_max_ms']:.2f} ms, missed deadlines: {s['missed']} ({s['late']} late, {s['skipped']} skipped)")
+
+    def save(self, path):
+        """Writes batch, tick, deadline, send and done times (wall clock, s) as CSV"""
+        records = np.array(self.records, dtype=np.float64).reshape(-1, 4)
+        table = np.column_stack((np.arange(len(records)), records[:, 0], self.wall(records[:, 1]),
+                                 self.wall(records[:, 2]), self.wall(records[:, 3])))
+        np.savetxt(path, table, delimiter=",", fmt=["%d", "%d", "%.6f", "%.6f", "%.6f"],
+                   header="batch,tick,deadline,sent,done", comments="")
@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+'''
+Last updated: 2026-Oct-17
+
+Capture throughput benchmark. Runs SPAD_1bit_capture.py and SPAD_1bit_cont.py against the local
+SPAD512S simulator (spad512_simulator.py) for a set of socket read sizes and reports, per run:
+    - MB/s while streaming batches, and effective MB/s from the first command to the last DONE,
+    - batch latency percentiles, as reported by the scripts themselves (client) and as seen by the
+      simulator (command received -> DONE sent; data still in the socket buffers is not included),
+    - achieved vs requested batch rate (continuous mode).
+
+The scripts are run unmodified in a temporary working folder, so their own file saving is included
+in the measurements.
+
+Example:
+    python bench_capture.py --chunks 32768 65536 262144 --images 256 --fps 20 --time 5 --json bench.json
+
+'''
+import os
+import re
+import sys
+import json
+import shutil
+import tempfile
+import argparse
+import subprocess
+import time
+import numpy as np
+
+from spad512_simulator import SpadSimulator
+
+LOCAL_DIR = os.path.dirname(os.path.abspath(__file__))
+CAPTURE_SCRIPT = os.path.join(LOCAL_DIR, "SPAD_1bit_capture.py")
+CONT_SCRIPT = os.path.join(LOCAL_DIR, "SPAD_1bit_cont.py")
+
+# batch times printed by the acquisition scripts
+CLIENT_TIME = re.compile(r"(?:Read time|Total frame \d+ time):\s+([\d.]+)\s+ms")
+
+def summarize(batches, client_ms, requested_fps=None):
+    """Throughput and latency statistics out of the simulator batch log and the client batch times"""
+    if not batches:
+        return {'batches': 0}
+
+    batches = np.array([b[:3] for b in batches], dtype=np.float64)
+    commands, dones, nbytes = batches[:, 0], batches[:, 1], batches[:, 2]
+    server_ms = (dones - commands) * 1000
+    client_ms = np.asarray(client_ms if len(client_ms) else server_ms, dtype=np.float64)
+    elapsed = dones[-1] - commands[0]
+
+    result = {
+        'batches': len(batches),
+        'mbytes': float(nbytes.sum() / 1e6),
+        'mb_per_s': float(nbytes.sum() / 1e6 / max(client_ms.sum() / 1000, 1e-9)), # while receiving
+        'effective_mb_per_s': float(nbytes.sum() / 1e6 / max(elapsed, 1e-9)), # including the idle time between batches
+        'latency_p50_ms': float(np.percentile(client_ms, 50)),
+        'latency_p90_ms': float(np.percentile(client_ms, 90)),
+        'latency_p99_ms': float(np.percentile(client_ms, 99)),
+        'server_latency_p50_ms': float(np.percentile(server_ms, 50)),
+        'server_latency_p99_ms': float(np.percentile(server_ms, 99)),
+    }
+    if requested_fps:
+        result['requested_fps'] = requested_fps
+        result['achieved_fps'] = float((len(commands) - 1) / (commands[-1] - commands[0])) if len(commands) > 1 else 0.0
+    return result
+
+def run_script(cmd, workdir, timeout):
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable] + cmd, cwd=workdir, capture_output=True, text=True, timeout=timeout)
+    wall = time.perf_counter() - start
+    if proc.returncode != 0:
+        print(proc.stdout[-2000:])
+        print(proc.stderr[-2000:])
+        raise RuntimeError(f"{os.path.basename(cmd[0])} exited with code {proc.returncode}")
+    return wall, [float(m) for m in CLIENT_TIME.findall(proc.stdout)]
+
+def bench_capture(server, port, args, chunk, workdir):
+    server.reset_log()
+    wall, client_ms = 0, []
+    for _ in range(args.repeats):
+        w, ms = run_script([CAPTURE_SCRIPT, '-f', 'bench', '-b', '1', '-i', str(args.images), '-e', str(args.exposure),
+                            '--port', str(port), '--chunk', str(chunk)], workdir, args.timeout)
+        wall += w
+        client_ms += ms
+    result = summarize(server.batches, client_ms)
+    result['process_wall_s'] = wall / args.repeats
+    return result
+
+def bench_cont(server, port, args, chunk, workdir):
+    server.reset_log()
+    wall, client_ms = run_script([CONT_SCRIPT, '-i', str(args.images), '-e', str(args.exposure), '-l', '-t', str(args.time),
+                       '-f', str(args.fps), '--port', str(port), '--chunk', str(chunk)], workdir, args.timeout)
+    result = summarize(server.batches, client_ms, args.fps)
+    result['process_wall_s'] = wall
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="user input")
+    parser.add_argument('-k', '--chunks', type=int, nargs='+', help="Socket read sizes to test (bytes)", required=False, default=[32768, 65536, 262144])
+    parser.add_argument('-i', '--images', type=int, help="1-bit frames per batch", required=False, default=256)
+    parser.add_argument('-e', '--exposure', type=float, help="Exposure time in us", required=False, default=0.1)
+    parser.add_argument('-f', '--fps', type=float, help="Requested batch rate in continuous mode", required=False, default=10)
+    parser.add_argument('-t', '--time', type=float, help="Duration of each continuous run in s", required=False, default=5)
+    parser.add_argument('-n', '--repeats', type=int, help="Single captures per read size", required=False, default=3)
+    parser.add_argument('-r', '--rate', type=float, help="Simulated photons per pixel per us", required=False, default=0.5)
+    parser.add_argument('-l', '--link', type=float, help="Simulated link speed in MB/s (0 = unlimited)", required=False, default=0)
+    parser.add_argument('-m', '--mode', type=str, choices=['capture', 'cont', 'both'], help="Scripts to benchmark", required=False, default='both')
+    parser.add_argument('--timeout', type=float, help="Timeout of each script run in s", required=False, default=600)
+    parser.add_argument('--json', type=str, help="Write the results to this JSON file", required=False, default=None)
+
+    args = parser.parse_args()
+
+    server = SpadSimulator(port=0, rate=args.rate, link_mbps=args.link)
+    port = server.start()
+    server.frame_pool(1, args.exposure) # generate the synthetic frames before timing anything
+    workdir = tempfile.mkdtemp(prefix="spad_bench_")
+    print(f"Simulator on port {port}, link {'unlimited' if not args.link else f'{args.link} MB/s'}, working folder {workdir}")
+
+    results = []
+    try:
+        for chunk in args.chunks:
+            if args.mode in ('capture', 'both'):
+                r = bench_capture(server, port, args, chunk, workdir)
+                results.append({'script': 'SPAD_1bit_capture', 'chunk': chunk, **r})
+            if args.mode in ('cont', 'both'):
+                r = bench_cont(server, port, args, chunk, workdir)
+                results.append({'script': 'SPAD_1bit_cont', 'chunk': chunk, **r})
+    finally:
+        server.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{'script':<18} {'chunk':>8} {'batches':>8} {'MB/s':>9} {'eff MB/s':>9} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'fps':>13}")
+    for r in results:
+        fps = f"{r['achieved_fps']:.2f}/{r['requested_fps']:g}" if 'achieved_fps' in r else '-'
+        print(f"{r['script']:<18} {r['chunk']:>8} {r['batches']:>8} {r.get('mb_per_s', 0):>9.1f} {r.get('effective_mb_per_s', 0):>9.1f} {r.get('latency_p50_ms', 0):>9.2f} "
+              f"{r.get('latency_p90_ms', 0):>9.2f} {r.get('latency_p99_ms', 0):>9.2f} {fps:>13}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'settings': vars(args), 'results': results}, f, indent=2)
+        print(f"Results saved as '{args.json}'")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+'''
+Last updated: 2026-Oct-17
+
+Fixed-capacity ring of reusable batch buffers used to hand batches from the acquisition loop to the
+saver in SPAD_1bit_cont.py.
+
+The buffers live in a single multiprocessing.shared_memory block, so the saver can run in its own
+process (no GIL contention with the recv loop) and batches are never pickled or copied between them.
+Only slot numbers and batch metadata go through the queues.
+
+When all the slots are waiting to be saved (i.e., the disk falls behind), acquire() follows one of
+these policies:
+    block       - wait until the saver releases a slot. The batch is counted as late.
+    drop-oldest - take back the oldest batch not yet picked up by the saver and reuse its slot.
+    drop-newest - return None. The caller receives the batch into a scratch buffer and discards it.
+Dropped batches are counted in both cases, so memory stays constant during hours-long acquisitions.
+
+'''
+import os
+import queue
+import multiprocessing as mp
+from multiprocessing import shared_memory
+
+POLICIES = ("block", "drop-oldest", "drop-newest")
+
+class FrameRing:
+    """
+    Ring of `slots` shared-memory buffers of `slot_size` bytes each.
+
+    Producer: slot, buf = ring.acquire(); ...fill buf...; ring.commit(slot, frame_number, timestamp, nbytes)
+    Consumer: item = ring.get(); if item is None: stop; ...use ring.view(slot)[:nbytes]...; ring.release(slot)
+    """
+
+    def __init__(self, slots, slot_size, policy="block", ctx=None):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown policy '{policy}'. Choose one of {', '.join(POLICIES)}.")
+        if slots < 1:
+            raise ValueError("The ring needs at least one slot")
+
+        ctx = ctx or mp.get_context()
+        self.slots = slots
+        self.slot_size = slot_size
+        self.policy = policy
+        self.shm = shared_memory.SharedMemory(create=True, size=slots * slot_size)
+        self._owner_pid = os.getpid() # only the creating process frees the shared memory
+
+        self._free = ctx.Queue()
+        self._ready = ctx.Queue()
+        for i in range(slots):
+            self._free.put(i)
+
+        # counters shared with the saver process
+        self._committed = ctx.Value('Q', 0)
+        self._released = ctx.Value('Q', 0)
+        self._dropped = ctx.Value('Q', 0)
+        self._late = ctx.Value('Q', 0)
+        self._depth = ctx.Value('i', 0)
+        self._max_depth = ctx.Value('i', 0)
+
+    def view(self, slot):
+        """Writable memoryview of a slot"""
+        return self.shm.buf[slot * self.slot_size:(slot + 1) * self.slot_size]
+
+    ## ------- PRODUCER -------
+    def acquire(self):
+        """
+        Returns (slot, memoryview) of a free slot, applying the ring policy when all the slots are busy.
+        Returns None under the drop-newest policy if the ring is full.
+        """
+        try:
+            slot = self._free.get_nowait()
+            return slot, self.view(slot)
+        except queue.Empty:
+            pass
+
+        if self.policy == "drop-newest":
+            self._add(self._dropped)
+            return None
+
+        if self.policy == "drop-oldest":
+            try:
+                slot = self._ready.get_nowait()[0]
+                self._add(self._dropped)
+                self._add(self._depth, -1)
+                return slot, self.view(slot)
+            except queue.Empty:
+                pass # the saver already holds every slot, wait for one
+
+        self._add(self._late)
+        slot = self._free.get()
+        return slot, self.view(slot)
+
+    def commit(self, slot, frame_number, timestamp, nbytes):
+        """Hands a filled slot over to the consumer, returns the number of slots waiting to be consumed"""
+        self._add(self._committed)
+        depth = self._add(self._depth)
+        with self._max_depth.get_lock():
+            self._max_depth.value = max(self._max_depth.value, depth)
+        self._ready.put((slot, frame_number, timestamp, nbytes))
+        return depth
+
+    def cancel(self, slot):
+        """Returns an acquired slot that was not filled (e.g. the batch failed)"""
+        self._free.put(slot)
+
+    def close_input(self):
+        """Signals the consumer to stop once all the committed batches have been taken"""
+        self._ready.put(None)
+
+    ## ------- CONSUMER -------
+    def get(self):
+        """Returns the next (slot, frame_number, timestamp, nbytes) or None once the producer has finished"""
+        return self._ready.get()
+
+    def release(self, slot):
+        """Returns a slot to the producer once its batch has been used"""
+        self._add(self._released)
+        self._add(self._depth, -1)
+        self._free.put(slot)
+
+    ## ------- ACCOUNTING -------
+    @staticmethod
+    def _add(counter, n=1):
+        with counter.get_lock():
+            counter.value += n
+            return counter.value
+
+    def stats(self):
+        return {
+            'slots': self.slots,
+            'committed': self._committed.value,
+            'released': self._released.value,
+            'dropped': self._dropped.value,
+            'late': self._late.value,
+            'depth': self._depth.value,
+            'max_depth': self._max_depth.value,
+        }
+
+    def close(self):
+        """Detaches from the shared memory block. The creating process also frees it."""
+        self.shm.close()
+        if os.getpid() == self._owner_pid:
+            self.shm.unlink()
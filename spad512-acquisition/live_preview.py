@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+'''
+Last updated: 2026-Oct-17
+
+Live preview of a continuous acquisition (SPAD_1bit_cont.py --preview), to check focus and exposure
+while capturing.
+
+The acquisition loop offers each batch to the preview as soon as it is committed to the ring, so the
+preview shows the newest batch even when saving falls behind. offer() never waits: if
+the preview process is still busy with the previous image (or waiting for its next update, see fps),
+the batch is simply not previewed. Otherwise the first 2**bit - 1 frames of the batch are copied into
+a shared-memory buffer and the preview process builds an n-bit image from them with count_photons
+(see digitize_bin.py), averages blocks of scale x scale pixels and replaces the preview image
+atomically (written to a temporary file and renamed, so a viewer never reads a partial file).
+
+The receive loop only pays for one copy of at most 255 frames (8 MB) per preview update; every other
+offer() returns at once. The committed slot is only read, and only the producer refills slots, so the
+copy cannot race the saver.
+
+Example:
+    python SPAD_1bit_cont.py -i 1000 -e 0.1 -l -t 60 -f 10 --preview ./data/preview.png --preview-fps 2
+    preview = LivePreview('preview.png', batch_bytes, bit=8, scale=2, fps=2)
+    preview.start()
+    preview.offer(data)
+    preview.stop()
+
+'''
+import os
+import sys
+import time
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "spad512-reader"))
+from spad_reader import IMG_HEIGHT, ROW_BYTES, FRAME_BYTES
+from digitize_bin import count_photons, to_image
+
+IDLE, READY = 0, 1
+
+def decimate(counts, scale):
+    """Mean of blocks of scale x scale pixels (edges that do not fill a block are cropped)"""
+    if scale == 1:
+        return counts
+    h, w = counts.shape[0] // scale * scale, counts.shape[1] // scale * scale
+    return counts[:h, :w].reshape(h // scale, scale, w // scale, scale).mean(axis=(1, 3))
+
+def preview_image(packed, bit=8, scale=2):
+    """n-bit preview image (PIL) of the first 2**bit - 1 packed frames of a batch, decimated by scale"""
+    frames = min(len(packed) // FRAME_BYTES, 2**bit - 1)
+    counts = count_photons(np.frombuffer(packed, dtype=np.uint8, count=frames * FRAME_BYTES).reshape(frames, IMG_HEIGHT, ROW_BYTES))
+    # a batch shorter than 2**bit - 1 frames is scaled up to the full range
+    return to_image(decimate(counts, scale) * ((2**bit - 1) / max(frames, 1)), bit)
+
+class LivePreview:
+    """Preview process fed with batches by offer(), writing at most fps images per second to path"""
+
+    def __init__(self, path, batch_bytes, bit=8, scale=2, fps=2, ctx=None):
+        if not 1 <= bit <= 8:
+            raise ValueError("The preview bit depth must be between 1 and 8")
+        if scale < 1:
+            raise ValueError("The preview scale must be at least 1")
+        ctx = ctx or mp.get_context()
+        self.path = path
+        self.bit = bit
+        self.scale = scale
+        self.period = 1 / fps if fps > 0 else 0
+        self.size = min(batch_bytes // FRAME_BYTES, 2**bit - 1) * FRAME_BYTES
+        self.shm = shared_memory.SharedMemory(create=True, size=self.size)
+        self._owner_pid = os.getpid()
+        self._state = ctx.Value('i', IDLE)
+        self._nbytes = ctx.Value('Q', 0)
+        self._ready = ctx.Event()
+        self._stop = ctx.Event()
+        self._written = ctx.Value('Q', 0)
+        self._process = ctx.Process(target=self._run, daemon=True)
+
+    def __getstate__(self):
+        # a process the preview is passed to only needs the shared buffer and flags, not the process handle
+        state = self.__dict__.copy()
+        state['_process'] = None
+        return state
+
+    def start(self):
+        self._process.start()
+
+    def offer(self, data):
+        """Hands a batch over if the preview is idle. Returns True if it was taken. Never blocks."""
+        if self._state.value != IDLE:
+            return False
+        n = min(len(data), self.size)
+        self.shm.buf[:n] = data[:n]
+        self._nbytes.value = n
+        self._state.value = READY
+        self._ready.set()
+        return True
+
+    def _run(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        root, ext = os.path.splitext(self.path)
+        tmp = root + ".tmp" + ext
+        next_update = time.monotonic()
+        while 1:
+            if not self._ready.wait(0.2):
+                if self._stop.is_set():
+                    break
+                continue
+            self._ready.clear()
+
+            preview_image(self.shm.buf[:self._nbytes.value], self.bit, self.scale).save(tmp)
+            os.replace(tmp, self.path)
+            self._written.value += 1
+
+            # stay busy (the saver's offers are declined) until the next update is due
+            next_update = max(next_update + self.period, time.monotonic())
+            self._stop.wait(max(0, next_update - time.monotonic()))
+            self._state.value = IDLE
+            if self._stop.is_set():
+                break
+        self.shm.close()
+
+    @property
+    def written(self):
+        """Number of preview images written so far"""
+        return self._written.value
+
+    def stop(self):
+        """Stops the preview process and frees the shared buffer (in the creating process)"""
+        self._stop.set()
+        if self._process is not None and self._process.pid is not None:
+            self._process.join()
+        self.shm.close()
+        if os.getpid() == self._owner_pid:
+            self.shm.unlink()
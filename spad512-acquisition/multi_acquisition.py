@@ -0,0 +1,450 @@
+#!/usr/bin/env python
+'''
+Last updated: 2026-Oct-17
+
+asyncio acquisition engine for several SPAD512S cameras (or camera servers) and sidecar sensor
+streams in a single process, so that the host timestamps of all the streams share one clock.
+
+Each camera endpoint is a CameraStream with its own command cadence, a receive task and a write task.
+The cadences come from BatchScheduler.ticks() (see batch_scheduler.py) and are all anchored at the
+same instant, so the batch timestamps of every stream are on the same time base.
+    - The receive task sends the intensity command at each tick and reads the batch with
+      loop.sock_recv_into() straight into a free buffer of the stream's pool (no copy, as in
+      spad_receiver.py). A camera ERROR, a closed connection or no data for --timeout s close the
+      connection. It is reopened right away, then every --retry s, and the stream goes on at its
+      next tick. Ticks without a connection are counted apart, not as batches.
+    - The write task saves the received batches (one RAW_<timestamp>.bin each, or a .spad container)
+      in a worker thread, so the disk writes of all the streams overlap with each other and with the
+      receive tasks, and gives their buffers back to the pool.
+When all the buffers of a stream are waiting to be written, the receive task follows the policies of
+frame_ring.py (block, drop-oldest, drop-newest).
+
+Sidecar streams (e.g. an IMU or a GNSS receiver over TCP) are read line by line and written to
+<name>.csv, each line with its host timestamp on the same clock.
+
+The metrics record, per stream (names prefixed with the stream name), the latency from the command
+to the first byte and to DONE, the save latency, the batches waiting to be written, and the camera
+errors, timeouts and reconnects. The batch times of each stream are saved as in SPAD_1bit_cont.py.
+
+Example:
+    python multi_acquisition.py -c cam0=127.0.0.1:9999 -c cam1=192.168.1.20:9999,fps=5,exposure=0.2 -i 1000 -e 0.1 -f 10 -t 60 -m metrics.prom
+    python multi_acquisition.py -c 127.0.0.1:9999 -c 127.0.0.1:9998 -s imu=127.0.0.1:5000 -i 255 -e 0.1 -f 20 -t 10 --container
+
+'''
+import os
+import sys
+import time
+import socket
+import asyncio
+import argparse
+
+from spad_receiver import CameraError, build_command, payload_bytes, batch_buffer_size, batch_complete, save_batch
+from batch_scheduler import BatchScheduler, SCHEDULE_POLICIES
+from frame_ring import POLICIES
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "spad512-reader"))
+from spad_container import SpadContainerWriter, CODECS, CONTAINER_EXT
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data-processing"))
+from metrics import Metrics
+
+STREAM_OPTIONS = {'fps': float, 'images': int, 'exposure': float}
+
+def parse_endpoint(spec, default_name, options=()):
+    """'[name=]host:port[,key=value...]' -> (name, host, port, {key: value}), keys among options"""
+    fields = spec.split(',')
+    name, _, address = fields[0].rpartition('=')
+    host, _, port = address.rpartition(':')
+    if not host or not port.isdigit():
+        raise ValueError(f"Invalid endpoint '{spec}', expected [name=]host:port[,key=value...]")
+    values = {}
+    for field in fields[1:]:
+        key, _, value = field.partition('=')
+        if key not in options:
+            raise ValueError(f"Unknown option '{key}' in '{spec}'. Choose among {', '.join(options) or 'none'}.")
+        values[key] = STREAM_OPTIONS[key](value)
+    return name or default_name, host, int(port), values
+
+async def open_socket(host, port, timeout):
+    """Non-blocking TCP socket connected to host:port"""
+    loop = asyncio.get_running_loop()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setblocking(False)
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1) # commands are small, send them at once
+    try:
+        await asyncio.wait_for(loop.sock_connect(sock, (host, port)), timeout)
+    except BaseException:
+        sock.close()
+        raise
+    return sock
+
+async def recv_batch_async(sock, buffer, expected, chunk_size=1048576, timeout=0.5):
+    """
+    recv_batch() (see spad_receiver.py) for a non-blocking socket in an event loop: reads one batch
+    into buffer until the camera returns DONE after at least expected bytes of payload.
+
+    Returns the number of bytes received (including DONE) and the monotonic time of the first byte.
+    Raises CameraError as recv_batch(), ConnectionError if the connection is closed and TimeoutError
+    after timeout s without data.
+    """
+    loop = asyncio.get_running_loop()
+    view = memoryview(buffer).cast('B')
+    size = len(view)
+    n = 0
+    first = None
+
+    while 1:
+        if n == size:
+            raise CameraError(f"Batch exceeds the {size}-byte receive buffer", view[max(0, n - 160):n])
+
+        try:
+            received = await asyncio.wait_for(loop.sock_recv_into(sock, view[n:n + min(chunk_size, size - n)]), timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"No data from the camera for {timeout} s after {n} bytes") from None
+        if received == 0:
+            raise ConnectionError(f"Connection closed by the camera after {n} bytes")
+        if first is None:
+            first = time.monotonic()
+        n += received
+
+        if batch_complete(view, n, expected):
+            return n, first
+
+class CameraStream:
+    """
+    One camera endpoint: command cadence (fps for duration s), receive task and write task into
+    directory. run() acquires until the duration is over, then waits for all the batches to be written.
+    """
+
+    def __init__(self, name, host, port, exposure, images, fps, duration, directory, metrics, bit=1,
+                 schedule="skip", policy="block", buffers=4, chunk_size=1048576, timeout=0.5, retry=1.0,
+                 container=False, compression="none"):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown policy '{policy}'. Choose one of {', '.join(POLICIES)}.")
+        if buffers < 1:
+            raise ValueError("A stream needs at least one buffer")
+        self.name = name
+        self.host = host
+        self.port = port
+        self.bit = bit
+        self.exposure = exposure
+        self.images = images
+        self.expected = payload_bytes(bit, images)
+        self.command = build_command(bit, exposure, images)
+        self.scheduler = BatchScheduler(fps, duration, schedule)
+        self.directory = directory
+        self.metrics = metrics
+        self.policy = policy
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.retry = retry
+        self.container = container
+        self.compression = compression
+        self.buffers = [bytearray(batch_buffer_size(bit, images)) for _ in range(buffers)]
+        # batches dropped under drop-newest are still received, to keep the stream in sync
+        self.scratch = bytearray(batch_buffer_size(bit, images)) if policy == "drop-newest" else None
+        self.sock = None
+        self.saved = self.dropped = self.failed_connects = 0
+
+    def metric(self, name):
+        return f"{self.name}_{name}"
+
+    async def run(self, start=None, wall_start=None):
+        """Acquires on the time grid anchored at start (monotonic) / wall_start, shared by the other streams"""
+        self.scheduler.anchor(start, wall_start)
+        os.makedirs(self.directory, exist_ok=True)
+        self._free = asyncio.Queue()
+        for buffer in self.buffers:
+            self._free.put_nowait(buffer)
+        self._ready = asyncio.Queue()
+        writer = asyncio.ensure_future(self._write_loop())
+        try:
+            await self._recv_loop()
+        finally:
+            self._ready.put_nowait(None) # stop the writer once all the batches are saved
+            await writer
+            self._disconnect()
+
+    async def _connect(self):
+        """Opens the connection and reads the greeting. Returns False (and counts it) if it fails."""
+        loop = asyncio.get_running_loop()
+        try:
+            self.sock = await open_socket(self.host, self.port, self.timeout)
+            greeting = await asyncio.wait_for(loop.sock_recv(self.sock, 8192), self.timeout)
+            print(f"[{self.name}] {greeting.decode('utf8', 'replace').strip()}")
+            self.metrics.inc(self.metric('connects'))
+            return True
+        except (OSError, asyncio.TimeoutError) as e:
+            print(f"[{self.name}] Cannot connect to {self.host}:{self.port}: {e or type(e).__name__}")
+            self.metrics.inc(self.metric('connect_errors'))
+            self._disconnect()
+            return False
+
+    def _disconnect(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    async def _buffer(self):
+        """Free buffer of the pool, applying the policy when all of them are waiting to be written"""
+        try:
+            return self._free.get_nowait()
+        except asyncio.QueueEmpty:
+            pass
+
+        if self.policy == "drop-newest":
+            return None
+
+        if self.policy == "drop-oldest":
+            try:
+                item = self._ready.get_nowait()
+                self.dropped += 1
+                self.metrics.inc(self.metric('batches_dropped'))
+                return item[0]
+            except asyncio.QueueEmpty:
+                pass # the writer already holds every buffer, wait for one
+
+        self.metrics.inc(self.metric('batches_late'))
+        return await self._free.get()
+
+    async def _recv_loop(self):
+        loop = asyncio.get_running_loop()
+        frame_number = 0
+        next_connect = 0 # monotonic time of the next connection attempt
+
+        for tick, deadline, wait in self.scheduler.ticks():
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+            if self.sock is None:
+                # ticks without a connection are not batches: they are left out of the schedule records
+                # (and so of the batch count and start jitter) and counted in failed_connects
+                if time.monotonic() < next_connect:
+                    if not self.scheduler.period:
+                        await asyncio.sleep(next_connect - time.monotonic()) # back to back: wait for the retry
+                    continue
+                if not await self._connect():
+                    next_connect = time.monotonic() + self.retry
+                    self.failed_connects += 1
+                    continue
+                if frame_number:
+                    self.metrics.inc(self.metric('reconnects'))
+
+            buffer = await self._buffer()
+            sent, done = time.monotonic(), None
+            try:
+                await loop.sock_sendall(self.sock, self.command)
+                n, first = await recv_batch_async(self.sock, self.scratch if buffer is None else buffer,
+                                                  self.expected, self.chunk_size, self.timeout)
+                done = time.monotonic()
+            except (CameraError, OSError) as e:
+                # the stream position is unknown after an error, start over on a new connection
+                print(f"[{self.name}] Frame {frame_number} failed: {e}, reconnecting")
+                if isinstance(e, CameraError):
+                    print(e.tail)
+                    self.metrics.inc(self.metric('camera_errors'))
+                elif isinstance(e, TimeoutError):
+                    self.metrics.inc(self.metric('timeouts'))
+                else:
+                    self.metrics.inc(self.metric('connection_errors'))
+                self._disconnect()
+                next_connect = time.monotonic()
+                if buffer is not None:
+                    self._free.put_nowait(buffer)
+            else:
+                self.metrics.observe(self.metric('first_byte_seconds'), first - sent)
+                self.metrics.observe(self.metric('recv_latency_seconds'), done - sent)
+                self.metrics.observe(self.metric('batch_bytes'), n)
+                if buffer is None:
+                    print(f"[{self.name}] Frame {frame_number} dropped, saving is falling behind")
+                    self.dropped += 1
+                    self.metrics.inc(self.metric('batches_dropped'))
+                else:
+                    self._ready.put_nowait((buffer, frame_number, self.scheduler.wall(done), n)) # hand the buffer over to the writer
+                    self.metrics.observe(self.metric('write_queue_depth'), self._ready.qsize())
+                    # let a waiting writer take the batch now: a receive that completes without waiting
+                    # never yields, and drop-oldest would take the batch back before the writer runs
+                    await asyncio.sleep(0)
+
+            self.scheduler.record(tick, deadline, sent, done)
+            if self.scheduler.period:
+                self.metrics.observe(self.metric('start_jitter_seconds'), max(0, sent - deadline))
+            frame_number += 1
+
+    async def _write_loop(self):
+        writer = None
+        if self.container:
+            path = os.path.join(self.directory, f'SPAD_{self.exposure}us_{time.time()}{CONTAINER_EXT}')
+            metadata = {'exposure_us': self.exposure, 'images_per_batch': self.images, 'bit': self.bit,
+                        'fps': 1 / self.scheduler.period if self.scheduler.period else 0,
+                        'stream': self.name, 'endpoint': f"{self.host}:{self.port}"}
+            writer = SpadContainerWriter(path, metadata, self.compression)
+            print(f"[{self.name}] Saving to {path}")
+
+        try:
+            while 1:
+                item = await self._ready.get()
+                if item is None: # finish acquisition
+                    break
+
+                buffer, frame_number, frame_timestamp, nbytes = item
+                start = time.perf_counter()
+                try:
+                    # the file is written in a worker thread, the event loop keeps receiving meanwhile
+                    if writer is not None:
+                        await asyncio.to_thread(writer.append, memoryview(buffer)[:nbytes], frame_timestamp)
+                    else:
+                        path = os.path.join(self.directory, f'RAW_{frame_timestamp}.bin')
+                        await asyncio.to_thread(save_batch, path, buffer, nbytes)
+                    self.saved += 1
+                except OSError as e:
+                    print(f"[{self.name}] Frame {frame_number} not saved: {e}")
+                    self.metrics.inc(self.metric('write_errors'))
+                finally:
+                    self._free.put_nowait(buffer)
+                self.metrics.observe(self.metric('save_latency_seconds'), time.perf_counter() - start)
+        finally:
+            if writer is not None:
+                writer.close()
+
+    def report(self):
+        return f"[{self.name}] {self.scheduler.report()}\n[{self.name}] Batches saved: {self.saved}, dropped: {self.dropped}, failed connection attempts: {self.failed_connects}"
+
+class SidecarStream:
+    """
+    Line-oriented TCP stream (e.g. IMU, GNSS) written to <directory>/<name>.csv as 'host time,line'.
+    Reconnects (every retry s) when the connection fails, closes or is silent for timeout s.
+    """
+
+    def __init__(self, name, host, port, directory, metrics, timeout=5.0, retry=1.0):
+        self.name = name
+        self.host = host
+        self.port = port
+        self.directory = directory
+        self.metrics = metrics
+        self.timeout = timeout
+        self.retry = retry
+        self.lines = 0
+
+    def metric(self, name):
+        return f"{self.name}_{name}"
+
+    async def run(self, start=None, wall_start=None):
+        """Records until cancelled, with timestamps on the clock anchored at start (monotonic) / wall_start"""
+        start = time.monotonic() if start is None else start
+        wall_start = time.time() if wall_start is None else wall_start
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f'{self.name}.csv')
+
+        with open(path, 'a') as f:
+            while 1:
+                try:
+                    reader, writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), self.timeout)
+                except (OSError, asyncio.TimeoutError) as e:
+                    print(f"[{self.name}] Cannot connect to {self.host}:{self.port}: {e or type(e).__name__}")
+                    self.metrics.inc(self.metric('connect_errors'))
+                    await asyncio.sleep(self.retry)
+                    continue
+
+                self.metrics.inc(self.metric('connects'))
+                try:
+                    while 1:
+                        line = await asyncio.wait_for(reader.readline(), self.timeout)
+                        if not line:
+                            raise ConnectionError("Connection closed")
+                        timestamp = wall_start + (time.monotonic() - start)
+                        f.write(f"{timestamp:.6f},{line.decode('utf8', 'replace').rstrip()}\n")
+                        self.lines += 1
+                except (OSError, asyncio.TimeoutError) as e:
+                    print(f"[{self.name}] {e or 'No data for ' + str(self.timeout) + ' s'}, reconnecting")
+                    self.metrics.inc(self.metric('reconnects'))
+                    await asyncio.sleep(self.retry)
+                finally:
+                    writer.close()
+                    f.flush()
+
+async def acquire(cameras, sidecars=()):
+    """Runs the camera streams on one clock anchor, and the sidecar streams until the cameras are done"""
+    start, wall_start = time.monotonic(), time.time()
+    sidecar_tasks = [asyncio.ensure_future(s.run(start, wall_start)) for s in sidecars]
+    try:
+        await asyncio.gather(*(c.run(start, wall_start) for c in cameras))
+    finally:
+        for task in sidecar_tasks:
+            task.cancel()
+        await asyncio.gather(*sidecar_tasks, return_exceptions=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="user input")
+    parser.add_argument('-c', '--camera', type=str, action='append', help="Camera endpoint [name=]host:port[,fps=..][,images=..][,exposure=..] (repeat for each camera)", required=True)
+    parser.add_argument('-s', '--sidecar', type=str, action='append', help="Line-oriented sensor stream [name=]host:port (repeat for each stream)", required=False, default=[])
+    parser.add_argument('-i', '--images', type=int, help="Number of images per batch", required=True)
+    parser.add_argument('-e', '--exposure', type=float, help="Exposure time in us", required=True)
+    parser.add_argument('-t', '--time', type=float, help="Acquisition time in s", required=True)
+    parser.add_argument('-f', '--fps', type=float, help="Batches per s (0 = back to back)", required=False, default=0)
+    parser.add_argument('-o', '--output', type=str, help="Output folder (one subfolder per stream)", required=False, default=os.path.join(".", "data"))
+    parser.add_argument('-k', '--chunk', type=int, help="Socket read size in bytes", required=False, default=1048576)
+    parser.add_argument('-r', '--ring', type=int, help="Number of batch buffers per camera", required=False, default=4)
+    parser.add_argument('--policy', type=str, choices=POLICIES, help="What to do when all the batch buffers of a camera are in use", required=False, default="block")
+    parser.add_argument('--schedule', type=str, choices=SCHEDULE_POLICIES, help="When a batch overruns its period: skip the missed ticks or catch up", required=False, default="skip")
+    parser.add_argument('--timeout', type=float, help="Seconds without camera data before reconnecting", required=False, default=0.5)
+    parser.add_argument('--retry', type=float, help="Seconds between connection attempts", required=False, default=1.0)
+    parser.add_argument('--container', action='store_true', help="Save each camera as a single indexed .spad file")
+    parser.add_argument('-z', '--compression', type=str, choices=list(CODECS), help="Compression of the .spad files", required=False, default="none")
+    parser.add_argument('-m', '--metrics', type=str, help="Write run metrics to this file (.prom/.txt: Prometheus text, otherwise JSON)", required=False, default=None)
+    parser.add_argument('--metrics-interval', type=float, help="Also write the metrics every this many s (0 = only at the end)", required=False, default=0)
+
+    args = parser.parse_args()
+
+    metrics = Metrics()
+    cameras, sidecars, names = [], [], set()
+    try:
+        for k, spec in enumerate(args.camera):
+            name, host, port, options = parse_endpoint(spec, f"cam{k}", ('fps', 'images', 'exposure'))
+            if name in names:
+                raise ValueError(f"Duplicate stream name '{name}'")
+            names.add(name)
+            cameras.append(CameraStream(name, host, port, options.get('exposure', args.exposure), options.get('images', args.images),
+                                        options.get('fps', args.fps), args.time, os.path.join(args.output, name), metrics,
+                                        schedule=args.schedule, policy=args.policy, buffers=args.ring, chunk_size=args.chunk,
+                                        timeout=args.timeout, retry=args.retry, container=args.container, compression=args.compression))
+        for k, spec in enumerate(args.sidecar):
+            name, host, port, _ = parse_endpoint(spec, f"sensor{k}")
+            if name in names:
+                raise ValueError(f"Duplicate stream name '{name}'")
+            names.add(name)
+            sidecars.append(SidecarStream(name, host, port, args.output, metrics, retry=args.retry))
+    except ValueError as e:
+        parser.error(str(e))
+
+    for c in cameras:
+        fps = 1 / c.scheduler.period if c.scheduler.period else 0
+        print(f"[{c.name}] {c.host}:{c.port}, {c.images} frames of {c.exposure} us per batch, {fps:g} batches per s")
+    print(f'Total acquisition time: {args.time} s')
+
+    if args.metrics and args.metrics_interval > 0:
+        metrics.start_periodic(args.metrics, args.metrics_interval)
+    start = time.monotonic()
+    try:
+        asyncio.run(acquire(cameras, sidecars))
+    except KeyboardInterrupt:
+        print("Acquisition interrupted")
+    finally:
+        metrics.stop_periodic()
+    print("Acquisition time: ", "{:.2f}".format((time.monotonic() - start)*1000), " ms")
+
+    for c in cameras:
+        print(c.report())
+        if c.scheduler.records:
+            times_file = os.path.join(c.directory, f'batch_times_{c.scheduler.wall_start}.csv')
+            c.scheduler.save(times_file)
+            print(f"[{c.name}] Batch times saved as '{times_file}'")
+    for s in sidecars:
+        print(f"[{s.name}] Lines recorded: {s.lines}")
+
+    print(metrics.report())
+    if args.metrics:
+        metrics.write(args.metrics)
+        print(f"Metrics saved as '{args.metrics}'")
+
+if __name__ == "__main__":
+    main()
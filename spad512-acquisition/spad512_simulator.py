@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+'''
+Last updated: 2026-Oct-17
+
+Local stand-in for the SPAD512S TCP server, so that the acquisition scripts can be run and benchmarked
+without the camera. It speaks the same protocol as the camera:
+    - a greeting as soon as a client connects,
+    - intensity commands 'I,<bit>,<exposure>,<images>,...' terminated by a newline,
+    - packed frames (images * 512 * 512 * bit / 8 bytes) followed by "DONE",
+    - "ERROR" for commands it cannot parse.
+
+Frames are synthetic photon-counting frames: each pixel fires with probability 1 - exp(-rate * exposure)
+where rate (photons per pixel per us) is scaled by a smooth synthetic scene. A pool of frames is
+generated once per exposure and reused, so the simulator does not limit the throughput. The link speed
+can be throttled to reproduce the camera's USB/Ethernet bandwidth.
+
+Every batch served is logged (command received, DONE sent, bytes), see bench_capture.py.
+
+Example:
+    python spad512_simulator.py --rate 0.5 --link 300
+    python SPAD_1bit_capture.py -f test -b 1 -i 256 -e 0.1
+
+'''
+import time
+import argparse
+import threading
+import socketserver
+import numpy as np
+
+IMG_WIDTH = 512
+IMG_HEIGHT = 512
+GREETING = b"SPAD512S simulator ready\n"
+SEND_CHUNK = 65536
+
+def synthetic_scene(seed=0):
+    """Smooth relative brightness map in [0.05, 1] (a bright blob over a dim gradient)"""
+    y, x = np.mgrid[0:IMG_HEIGHT, 0:IMG_WIDTH] / IMG_WIDTH
+    rng = np.random.default_rng(seed)
+    cx, cy = rng.uniform(0.3, 0.7, 2)
+    blob = np.exp(-((x - cx)**2 + (y - cy)**2) / 0.02)
+    return 0.05 + 0.95 * np.clip(0.3 * x + 0.7 * blob, 0, 1)
+
+class SpadSimulator(socketserver.ThreadingTCPServer):
+    """
+    Threaded TCP server emulating the SPAD512S. rate is in photons per pixel per us at the brightest
+    point of the scene, link_mbps caps the outgoing data rate in MB/s (0 = unlimited).
+    """
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=9999, rate=0.5, link_mbps=0, pool_frames=64, seed=0):
+        super().__init__((host, port), _SpadHandler)
+        self.rate = rate
+        self.link_mbps = link_mbps
+        self.pool_frames = pool_frames
+        self.scene = synthetic_scene(seed)
+        self.rng = np.random.default_rng(seed)
+        self.batches = [] # (command time, done time, bytes, frames), perf_counter clock
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def frame_pool(self, bit, exposure):
+        """Packed frames for a bit depth and exposure, generated on first use"""
+        key = (bit, exposure)
+        with self._lock:
+            if key not in self._pools:
+                if bit == 1:
+                    p = 1 - np.exp(-self.rate * exposure * self.scene)
+                    bits = self.rng.random((self.pool_frames, IMG_HEIGHT, IMG_WIDTH)) < p
+                    pool = np.packbits(bits, axis=-1)
+                else:
+                    pool = self.rng.integers(0, 256, (self.pool_frames, IMG_HEIGHT * IMG_WIDTH * bit // 8), dtype=np.uint8)
+                self._pools[key] = pool.reshape(self.pool_frames, -1)
+            return self._pools[key]
+
+    def log_batch(self, command_time, done_time, nbytes, frames):
+        with self._lock:
+            self.batches.append((command_time, done_time, nbytes, frames))
+
+    def reset_log(self):
+        with self._lock:
+            self.batches = []
+
+    def start(self):
+        """Serves in a background thread, returns the port actually used (useful with port=0)"""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self.server_address[1]
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+class _SpadHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        server = self.server
+        self.wfile.write(GREETING)
+
+        while 1:
+            line = self.rfile.readline()
+            if not line:
+                break
+            command_time = time.perf_counter()
+
+            try:
+                fields = line.decode('utf8').strip().split(',')
+                if fields[0] != 'I':
+                    raise ValueError(f"unsupported command {fields[0]}")
+                bit, exposure, images = int(fields[1]), float(fields[2]), int(fields[3])
+                if bit not in (1, 4, 8, 10, 12) or images < 1:
+                    raise ValueError("invalid bit depth or number of images")
+            except (ValueError, IndexError) as e:
+                self.wfile.write(f"Invalid command '{line.strip().decode('utf8', 'replace')}': {e} ERROR".encode('utf8'))
+                continue
+
+            pool = server.frame_pool(bit, exposure)
+            sent = 0
+            for i in range(images):
+                frame = pool[i % len(pool)]
+                for s in range(0, len(frame), SEND_CHUNK):
+                    self._throttled_send(frame[s:s + SEND_CHUNK], command_time, sent)
+                    sent += len(frame[s:s + SEND_CHUNK])
+            self.wfile.write(b"DONE")
+            self.wfile.flush()
+
+            server.log_batch(command_time, time.perf_counter(), sent + 4, images)
+
+    def _throttled_send(self, data, start, sent):
+        if self.server.link_mbps > 0:
+            due = start + (sent + len(data)) / (self.server.link_mbps * 1e6)
+            wait = due - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+        self.wfile.write(data)
+
+def main():
+    parser = argparse.ArgumentParser(description="user input")
+    parser.add_argument('--host', type=str, help="Address to listen on", required=False, default="127.0.0.1")
+    parser.add_argument('--port', type=int, help="Port to listen on", required=False, default=9999)
+    parser.add_argument('-r', '--rate', type=float, help="Photons per pixel per us (brightest point)", required=False, default=0.5)
+    parser.add_argument('-l', '--link', type=float, help="Link speed in MB/s (0 = unlimited)", required=False, default=0)
+
+    args = parser.parse_args()
+
+    server = SpadSimulator(args.host, args.port, args.rate, args.link)
+    print(f"SPAD512S simulator listening on {args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+'''
+Last updated: 2026-Oct-17
+
+Receive path shared by SPAD_1bit_capture.py and SPAD_1bit_cont.py.
+
+The size of the data returned by the SPAD512s for an intensity command 'I,<bit>,<exposure>,<images>,...'
+is known in advance (images * 512 * 512 * bit / 8 bytes followed by "DONE"), so each batch is read with
+socket.recv_into() straight into a preallocated buffer instead of growing a bytearray chunk by chunk.
+The terminator is looked for at the end of everything received so far (not of the last chunk only),
+so a "DONE" or "ERROR" split across two recv calls is still detected, and "DONE" is only accepted once
+the whole payload has arrived.
+
+The buffer can then be handed to the saver as a memoryview without any copy (see save_batch()).
+batch_complete() is the same terminator check for other receive loops (see multi_acquisition.py).
+
+'''
+import time
+
+IMG_WIDTH = 512
+IMG_HEIGHT = 512
+DONE = b"DONE"
+ERROR = b"ERROR"
+ERROR_SLACK = 1024 # extra room at the end of the buffer for the camera's error message
+
+class CameraError(Exception):
+    """Raised when the camera terminates a batch with ERROR. The tail of the received data is kept in .tail"""
+
+    def __init__(self, message, tail=b""):
+        super().__init__(message)
+        self.tail = bytes(tail)
+
+def build_command(bit, exposure, images):
+    """Intensity command for binary image streaming with overlap, no frame triggering"""
+    return bytes("I," + str(bit) + "," + str(exposure) + "," + str(images) + ",0" + ",1" + ",0" + ",1" + '\n', "utf8")
+
+def payload_bytes(bit, images):
+    """Number of bytes the camera streams for a batch of images (without the DONE terminator)"""
+    return images * IMG_WIDTH * IMG_HEIGHT * bit // 8
+
+def batch_buffer_size(bit, images):
+    """Size of a buffer large enough to hold a whole batch, its terminator and an error message"""
+    return payload_bytes(bit, images) + len(DONE) + ERROR_SLACK
+
+def recv_batch(sock, buffer, expected, chunk_size=262144):
+    """
+    Reads one batch from sock into buffer (bytearray, memoryview or any writable buffer) until the
+    camera returns DONE after at least expected bytes of payload.
+
+    Returns the number of bytes received, including the "DONE" terminator.
+    Raises CameraError if the camera returns ERROR or if the batch does not fit in buffer, and
+    ConnectionError if the connection is closed before the batch is complete.
+    """
+    view = memoryview(buffer).cast('B')
+    size = len(view)
+    n = 0
+
+    while 1:
+        if n == size:
+            raise CameraError(f"Batch exceeds the {size}-byte receive buffer", view[max(0, n - 160):n])
+
+        received = sock.recv_into(view[n:], min(chunk_size, size - n))
+        if received == 0:
+            raise ConnectionError(f"Connection closed by the camera after {n} bytes")
+        n += received
+
+        if batch_complete(view, n, expected):
+            return n
+
+def batch_complete(view, n, expected):
+    """
+    True once the n bytes received into view end with DONE after at least expected bytes of payload.
+    Raises CameraError if they end with ERROR.
+    """
+    # check the end of all the data received so far, so split terminators are found too
+    if n >= expected + len(DONE) and view[n - len(DONE):n] == DONE:
+        return True
+
+    if n >= len(ERROR) and view[n - len(ERROR):n] == ERROR:
+        raise CameraError("Camera returned ERROR", view[max(0, n - 160):n])
+    return False
+
+def save_batch(path, buffer, nbytes):
+    """Writes the first nbytes of buffer to path without copying it"""
+    with open(path, 'wb') as f:
+        f.write(memoryview(buffer)[:nbytes])
+
+class SpadReceiver:
+    """
+    Keeps a reusable receive buffer for a given batch size. request() sends the intensity command and
+    returns a memoryview of the received data (payload + DONE), valid until the next request.
+    The monotonic times at which the last command was sent and its batch completed are kept in
+    .sent_time and .done_time.
+    """
+
+    def __init__(self, sock, bit, exposure, images, chunk_size=262144):
+        self.sock = sock
+        self.bit = bit
+        self.exposure = exposure
+        self.images = images
+        self.chunk_size = chunk_size
+        self.expected = payload_bytes(bit, images)
+        self.buffer = bytearray(batch_buffer_size(bit, images))
+        self.command = build_command(bit, exposure, images)
+        self.sent_time = self.done_time = None
+
+    def set_exposure(self, exposure):
+        """Changes the exposure of the next requests (same batch size, so the buffer is kept)"""
+        self.exposure = exposure
+        self.command = build_command(self.bit, exposure, self.images)
+
+    def greeting(self, size=8192):
+        """Reads the server response sent right after connecting"""
+        return self.sock.recv(size)
+
+    def request(self, buffer=None):
+        """Sends the command and receives one batch into buffer (default: the receiver's own buffer)"""
+        buffer = self.buffer if buffer is None else buffer
+        self.done_time = None
+        self.sent_time = time.monotonic()
+        self.sock.sendall(self.command)
+        n = recv_batch(self.sock, buffer, self.expected, self.chunk_size)
+        self.done_time = time.monotonic()
+        return memoryview(buffer)[:n]
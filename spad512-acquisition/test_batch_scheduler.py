@@ -0,0 +1,75 @@
+import pytest
+
+from batch_scheduler import BatchScheduler
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+def run(scheduler, clock, batch_seconds):
+    """Runs the scheduler's ticks with batches taking batch_seconds(tick) each, returns the ticks started"""
+    started = []
+    for tick, deadline, wait in scheduler.ticks():
+        clock.now += max(wait, 0)
+        scheduler.record(tick, deadline, clock.now, clock.now + batch_seconds(tick))
+        clock.now += batch_seconds(tick)
+        started.append(tick)
+    return started
+
+def test_on_time():
+    clock = FakeClock()
+    scheduler = BatchScheduler(10, 1, clock=clock)
+    assert run(scheduler, clock, lambda tick: 0.05) == list(range(10))
+    s = scheduler.stats()
+    assert (s['batches'], s['missed'], s['jitter_max_ms']) == (10, 0, 0)
+    assert s['achieved_rate'] == pytest.approx(10)
+
+def test_skip():
+    # batch 2 takes 0.25 s: ticks 3 and 4 are skipped and the next batch starts on tick 5
+    clock = FakeClock()
+    scheduler = BatchScheduler(10, 1, "skip", clock=clock)
+    started = run(scheduler, clock, lambda tick: 0.25 if tick == 2 else 0.05)
+    assert started == [0, 1, 2, 5, 6, 7, 8, 9]
+    s = scheduler.stats()
+    assert (s['skipped'], s['late'], s['missed']) == (2, 0, 2)
+
+def test_skip_slightly_late():
+    # within late_tolerance of the next tick: started right away instead of skipped
+    clock = FakeClock()
+    scheduler = BatchScheduler(10, 1, "skip", late_tolerance=0.002, clock=clock)
+    started = run(scheduler, clock, lambda tick: 0.101 if tick == 2 else 0.05)
+    assert started == list(range(10))
+    assert scheduler.stats()['missed'] == 0
+
+def test_catch_up():
+    # late ticks run back to back until the schedule is caught up, no batch is lost
+    clock = FakeClock()
+    scheduler = BatchScheduler(10, 1, "catch-up", clock=clock)
+    started = run(scheduler, clock, lambda tick: 0.25 if tick == 2 else 0.05)
+    assert started == list(range(10))
+    s = scheduler.stats()
+    assert s['skipped'] == 0
+    assert s['late'] == 3 # ticks 3, 4 and 5 start late, tick 6 is on time again
+    assert s['jitter_max_ms'] == pytest.approx(150)
+
+def test_back_to_back():
+    clock = FakeClock()
+    scheduler = BatchScheduler(0, 1, clock=clock)
+    assert len(run(scheduler, clock, lambda tick: 0.125)) == 8
+    s = scheduler.stats()
+    assert s['missed'] == 0
+    assert not any(key.startswith('jitter') for key in s)
+    assert "back to back" in scheduler.report()
+
+def test_wall():
+    clock = FakeClock()
+    scheduler = BatchScheduler(10, 1, clock=clock)
+    scheduler.anchor(start=100.0, wall_start=1700000000.0)
+    assert scheduler.wall(100.5) == pytest.approx(1700000000.5)
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        BatchScheduler(10, 1, "wait")
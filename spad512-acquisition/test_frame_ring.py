@@ -0,0 +1,96 @@
+import time
+import threading
+import pytest
+
+from frame_ring import FrameRing
+
+SLOT_SIZE = 64
+
+def settle():
+    # multiprocessing queues hand items over through a feeder thread, give it time to flush
+    time.sleep(0.1)
+
+@pytest.fixture
+def make_ring():
+    rings = []
+    def make(slots, policy):
+        rings.append(FrameRing(slots, SLOT_SIZE, policy))
+        settle()
+        return rings[-1]
+    yield make
+    for ring in rings:
+        ring.close()
+
+def fill(ring, frame_number):
+    slot, buf = ring.acquire()
+    buf[:1] = bytes([frame_number])
+    ring.commit(slot, frame_number, float(frame_number), 1)
+    settle()
+    return slot
+
+def drain(ring):
+    """Frame numbers and first bytes of the batches waiting to be consumed"""
+    ring.close_input()
+    batches = []
+    while (item := ring.get()) is not None:
+        slot, frame_number, _, _ = item
+        batches.append((frame_number, ring.view(slot)[0]))
+        ring.release(slot)
+    return batches
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        FrameRing(2, SLOT_SIZE, "drop-all")
+    with pytest.raises(ValueError):
+        FrameRing(0, SLOT_SIZE)
+
+def test_round_trip(make_ring):
+    ring = make_ring(3, "block")
+    for i in range(3):
+        fill(ring, i)
+    assert drain(ring) == [(0, 0), (1, 1), (2, 2)]
+    s = ring.stats()
+    assert (s['committed'], s['released'], s['dropped'], s['late'], s['depth'], s['max_depth']) == (3, 3, 0, 0, 0, 3)
+
+def test_drop_newest(make_ring):
+    ring = make_ring(2, "drop-newest")
+    fill(ring, 0)
+    fill(ring, 1)
+    assert ring.acquire() is None
+    assert ring.stats()['dropped'] == 1
+    assert drain(ring) == [(0, 0), (1, 1)]
+
+def test_drop_oldest(make_ring):
+    ring = make_ring(2, "drop-oldest")
+    for i in range(4):
+        fill(ring, i)
+    s = ring.stats()
+    assert (s['dropped'], s['depth'], s['max_depth']) == (2, 2, 2)
+    assert drain(ring) == [(2, 2), (3, 3)]
+
+def test_drop_oldest_waits_for_saver(make_ring):
+    # every slot held by the consumer: nothing can be taken back, acquire() waits like "block"
+    ring = make_ring(1, "drop-oldest")
+    fill(ring, 0)
+    item = ring.get()
+    threading.Timer(0.2, ring.release, (item[0],)).start()
+    assert ring.acquire()[0] == item[0]
+    assert ring.stats()['late'] == 1
+    assert ring.stats()['dropped'] == 0
+
+def test_block(make_ring):
+    ring = make_ring(2, "block")
+    fill(ring, 0)
+    fill(ring, 1)
+    acquired = []
+    producer = threading.Thread(target=lambda: acquired.append(ring.acquire()))
+    producer.start()
+    producer.join(0.3)
+    assert producer.is_alive() # waits for the consumer
+
+    slot = ring.get()[0]
+    ring.release(slot)
+    producer.join(5)
+    assert acquired[0][0] == slot
+    assert ring.stats()['late'] == 1
+    assert ring.stats()['dropped'] == 0
@@ -0,0 +1,52 @@
+import asyncio
+import pytest
+
+from multi_acquisition import CameraStream, parse_endpoint
+from spad512_simulator import SpadSimulator
+from metrics import Metrics
+
+@pytest.fixture
+def simulator():
+    server = SpadSimulator(port=0, pool_frames=4)
+    port = server.start()
+    yield port
+    server.stop()
+
+@pytest.mark.parametrize("policy", ["block", "drop-oldest", "drop-newest"])
+def test_single_buffer(simulator, tmp_path, policy):
+    stream = CameraStream("cam0", "127.0.0.1", simulator, exposure=0.1, images=8, fps=0, duration=1,
+                          directory=str(tmp_path), metrics=Metrics(), policy=policy, buffers=1)
+    asyncio.run(stream.run())
+    batches = stream.scheduler.stats()['batches']
+    assert batches > 10
+    assert stream.saved + stream.dropped == batches
+    assert len(list(tmp_path.glob("RAW_*.bin"))) == stream.saved
+    if policy == "drop-newest":
+        # batches received while the writer holds the only buffer are dropped
+        assert stream.saved > 0
+    else:
+        # the writer holds the only buffer while saving: nothing is left in the queue to drop
+        assert stream.dropped == 0
+
+CAMERA_OPTIONS = ('fps', 'images', 'exposure')
+
+@pytest.mark.parametrize("spec, expected", [
+    ("192.168.1.10:9999", ("cam0", "192.168.1.10", 9999, {})),
+    ("left=192.168.1.10:9999", ("left", "192.168.1.10", 9999, {})),
+    ("right=localhost:9998,fps=5,images=100", ("right", "localhost", 9998, {'fps': 5.0, 'images': 100})),
+    ("127.0.0.1:9999,exposure=0.5", ("cam0", "127.0.0.1", 9999, {'exposure': 0.5})),
+])
+def test_parse_endpoint(spec, expected):
+    assert parse_endpoint(spec, "cam0", CAMERA_OPTIONS) == expected
+
+@pytest.mark.parametrize("spec, options", [
+    ("192.168.1.10", CAMERA_OPTIONS),
+    ("cam=:9999", CAMERA_OPTIONS),
+    ("localhost:port", CAMERA_OPTIONS),
+    ("localhost:9999,gain=2", CAMERA_OPTIONS),
+    ("localhost:9999,fps=5", ()), # sensors take no options
+    ("localhost:9999,images=many", CAMERA_OPTIONS),
+])
+def test_parse_endpoint_invalid(spec, options):
+    with pytest.raises(ValueError):
+        parse_endpoint(spec, "sensor0", options)
@@ -0,0 +1,47 @@
+import time
+import socket
+import numpy as np
+import pytest
+
+from spad512_simulator import SpadSimulator, GREETING
+from spad_receiver import SpadReceiver, CameraError, DONE
+
+@pytest.fixture
+def simulator():
+    server = SpadSimulator(port=0, rate=0.5, pool_frames=4)
+    port = server.start()
+    with socket.create_connection(("127.0.0.1", port)) as sock:
+        yield server, sock
+    server.stop()
+
+def test_batch(simulator):
+    server, sock = simulator
+    receiver = SpadReceiver(sock, 1, 0.1, 6)
+    assert receiver.greeting() == GREETING
+
+    data = receiver.request()
+    assert len(data) == 6 * 32768 + len(DONE)
+    frames = np.frombuffer(data[:-len(DONE)], dtype=np.uint8).reshape(6, -1)
+    pool = server.frame_pool(1, 0.1)
+    assert np.array_equal(frames, pool[[0, 1, 2, 3, 0, 1]]) # the pool is cycled
+    deadline = time.monotonic() + 2
+    while not server.batches and time.monotonic() < deadline: # logged right after DONE is sent
+        time.sleep(0.01)
+    assert server.batches[-1][2:] == (len(data), 6)
+
+def test_photon_rate(simulator):
+    server, _ = simulator
+    pool = np.unpackbits(server.frame_pool(1, 2.0), axis=-1).reshape(4, 512, 512)
+    expected = 1 - np.exp(-0.5 * 2.0 * server.scene)
+    assert pool.mean() == pytest.approx(expected.mean(), rel=0.02)
+
+def test_invalid_command(simulator):
+    server, sock = simulator
+    receiver = SpadReceiver(sock, 3, 0.1, 2)
+    receiver.greeting()
+    with pytest.raises(CameraError):
+        receiver.request()
+
+    # the connection is still usable
+    receiver = SpadReceiver(sock, 8, 0.1, 2)
+    assert len(receiver.request()) == 2 * 512 * 512 + len(DONE)
@@ -0,0 +1,58 @@
+import pytest
+
+from spad_receiver import recv_batch, batch_buffer_size, payload_bytes, CameraError, DONE
+
+class ChunkedSocket:
+    """Socket stub that returns data in the given pieces, one per recv_into call"""
+
+    def __init__(self, pieces):
+        self.pieces = [bytes(p) for p in pieces]
+
+    def recv_into(self, view, nbytes):
+        if not self.pieces:
+            return 0
+        piece = self.pieces.pop(0)
+        n = min(len(piece), nbytes, len(view))
+        view[:n] = piece[:n]
+        if n < len(piece):
+            self.pieces.insert(0, piece[n:])
+        return n
+
+def split(data, cuts):
+    bounds = [0, *cuts, len(data)]
+    return [data[a:b] for a, b in zip(bounds, bounds[1:])]
+
+EXPECTED = 100
+PAYLOAD = bytes(range(EXPECTED))
+
+@pytest.mark.parametrize("cuts", [[], [50], [EXPECTED + 1], [EXPECTED + 2, EXPECTED + 3], list(range(1, EXPECTED + 4))])
+def test_split_done(cuts):
+    buffer = bytearray(EXPECTED + 64)
+    n = recv_batch(ChunkedSocket(split(PAYLOAD + DONE, cuts)), buffer, EXPECTED)
+    assert n == EXPECTED + len(DONE)
+    assert buffer[:n] == PAYLOAD + DONE
+
+def test_done_in_payload():
+    # a payload chunk ending with the bytes "DONE" is not the terminator
+    payload = b"x" * 46 + DONE + b"y" * 50
+    buffer = bytearray(EXPECTED + 64)
+    n = recv_batch(ChunkedSocket([payload[:50], payload[50:], DONE]), buffer, EXPECTED)
+    assert buffer[:n] == payload + DONE
+
+@pytest.mark.parametrize("cuts", [[], [2], [30, 32]])
+def test_split_error(cuts):
+    with pytest.raises(CameraError) as e:
+        recv_batch(ChunkedSocket(split(b"x" * 30 + b"ERROR", cuts)), bytearray(EXPECTED + 64), EXPECTED)
+    assert e.value.tail.endswith(b"ERROR")
+
+def test_overflow():
+    with pytest.raises(CameraError):
+        recv_batch(ChunkedSocket([PAYLOAD + b"z" * 100 + DONE]), bytearray(EXPECTED + 64), EXPECTED)
+
+def test_closed():
+    with pytest.raises(ConnectionError):
+        recv_batch(ChunkedSocket([PAYLOAD[:40]]), bytearray(EXPECTED + 64), EXPECTED)
+
+def test_buffer_size():
+    assert payload_bytes(1, 255) == 255 * 512 * 64
+    assert batch_buffer_size(1, 255) > payload_bytes(1, 255) + len(DONE)
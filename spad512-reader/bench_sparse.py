@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+'''
+Last updated: 2026-Oct-17
+
+Sparse vs dense aggregation benchmark. For random 1-bit frames of a set of photon densities (fraction
+of pixels with a photon), times the sum of the frames into a photon-count image:
+    - unpackbits: np.unpackbits of the packed frames summed over frames (the dense display path),
+    - count_photons: bit-plane sum of the packed frames (digitize_bin.py),
+    - sparse: SparseFrames.sum() of frames already stored as events (sparse_frames.py),
+    - sparse+convert: SparseFrames.from_packed() followed by sum(), i.e. starting from packed frames,
+and reports the size of the events against the packed frames and the crossover densities below which
+the sparse sum is faster than each dense one (interpolated between the measured densities).
+
+Example:
+    python bench_sparse.py --frames 255 --densities 0.0001 0.001 0.01 0.05 0.1 0.3 --json bench_sparse.json
+
+'''
+import sys
+import json
+import time
+import argparse
+import numpy as np
+
+from spad_reader import FRAME_BYTES
+from digitize_bin import count_photons
+from sparse_frames import SparseFrames, FRAME_PIXELS
+
+METHODS = ("unpackbits", "count_photons", "sparse", "sparse+convert")
+
+def random_frames(n_frames, density, seed=0):
+    """Packed frames (n, 512, 64) with each pixel set with probability density"""
+    rng = np.random.default_rng(seed)
+    bits = rng.random((n_frames, 512, 512), dtype=np.float32) < density
+    return np.packbits(bits, axis=-1)
+
+def best_time(fn, repeats):
+    """Shortest of repeats runs, in s"""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def bench_density(n_frames, density, repeats):
+    packed = random_frames(n_frames, density)
+    sparse = SparseFrames.from_packed(packed)
+    reference = count_photons(packed)
+    if not np.array_equal(sparse.sum(), reference):
+        raise RuntimeError(f"Sparse sum differs from count_photons at density {density}")
+
+    fns = {
+        'unpackbits': lambda: np.unpackbits(packed, axis=-1).sum(axis=0, dtype=np.uint32),
+        'count_photons': lambda: count_photons(packed),
+        'sparse': lambda: sparse.sum(),
+        'sparse+convert': lambda: SparseFrames.from_packed(packed).sum(),
+    }
+    result = {'density': density, 'events': len(sparse.indices),
+              'size_ratio': sparse.nbytes / (n_frames * FRAME_BYTES)}
+    for name in METHODS:
+        result[name + '_ms'] = best_time(fns[name], repeats) * 1000
+    return result
+
+def crossover(results, sparse, dense):
+    """Density at which the sparse time reaches the dense time (log-linear interpolation), None if never"""
+    d = np.array([r['density'] for r in results])
+    diff = np.array([r[sparse + '_ms'] - r[dense + '_ms'] for r in results])
+    if diff[0] >= 0:
+        return None if len(d) and diff[0] > 0 else float(d[0])
+    for k in range(1, len(d)):
+        if diff[k] >= 0:
+            x0, x1 = np.log(d[k - 1]), np.log(d[k])
+            return float(np.exp(x0 + (x1 - x0) * -diff[k - 1] / (diff[k] - diff[k - 1])))
+    return float('inf') # faster at all the measured densities
+
+def main():
+    parser = argparse.ArgumentParser(description="user input")
+    parser.add_argument('-n', '--frames', type=int, help="Frames summed per measurement", required=False, default=255)
+    parser.add_argument('-d', '--densities', type=float, nargs='+', help="Photon densities (fraction of pixels)", required=False,
+                        default=[0.0001, 0.0003, 0.001, 0.003, 0.01, 0.03, 0.1, 0.3])
+    parser.add_argument('-r', '--repeats', type=int, help="Runs per measurement (the fastest is kept)", required=False, default=3)
+    parser.add_argument('--json', type=str, help="Write the results to this JSON file", required=False, default=None)
+
+    args = parser.parse_args()
+    densities = sorted(args.densities)
+    if not densities or densities[0] <= 0 or densities[-1] > 1:
+        parser.error("Densities must be in (0, 1]")
+
+    print(f"{args.frames} frames ({args.frames * FRAME_PIXELS / 1e6:.1f} Mpixel) per sum, best of {args.repeats}")
+    print(f"{'density':>9} {'events':>10} {'size':>7} " + " ".join(f"{m + ' ms':>18}" for m in METHODS))
+    results = []
+    for density in densities:
+        try:
+            r = bench_density(args.frames, density, args.repeats)
+        except RuntimeError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        results.append(r)
+        print(f"{density:>9.4g} {r['events']:>10} {r['size_ratio']:>7.3f} " + " ".join(f"{r[m + '_ms']:>18.2f}" for m in METHODS))
+
+    crossovers = {f"{s}_vs_{d}": crossover(results, s, d) for s in ("sparse", "sparse+convert") for d in ("unpackbits", "count_photons")}
+    crossovers['storage'] = 1 / 32
+    for name, value in crossovers.items():
+        text = "never faster" if value is None else "faster at all densities" if value == float('inf') else f"{value:.4g}"
+        print(f"Crossover {name}: {text}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'settings': vars(args), 'results': results,
+                       'crossover_density': {k: (None if v in (None, float('inf')) else v) for k, v in crossovers.items()}}, f, indent=2)
+        print(f"Results saved as '{args.json}'")
+
+if __name__ == "__main__":
+    main()
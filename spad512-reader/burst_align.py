@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+'''
+Last updated: 2026-Oct-17
+
+Motion-compensated aggregation of 1-bit frames, for n-bit images taken while the rover moves.
+
+A plain n-bit image sums 2^b-1 consecutive frames (count_photons, see digitize_bin.py), which blurs
+the scene if it moves during the block. Here the block is split into sub-bursts of sub_frames frames
+(15 by default), all summed at once with the bit-plane sums of count_photons, and the shift of every sub-burst against the middle
+one is estimated by phase correlation (one batched FFT of all the sub-bursts, downsampled by
+downsample x downsample pixel blocks, with sub-pixel peak interpolation). The shifts are either used as
+measured (motion="free") or fitted with a constant velocity over the block (motion="linear", default,
+much less noisy in low light). The sub-bursts are then shifted back (to the nearest pixel) and summed.
+
+With tiles > 1, the image is split into tiles x tiles tiles and a shift is estimated per tile (e.g. the
+ground near the rover moves faster than the horizon). Pixels that some sub-bursts do not cover after
+shifting are scaled up by the fraction of frames that did.
+
+Only the packed frames of one block and its sub-burst sums are in memory at a time (about 9 MB for
+8-bit images), so acquisitions of any length are processed in bounded memory.
+
+Example:
+    with open_acquisition('./data/intensity_images/acq00001') as acq:
+        counts, shifts = align_burst(acq.window(0, 255), sub_frames=15, tiles=2)
+    python digitize_bin.py -f ./data/intensity_images/acq00001 -b 8 --motion 15 --tiles 2
+    python burst_align.py -f ./data/intensity_images/acq00001 -b 8 -s 15
+
+'''
+import sys
+import time
+import argparse
+import numpy as np
+
+from spad_reader import open_acquisition, IMG_WIDTH, IMG_HEIGHT, FRAME_BYTES
+from digitize_bin import count_photons, image_starts, _BYTE_LANES
+
+MOTION_MODELS = ("linear", "free")
+
+def subburst_sums(packed, sub_frames):
+    """
+    (photon counts (k, 512, 512) uint8, frames per sub-burst) of the consecutive sub-bursts (up to 255
+    frames) of a block, in the orientation of the packed frames (not rotated). As count_photons, but
+    all the full sub-bursts at once.
+    """
+    packed = np.ascontiguousarray(packed)
+    full = len(packed) // sub_frames
+    frames = [sub_frames] * full + ([len(packed) - full * sub_frames] if len(packed) % sub_frames else [])
+    sums = np.empty((len(frames), IMG_HEIGHT, IMG_WIDTH), dtype=np.uint8)
+
+    if full:
+        words = packed[:full * sub_frames].reshape(full, sub_frames, -1).view(np.uint64)
+        tmp = np.empty_like(words)
+        for b in range(8):
+            np.right_shift(words, np.uint64(7 - b), out=tmp)
+            np.bitwise_and(tmp, _BYTE_LANES, out=tmp)
+            sums[:full, :, b::8] = tmp.sum(axis=1, dtype=np.uint64).view(np.uint8).reshape(full, IMG_HEIGHT, IMG_WIDTH // 8)
+    if len(frames) > full:
+        sums[full] = np.rot90(count_photons(packed[full * sub_frames:]), -1)
+    return sums, np.array(frames)
+
+def _downsample(images, factor):
+    """Sum (float32) of factor x factor pixel blocks over the last two axes"""
+    h, w = images.shape[-2] // factor, images.shape[-1] // factor
+    rows = images[..., :h * factor, :w * factor].reshape(*images.shape[:-2], h, factor, w * factor).sum(axis=-2, dtype=np.float32)
+    return sum(rows[..., i::factor] for i in range(factor))
+
+def _tile(images, tiles):
+    """(..., k, H, W) -> (tiles, tiles, ..., k, H / tiles, W / tiles) views"""
+    h, w = images.shape[-2] // tiles, images.shape[-1] // tiles
+    return np.stack([np.stack([images[..., y * h:(y + 1) * h, x * w:(x + 1) * w] for x in range(tiles)]) for y in range(tiles)])
+
+def estimate_shifts(images, reference, downsample=4):
+    """
+    Shifts (..., k, 2) in pixels (dy, dx) of images (..., k, H, W) against images[..., reference, :, :],
+    such that images[k](p) ~ images[reference](p - shift), by phase correlation of downsampled images.
+    Also returns the strength (..., k) of each correlation peak, in standard deviations of the
+    correlation (about 5 for images of pure noise).
+    """
+    small = _downsample(images, downsample)
+    small -= small.mean(axis=(-2, -1), keepdims=True)
+    h, w = small.shape[-2:]
+    small *= np.outer(np.hanning(h), np.hanning(w)).astype(np.float32) # less wrap-around at the borders
+
+    spectra = np.fft.rfft2(small)
+    cross = spectra * np.conj(spectra[..., reference:reference + 1, :, :])
+    cross /= np.abs(cross) + 1e-6
+    corr = np.fft.irfft2(cross, s=(h, w))
+
+    flat = corr.reshape(*corr.shape[:-2], -1).argmax(axis=-1)
+    py, px = np.unravel_index(flat, (h, w))
+
+    def refine(c_prev, c0, c_next):
+        # parabola through the peak and its neighbours
+        denom = c_prev - 2 * c0 + c_next
+        return np.where(np.abs(denom) > 1e-12, 0.5 * (c_prev - c_next) / np.where(denom == 0, 1, denom), 0)
+
+    take = lambda dy, dx: np.take_along_axis(corr.reshape(*corr.shape[:-2], -1), (((py + dy) % h) * w + (px + dx) % w)[..., None], -1)[..., 0]
+    c0 = take(0, 0)
+    sy = refine(take(-1, 0), c0, take(1, 0))
+    sx = refine(take(0, -1), c0, take(0, 1))
+
+    dy = np.where(py > h // 2, py - h, py) + sy
+    dx = np.where(px > w // 2, px - w, px) + sx
+    strength = c0 / np.maximum(corr.std(axis=(-2, -1)), 1e-12)
+    return np.stack((dy, dx), axis=-1) * downsample, strength
+
+def fit_linear(shifts, times, reference, weights):
+    """
+    Constant-velocity fit of shifts (..., k, 2) over the sub-burst times (k,), zero at the reference,
+    weighted by weights (..., k). Zero velocity where no shift has any weight.
+    """
+    t = times - times[reference]
+    w = weights[..., np.newaxis] * t[:, np.newaxis]
+    velocity = (w * shifts).sum(axis=-2, keepdims=True) / np.maximum((w * t[:, np.newaxis]).sum(axis=-2, keepdims=True), 1e-12)
+    return velocity * t[:, np.newaxis]
+
+def align_burst(packed, sub_frames=15, tiles=1, downsample=4, motion="linear", min_peak=8.0):
+    """
+    Motion-compensated photon counts (512, 512) float32 of a block of packed frames (n, 512, 64), and
+    the shifts (tiles, tiles, k, 2) applied to its k sub-bursts, both in the exported orientation.
+    Shifts whose correlation peak is weaker than min_peak (see estimate_shifts) are not trusted: left
+    out of the linear fit (as are those more than 2 * downsample px off the first fit), or taken as 0
+    with motion="free".
+    """
+    # everything is done in the orientation of the packed frames and rotated at the end
+    if motion not in MOTION_MODELS:
+        raise ValueError(f"Unknown motion model '{motion}'. Choose one of {', '.join(MOTION_MODELS)}.")
+    if not 1 <= sub_frames <= 255:
+        raise ValueError("A sub-burst must have between 1 and 255 frames")
+    sums, frames = subburst_sums(packed, sub_frames)
+    k = len(sums)
+    reference = k // 2
+    if k < 2:
+        return np.rot90(sums.sum(axis=0, dtype=np.float32)).copy(), np.zeros((tiles, tiles, k, 2))
+
+    shifts, strength = estimate_shifts(_tile(sums, tiles), reference, downsample)
+    trusted = strength >= min_peak
+    trusted[..., reference] = False
+    if motion == "linear":
+        times = np.cumsum(frames) - frames / 2 # center frame of each sub-burst
+        weights = trusted.astype(np.float64)
+        fitted = fit_linear(shifts, times, reference, weights)
+        # drop the shifts far from the fit (spurious peaks) and fit again; no motion unless 2 shifts agree
+        weights *= np.abs(shifts - fitted).max(axis=-1) <= 2 * downsample
+        weights[weights.sum(axis=-1) < 2] = 0
+        shifts = fit_linear(shifts, times, reference, weights)
+    else:
+        shifts = np.where(trusted[..., np.newaxis], shifts, 0)
+    offsets = np.rint(shifts).astype(np.int64)
+
+    counts = np.zeros((IMG_HEIGHT, IMG_WIDTH), dtype=np.float32)
+    coverage = np.zeros((IMG_HEIGHT, IMG_WIDTH), dtype=np.float32) # frames summed into each pixel
+    ys = [ty * IMG_HEIGHT // tiles for ty in range(tiles + 1)]
+    xs = [tx * IMG_WIDTH // tiles for tx in range(tiles + 1)]
+    for ty in range(tiles):
+        for tx in range(tiles):
+            for j in range(k):
+                # aligned(p) = sums[j](p + shift), for the pixels p of the tile whose source is inside the image
+                dy, dx = offsets[ty, tx, j]
+                ya, yb = max(ys[ty], -dy), min(ys[ty + 1], IMG_HEIGHT - dy)
+                xa, xb = max(xs[tx], -dx), min(xs[tx + 1], IMG_WIDTH - dx)
+                if ya >= yb or xa >= xb:
+                    continue
+                counts[ya:yb, xa:xb] += sums[j, ya + dy:yb + dy, xa + dx:xb + dx]
+                coverage[ya:yb, xa:xb] += frames[j]
+
+    np.divide(counts * frames.sum(), coverage, out=counts, where=coverage > 0)
+
+    # rot90: exported(i, j) = raw(j, W - 1 - i), so a raw shift (dy, dx) is (-dx, dy) once exported
+    shifts = np.rot90(shifts, axes=(0, 1))
+    return np.rot90(counts).copy(), np.stack((-shifts[..., 1], shifts[..., 0]), axis=-1)
+
+def motion_compensated_counts(acq, bitdepth, sub_frames=15, tiles=1, downsample=4, motion="linear", stride=None, num_images=0):
+    """Yields (image number, first frame, counts, shifts) of the n-bit images of an acquisition, one block in memory at a time"""
+    frames_per_img = 2**bitdepth - 1
+    for n, s in enumerate(image_starts(len(acq), bitdepth, stride, num_images).tolist()):
+        counts, shifts = align_burst(acq.window(s, s + frames_per_img), sub_frames, tiles, downsample, motion)
+        yield n, s, counts, shifts
+
+def main():
+    parser = argparse.ArgumentParser(description="user input")
+    parser.add_argument('-f', '--folder', type=str, help="Acquisition folder containing the .bin files, or .spad container", required=True)
+    parser.add_argument('-b', '--bit', type=int, help="Bit depth of the images", required=False, default=8)
+    parser.add_argument('-s', '--sub', type=int, help="Frames per sub-burst", required=False, default=15)
+    parser.add_argument('-t', '--tiles', type=int, help="Shift estimated per tile of a tiles x tiles grid", required=False, default=1)
+    parser.add_argument('-d', '--downsample', type=int, help="Downsampling of the sub-bursts for the shift estimation", required=False, default=4)
+    parser.add_argument('--motion', type=str, choices=MOTION_MODELS, help="Constant-velocity fit of the shifts or shifts as measured", required=False, default="linear")
+    parser.add_argument('-n', '--images', type=int, help="Number of images (0 = all)", required=False, default=0)
+    parser.add_argument('-p', '--pattern', type=str, help="File pattern of the .bin files", required=False, default="RAW*.bin")
+
+    args = parser.parse_args()
+
+    try:
+        acq = open_acquisition(args.folder, args.pattern)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    # prints the estimated motion of every image and the throughput (no images are written, see digitize_bin.py --motion)
+    start = time.time()
+    frames = 0
+    with acq:
+        for n, s, counts, shifts in motion_compensated_counts(acq, args.bit, args.sub, args.tiles, args.downsample, args.motion, num_images=args.images):
+            frames += 2**args.bit - 1
+            span = shifts[:, :, -1] - shifts[:, :, 0]
+            print(f"Image {n} (frame {s}): motion over the block {np.abs(span).max():.1f} px (dy, dx of the first tile: {span[0, 0, 0]:.1f}, {span[0, 0, 1]:.1f})")
+    elapsed = time.time() - start
+    print("Aggregation time: ", "{:.2f}".format(elapsed*1000), " ms")
+    print("Throughput: ", "{:.0f}".format(frames / max(elapsed, 1e-9)), " frames/s (", "{:.2f}".format(frames * FRAME_BYTES / 1e6 / max(elapsed, 1e-9)), " MB/s)")
+
+if __name__ == "__main__":
+    main()
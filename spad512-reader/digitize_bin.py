@@ -0,0 +1,283 @@
+#!/usr/bin/env python
+'''
+Last updated: 2026-Oct-17
+
+Builds n-bit images directly from the RAW .bin files of a single SPAD512S acquisition, skipping the
+1-bit PNG export step (export_spad_frames.m -> digitize_from_1bit.m).
+
+Blocks of 2^b-1 packed frames are summed with count_photons(), which counts the set bits of the
+packed bytes one bit-plane at a time into a uint16 image, so binary frames are never unpacked into
+per-pixel arrays. Output images are split into groups and digitized in parallel by a process pool;
+each worker memory-maps the acquisition and only reads the frames of its own group.
+
+As in digitize_from_1bit.m, images below 8-bit are taken every 256 frames (the remaining frames are
+skipped) so that they can be compared to the 8-bit images of the same acquisition.
+
+With --video, overlapping n-bit images are built every --stride frames (e.g. an 8-bit image every 16
+binary frames) into one memory-mapped .npy stack (images, 512, 512) of photon counts, with the first
+frame and timestamp of every image in <name>_index.npy. The frames are read once, in chunks, and
+summed into a running per-pixel prefix sum that is kept only at the frames where images start or end,
+so each image is the difference of two prefix sums, whatever its window length.
+
+Example:
+    python digitize_bin.py -f ./data/intensity_images/acq00001 -b 8 -w 4
+    python digitize_bin.py -f ./data/intensity_images/acq00001 -b 8 -s 16 --video
+
+'''
+import os
+import sys
+import time
+import argparse
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image
+
+from spad_reader import open_acquisition, IMG_WIDTH, IMG_HEIGHT, FRAME_BYTES
+
+_BYTE_LANES = np.uint64(0x0101010101010101)
+VIDEO_INDEX_DTYPE = np.dtype([('start', '<i8'), ('timestamp', '<f8')])
+
+def count_photons(packed):
+    """
+    Sums a block of packed 1-bit frames of shape (n, 512, 64) into a uint16 photon-count image of
+    shape (512, 512) in the exported orientation. Supports up to 65535 frames per block.
+    """
+    packed = np.ascontiguousarray(packed)
+    if packed.ndim == 2:
+        packed = packed[np.newaxis]
+
+    # Each uint64 word holds 8 packed bytes. Masking one bit per byte and summing over frames keeps
+    # the count of each byte lane within its own byte as long as no more than 255 frames are added.
+    words = packed.reshape(packed.shape[0], -1).view(np.uint64)
+    counts = np.zeros((IMG_HEIGHT, IMG_WIDTH), dtype=np.uint16)
+    tmp = np.empty((min(len(words), 255), words.shape[1]), dtype=np.uint64)
+
+    for s in range(0, len(words), 255):
+        sub = words[s:s + 255]
+        t = tmp[:len(sub)]
+        for b in range(8):
+            # bit 7 (MSB) of each byte is the first of its 8 pixels, as in np.unpackbits
+            np.right_shift(sub, np.uint64(7 - b), out=t)
+            np.bitwise_and(t, _BYTE_LANES, out=t)
+            lanes = t.sum(axis=0, dtype=np.uint64).view(np.uint8)
+            counts[:, b::8] += lanes.reshape(IMG_HEIGHT, IMG_WIDTH // 8)
+
+    return np.rot90(counts)
+
+def local_median(image):
+    """Median of the 3x3 neighbourhood of every pixel (edges replicated)"""
+    padded = np.pad(image, 1, mode='edge')
+    h, w = image.shape
+    shifted = np.stack([padded[y:y + h, x:x + w] for y in range(3) for x in range(3)])
+    return np.median(shifted, axis=0)
+
+def correct_pixels(counts, mask):
+    """Replaces the masked (hot or dead) pixels of a count image by the median of their neighbours"""
+    if mask is None or not mask.any():
+        return counts
+    corrected = counts.copy()
+    corrected[mask] = np.round(local_median(counts)[mask]).astype(counts.dtype)
+    return corrected
+
+def load_mask(path):
+    """Hot or dead pixel mask (512, 512) of a statistics file saved by photon_stats.py"""
+    with np.load(path) as stats:
+        return stats['hot'] | stats['dead']
+
+def to_image(counts, bitdepth):
+    """Scales n-bit photon counts to the full range of an 8-bit (bitdepth <= 8) or 16-bit PNG."""
+    max_count = 2**bitdepth - 1
+    if bitdepth <= 8:
+        return Image.fromarray(np.round(counts * (255 / max_count)).astype(np.uint8))
+    return Image.fromarray(np.round(counts * (65535 / max_count)).astype(np.uint16))
+
+def image_starts(n_frames, bitdepth, stride=None, num_images=0):
+    """First frame of each n-bit image that can be built out of n_frames binary frames."""
+    frames_per_img = 2**bitdepth - 1
+    if stride is None:
+        stride = frames_per_img if bitdepth >= 8 else 256 # same spacing as digitize_from_1bit.m
+
+    starts = np.arange(0, n_frames - frames_per_img + 1, stride)
+    if num_images:
+        starts = starts[:num_images]
+    return starts
+
+def _digitize_group(folder, pattern, bitdepth, starts, output_dir, mask=None, motion=0, tiles=1):
+    frames_per_img = 2**bitdepth - 1
+    acq = open_acquisition(folder, pattern)
+    if motion:
+        from burst_align import align_burst
+
+    for n, s in starts:
+        if motion:
+            # sub-bursts of motion frames aligned before summing (see burst_align.py)
+            counts = np.minimum(align_burst(acq.window(s, s + frames_per_img), motion, tiles)[0], frames_per_img)
+        else:
+            counts = count_photons(acq.window(s, s + frames_per_img))
+        counts = correct_pixels(counts, mask)
+
+        # timestamp of the last frame of the block
+        timestamp = acq.frame_timestamp(s + frames_per_img - 1)
+
+        png_file_name = f'spad{bitdepth}_{timestamp:.9f}_{n:05d}.png'
+        to_image(counts, bitdepth).save(os.path.join(output_dir, png_file_name))
+
+    acq.close()
+    return len(starts)
+
+def digitize_acquisition(folder, bitdepth, output_dir=None, workers=None, num_images=0, stride=None,
+                         pattern="RAW*.bin", group_size=16, mask=None, motion=0, tiles=1):
+    """
+    Digitizes all the n-bit images of an acquisition folder (or .spad container) and saves them as
+    PNG files in output_dir (default: <folder>/png/<bitdepth>bit). Returns the number of images written.
+    Pixels of mask (e.g. hot and dead pixels, see photon_stats.py) are replaced by the median of their
+    neighbours. With motion > 0, each image is aggregated from sub-bursts of motion frames aligned
+    globally or per tile of a tiles x tiles grid (see burst_align.py).
+    """
+    if not 1 <= bitdepth <= 16:
+        raise ValueError(f"Unsupported bit depth: {bitdepth}. Use a value between 1 and 16.")
+
+    if output_dir is None:
+        base = folder if os.path.isdir(folder) else os.path.splitext(folder)[0] # acq.spad -> acq/png/...
+        output_dir = os.path.join(base, 'png', f'{bitdepth}bit')
+    os.makedirs(output_dir, exist_ok=True)
+
+    with open_acquisition(folder, pattern) as acq:
+        n_frames = len(acq)
+
+    starts = image_starts(n_frames, bitdepth, stride, num_images)
+    if not len(starts):
+        raise ValueError(f"Not enough 1-bit frames to build one {bitdepth}-bit image.")
+
+    print(f"[INFO] {n_frames} total 1bit frames found.")
+    print(f"[INFO] {len(starts)} {bitdepth}-bit images will be digitized.")
+
+    indexed = list(enumerate(starts.tolist()))
+    groups = [indexed[i:i + group_size] for i in range(0, len(indexed), group_size)]
+
+    start = time.time()
+    written = 0
+    if workers == 1:
+        for g in groups:
+            written += _digitize_group(folder, pattern, bitdepth, g, output_dir, mask, motion, tiles)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_digitize_group, folder, pattern, bitdepth, g, output_dir, mask, motion, tiles) for g in groups]
+            for f in futures:
+                written += f.result()
+
+    elapsed = time.time() - start
+    read_mb = written * (2**bitdepth - 1) * FRAME_BYTES / 1e6
+    print("Digitizing time: ", "{:.2f}".format(elapsed*1000), " ms")
+    print("Throughput: ", "{:.2f}".format(read_mb / max(elapsed, 1e-9)), " MB/s")
+    return written
+
+def sliding_counts(acq, window, stride, num_images=0, chunk_frames=1020):
+    """
+    Yields (image number, first frame, uint32 photon counts) of the windows of `window` frames starting
+    every `stride` frames, from a running prefix sum over the packed frames read in chunks. Only the
+    prefix sums of the windows in progress are kept (about window / stride images).
+    """
+    starts = np.arange(0, len(acq) - window + 1, stride)
+    if num_images:
+        starts = starts[:num_images]
+    if not len(starts):
+        return
+    starts = starts.tolist()
+    start_set = set(starts)
+    ends = {s + window: k for k, s in enumerate(starts)}
+    bounds = sorted(start_set | set(ends)) # frames where the prefix sum is needed
+
+    running = np.zeros((IMG_HEIGHT, IMG_WIDTH), dtype=np.uint32) # photons of the frames before pos
+    pos, b = starts[0], 1
+    prefix = {pos: running.copy()}
+    for _, packed in acq.iter_chunks(chunk_frames, starts[0], bounds[-1]):
+        i = 0
+        while i < len(packed):
+            n = min(bounds[b] - pos, len(packed) - i)
+            running += count_photons(packed[i:i + n])
+            i += n
+            pos += n
+            if pos == bounds[b]:
+                k = ends.get(pos)
+                if k is not None:
+                    yield k, starts[k], running - prefix.pop(starts[k])
+                if pos in start_set:
+                    prefix[pos] = running.copy()
+                b += 1
+
+def digitize_video(folder, bitdepth, output=None, stride=16, num_images=0, pattern="RAW*.bin",
+                   chunk_frames=1020, mask=None):
+    """
+    Builds the n-bit images of windows of 2^b-1 frames starting every stride frames into a memory-mapped
+    .npy stack of photon counts (uint8 up to 8-bit, uint16 above), default <folder>/video_<b>bit_<stride>.npy.
+    Returns the path of the stack.
+    """
+    if not 1 <= bitdepth <= 16:
+        raise ValueError(f"Unsupported bit depth: {bitdepth}. Use a value between 1 and 16.")
+    if stride < 1:
+        raise ValueError("The stride must be at least 1 frame.")
+    window = 2**bitdepth - 1
+
+    if output is None:
+        base = folder if os.path.isdir(folder) else os.path.splitext(folder)[0]
+        output = os.path.join(base, f'video_{bitdepth}bit_{stride}.npy')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+
+    with open_acquisition(folder, pattern) as acq:
+        n_images = len(image_starts(len(acq), bitdepth, stride, num_images))
+        if not n_images:
+            raise ValueError(f"Not enough 1-bit frames to build one {bitdepth}-bit image.")
+        print(f"[INFO] {len(acq)} total 1bit frames found.")
+        print(f"[INFO] {n_images} {bitdepth}-bit images every {stride} frames will be digitized.")
+
+        start = time.time()
+        stack = np.lib.format.open_memmap(output, mode='w+', dtype=np.uint8 if bitdepth <= 8 else np.uint16,
+                                          shape=(n_images, IMG_HEIGHT, IMG_WIDTH))
+        index = np.lib.format.open_memmap(os.path.splitext(output)[0] + "_index.npy", mode='w+',
+                                          dtype=VIDEO_INDEX_DTYPE, shape=(n_images,))
+        for n, s, counts in sliding_counts(acq, window, stride, num_images, chunk_frames):
+            stack[n] = correct_pixels(counts, mask)
+            # timestamp of the last frame of the window
+            index[n] = (s, acq.frame_timestamp(s + window - 1))
+        stack.flush()
+        index.flush()
+        del stack, index
+
+    elapsed = time.time() - start
+    print("Digitizing time: ", "{:.2f}".format(elapsed*1000), " ms")
+    print("Images per second: ", "{:.2f}".format(n_images / max(elapsed, 1e-9)))
+    return output
+
+def main():
+    parser = argparse.ArgumentParser(description="user input")
+    parser.add_argument('-f', '--folder', type=str, help="Acquisition folder containing the .bin files, or .spad container", required=True)
+    parser.add_argument('-b', '--bit', type=int, help="Desired bit depth", required=True)
+    parser.add_argument('-o', '--output', type=str, help="Output folder (default: <folder>/png/<bit>bit)", required=False, default=None)
+    parser.add_argument('-n', '--images', type=int, help="Number of images to digitize (0 = all)", required=False, default=0)
+    parser.add_argument('-w', '--workers', type=int, help="Number of worker processes (default: all cores)", required=False, default=None)
+    parser.add_argument('-s', '--stride', type=int, help="Frames between consecutive images", required=False, default=None)
+    parser.add_argument('-p', '--pattern', type=str, help="File pattern of the .bin files", required=False, default="RAW*.bin")
+    parser.add_argument('-v', '--video', action='store_true', help="Overlapping images every --stride frames (default 16) into one .npy stack (-o: its path)")
+    parser.add_argument('--motion', type=int, help="Motion-compensated images from aligned sub-bursts of this many frames (0 = plain sums)", required=False, default=0)
+    parser.add_argument('--tiles', type=int, help="With --motion, estimate the motion per tile of a tiles x tiles grid", required=False, default=1)
+    parser.add_argument('-m', '--mask', type=str, help="photon_stats.py output whose hot and dead pixels are replaced", required=False, default=None)
+
+    args = parser.parse_args()
+
+    try:
+        mask = load_mask(args.mask) if args.mask else None
+        if args.video:
+            output = digitize_video(args.folder, args.bit, args.output, args.stride or 16, args.images, args.pattern, mask=mask)
+            print(f"Images saved as '{output}'")
+        else:
+            digitize_acquisition(args.folder, args.bit, args.output, args.workers, args.images, args.stride, args.pattern,
+                                 mask=mask, motion=args.motion, tiles=args.tiles)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    print('All images were successfully digitized')
+
+if __name__ == "__main__":
+    main()
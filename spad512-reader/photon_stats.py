@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+'''
+Last updated: 2026-Oct-17
+
+Per-pixel photon statistics of a SPAD512S acquisition in one pass and constant memory.
+
+PhotonStats consumes packed 1-bit frames chunk by chunk, from stored .bin files or .spad containers
+(from_acquisition) or from the capture pipeline (SPAD_1bit_cont.py --stats updates it in the saving
+process), without ever unpacking them into a (512, 512, N) array. It keeps:
+    - photon counts per pixel (uint32),
+    - the sum and sum of squares of the counts of consecutive blocks of block_frames frames, for the
+      variance of the count per block (photon shot noise is binomial; more than that means flicker
+      or blinking pixels),
+    - the total number of photons of every frame (4 bytes per frame).
+Counts are summed with count_photons (see digitize_bin.py), in the exported orientation.
+
+From them, result() gives the detection probability per frame, the photon rate (corrected for
+pile-up when the exposure is known), the block variance and its ratio to the binomial variance,
+and hot and dead pixel masks found by comparing every pixel with the median of its 3x3
+neighbourhood. The masks can be used by digitize_bin.py --mask to replace those pixels.
+
+Example:
+    stats = PhotonStats.from_acquisition('./data/intensity_images/acq00001', exposure_us=0.1)
+    stats.save('./data/intensity_images/acq00001/photon_stats.npz')
+    python photon_stats.py -f ./data/intensity_images/acq00001 -e 0.1
+
+'''
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+from spad_reader import open_acquisition, IMG_WIDTH, IMG_HEIGHT
+from digitize_bin import count_photons, local_median
+
+if hasattr(np, 'bitwise_count'):
+    def _frame_totals(packed):
+        return np.bitwise_count(packed.reshape(len(packed), -1).view(np.uint64)).sum(axis=1, dtype=np.uint32)
+else:
+    _POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+    def _frame_totals(packed):
+        return _POPCOUNT[packed.reshape(len(packed), -1)].sum(axis=1, dtype=np.uint32)
+
+class PhotonStats:
+    """Streaming photon statistics of an acquisition. Feed it packed frames (n, 512, 64) with update()."""
+
+    def __init__(self, block_frames=255, exposure_us=None):
+        if not 1 <= block_frames <= 65535:
+            raise ValueError("block_frames must be between 1 and 65535")
+        self.block_frames = block_frames
+        self.exposure_us = exposure_us
+        self.n_frames = 0
+        self.counts = np.zeros((IMG_HEIGHT, IMG_WIDTH), dtype=np.uint32)
+        self.block_sum = np.zeros((IMG_HEIGHT, IMG_WIDTH), dtype=np.float64)
+        self.block_sq_sum = np.zeros((IMG_HEIGHT, IMG_WIDTH), dtype=np.float64)
+        self.n_blocks = 0
+        self._block = np.zeros((IMG_HEIGHT, IMG_WIDTH), dtype=np.uint32) # counts of the current block
+        self._block_fill = 0
+        self._totals = []
+
+    def update(self, packed):
+        """Adds a chunk of packed frames, e.g. one batch as received (a trailing DONE is ignored)"""
+        packed = np.asarray(packed, dtype=np.uint8)
+        if packed.ndim == 1:
+            packed = packed[:len(packed) - len(packed) % (IMG_HEIGHT * IMG_WIDTH // 8)]
+        packed = packed.reshape(-1, IMG_HEIGHT, IMG_WIDTH // 8)
+        self._totals.append(_frame_totals(np.ascontiguousarray(packed)))
+
+        # split the chunk at the block boundaries
+        s = 0
+        while s < len(packed):
+            n = min(self.block_frames - self._block_fill, len(packed) - s)
+            self._block += count_photons(packed[s:s + n])
+            self._block_fill += n
+            s += n
+            if self._block_fill == self.block_frames:
+                self._close_block()
+
+        self.n_frames += len(packed)
+
+    def _close_block(self):
+        self.counts += self._block
+        self.block_sum += self._block
+        self.block_sq_sum += np.square(self._block, dtype=np.float64)
+        self.n_blocks += 1
+        self._block[:] = 0
+        self._block_fill = 0
+
+    @classmethod
+    def from_acquisition(cls, path, pattern="RAW*.bin", chunk_frames=1020, block_frames=255, exposure_us=None):
+        """Statistics of a stored acquisition (folder of .bin files or .spad container), read in chunks"""
+        with open_acquisition(path, pattern) as acq:
+            if exposure_us is None:
+                exposure_us = getattr(acq, 'metadata', {}).get('exposure_us')
+            stats = cls(block_frames, exposure_us)
+            for _, packed in acq.iter_chunks(chunk_frames):
+                stats.update(packed)
+        return stats
+
+    @property
+    def frame_totals(self):
+        """Number of photons detected in every frame"""
+        return np.concatenate(self._totals) if self._totals else np.zeros(0, dtype=np.uint32)
+
+    def result(self, hot_factor=5.0, hot_sigma=6.0, dead_min_counts=5):
+        """
+        Dict of the statistics. A pixel is hot if its count exceeds both hot_factor times and
+        hot_sigma Poisson standard deviations above the median of its 3x3 neighbourhood, and dead if it
+        has no photons where that median is at least dead_min_counts.
+        """
+        counts = self.counts + self._block # including the incomplete last block
+        n = max(self.n_frames, 1)
+        probability = counts / n
+        neighbours = local_median(counts.astype(np.float64))
+        hot = (counts > hot_factor * neighbours) & (counts > neighbours + hot_sigma * np.sqrt(neighbours + 1))
+        dead = (counts == 0) & (neighbours >= dead_min_counts)
+
+        result = {
+            'n_frames': self.n_frames,
+            'counts': counts,
+            'probability': probability.astype(np.float32),
+            'frame_totals': self.frame_totals,
+            'hot': hot,
+            'dead': dead,
+            'block_frames': self.block_frames,
+            'n_blocks': self.n_blocks,
+        }
+        if self.n_blocks > 1:
+            mean = self.block_sum / self.n_blocks
+            variance = (self.block_sq_sum - self.n_blocks * mean**2) / (self.n_blocks - 1)
+            p = mean / self.block_frames
+            binomial = self.block_frames * p * (1 - p)
+            result['block_variance'] = variance.astype(np.float32)
+            result['variance_ratio'] = np.divide(variance, binomial, out=np.ones_like(variance), where=binomial > 0).astype(np.float32)
+        if self.exposure_us:
+            # detection probability p = 1 - exp(-rate * exposure): pile-up corrected rate in photons/s
+            clipped = np.minimum(probability, 1 - 1 / (2 * n))
+            result['rate'] = (-np.log1p(-clipped) / (self.exposure_us * 1e-6)).astype(np.float32)
+            result['exposure_us'] = self.exposure_us
+        return result
+
+    def save(self, path, **kwargs):
+        """Saves result() as .npz (see load_mask in digitize_bin.py)"""
+        np.savez_compressed(path, **self.result(**kwargs))
+
+    def summary(self, **kwargs):
+        r = self.result(**kwargs)
+        totals = r['frame_totals']
+        lines = [f"{r['n_frames']} frames, {int(r['counts'].sum())} photons, "
+                 f"{totals.mean() if len(totals) else 0:.1f} photons/frame (min {totals.min() if len(totals) else 0}, max {totals.max() if len(totals) else 0})",
+                 f"Detection probability per frame: median {np.median(r['probability']):.4f}, max {r['probability'].max():.4f}",
+                 f"Hot pixels: {int(r['hot'].sum())}, dead pixels: {int(r['dead'].sum())}"]
+        if 'rate' in r:
+            lines.append(f"Photon rate: median {np.median(r['rate']):.3g} photons/s")
+        if 'variance_ratio' in r:
+            lines.append(f"Block variance / binomial: median {np.median(r['variance_ratio']):.2f} ({r['n_blocks']} blocks of {r['block_frames']} frames)")
+        return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="user input")
+    parser.add_argument('-f', '--folder', type=str, help="Acquisition folder containing the .bin files, or .spad container", required=True)
+    parser.add_argument('-e', '--exposure', type=float, help="Exposure time in us (for photon rates)", required=False, default=None)
+    parser.add_argument('-o', '--output', type=str, help="Output .npz (default: <folder>/photon_stats.npz)", required=False, default=None)
+    parser.add_argument('-B', '--block', type=int, help="Frames per block for the count variance", required=False, default=255)
+    parser.add_argument('-p', '--pattern', type=str, help="File pattern of the .bin files", required=False, default="RAW*.bin")
+
+    args = parser.parse_args()
+
+    start = time.time()
+    try:
+        stats = PhotonStats.from_acquisition(args.folder, args.pattern, block_frames=args.block, exposure_us=args.exposure)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    print("Statistics time: ", "{:.2f}".format((time.time() - start)*1000), " ms")
+    print(stats.summary())
+
+    base = args.folder if os.path.isdir(args.folder) else os.path.splitext(args.folder)[0]
+    output = args.output or os.path.join(base, 'photon_stats.npz')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    stats.save(output)
+    print(f"Statistics saved as '{output}'")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+#!/usr/bin/env python
+'''
+Last updated: 2026-Oct-17
+
+Single-file container for SPAD512S acquisitions (.spad), used instead of one RAW_<timestamp>.bin per
+batch during continuous acquisitions.
+
+Layout:
+    header      'SPADACQ1', version, JSON metadata (exposure, frames per batch, host, start time...)
+    chunk 0     'CHNK', first frame, number of frames, host timestamp, codec, stored size, packed frames
+    chunk 1     ...
+    index       one record per chunk (first frame, number of frames, timestamp, codec, offset, size)
+    trailer     index offset, number of chunks, 'SPADIDX1'
+
+Each chunk holds a batch of packed 1-bit frames (512x64 bytes each, no DONE footer), optionally
+compressed with zlib (or zstd if the zstandard package is installed), or stored as photon events
+(sparse: the number of photons of every frame followed by their pixel indices, see sparse_frames.py),
+4 bytes per photon. Sparse low-light frames compress very well. The index at the end of the file
+gives direct access to any frame range without reading the rest of the file; uncompressed chunks are
+returned as memory-mapped views.
+
+Chunks are appended as they arrive and the index is only written by close(). A container that was
+not closed (acquisition still running, or crashed) is still readable: its index is rebuilt by walking
+the chunk headers, and SpadContainerWriter can reopen it to keep appending.
+
+Example:
+    with SpadContainerWriter('acq.spad', {'exposure_us': 0.1}, compression='zlib') as w:
+        w.append(batch, timestamp)
+    acq = SpadContainer('acq.spad')
+    window = acq[1000:1255]     # packed (255, 512, 64)
+
+'''
+import os
+import json
+import time
+import zlib
+import struct
+import numpy as np
+
+from spad_reader import IMG_HEIGHT, ROW_BYTES, FRAME_BYTES, FOOTER, unpack_frames, slice_frames
+from sparse_frames import SparseFrames
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CONTAINER_EXT = ".spad"
+VERSION = 1
+
+_HEADER = struct.Struct("<8sHI") # magic, version, metadata length
+_CHUNK = struct.Struct("<4sQIdBQ") # magic, first frame, number of frames, timestamp, codec, stored bytes
+_TRAILER = struct.Struct("<QQ8s") # index offset, number of chunks, magic
+HEADER_MAGIC = b"SPADACQ1"
+CHUNK_MAGIC = b"CHNK"
+TRAILER_MAGIC = b"SPADIDX1"
+
+CODECS = {"none": 0, "zlib": 1, "zstd": 2, "sparse": 3}
+
+INDEX_DTYPE = np.dtype([
+    ('first_frame', '<u8'),
+    ('n_frames', '<u4'),
+    ('timestamp', '<f8'),
+    ('codec', 'u1'),
+    ('offset', '<u8'), # offset of the chunk payload in the file
+    ('stored_bytes', '<u8'),
+])
+
+def _compress(data, codec, level):
+    if codec == CODECS["zlib"]:
+        return zlib.compress(data, level)
+    if codec == CODECS["zstd"]:
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    if codec == CODECS["sparse"]:
+        sparse = SparseFrames.from_packed(np.frombuffer(data, dtype=np.uint8))
+        return np.diff(sparse.offsets).astype('<u4').tobytes() + sparse.indices.astype('<u4').tobytes()
+    return data
+
+def _decompress(data, codec, size):
+    if codec == CODECS["zlib"]:
+        return zlib.decompress(data, bufsize=size)
+    if codec == CODECS["zstd"]:
+        if zstandard is None:
+            raise RuntimeError("This container uses zstd compression. Install the zstandard package to read it.")
+        return zstandard.ZstdDecompressor().decompress(data, max_output_size=size)
+    if codec == CODECS["sparse"]:
+        return _sparse_events(data, size // FRAME_BYTES).to_packed().reshape(-1)
+    return data
+
+def _sparse_events(data, n):
+    """SparseFrames of a sparse chunk payload of n frames (photons per frame, then pixel indices)"""
+    data = np.frombuffer(data, dtype='<u4')
+    return SparseFrames(data[n:], np.concatenate(([0], np.cumsum(data[:n], dtype=np.int64))))
+
+def _read_header(f):
+    magic, version, meta_len = _HEADER.unpack(f.read(_HEADER.size))
+    if magic != HEADER_MAGIC:
+        raise ValueError(f"{f.name}: not a SPAD container")
+    if version > VERSION:
+        raise ValueError(f"{f.name}: unsupported container version {version}")
+    metadata = json.loads(f.read(meta_len).decode('utf8'))
+    return metadata, _HEADER.size + meta_len
+
+def _read_index(f, data_start):
+    """
+    Returns (index, end of the last chunk). Uses the index at the end of the file if present,
+    otherwise walks the chunk headers and stops at the first incomplete chunk.
+    """
+    f.seek(0, os.SEEK_END)
+    size = f.tell()
+
+    if size >= data_start + _TRAILER.size:
+        f.seek(size - _TRAILER.size)
+        index_offset, n_chunks, magic = _TRAILER.unpack(f.read(_TRAILER.size))
+        if magic == TRAILER_MAGIC and index_offset + n_chunks * INDEX_DTYPE.itemsize + _TRAILER.size == size:
+            f.seek(index_offset)
+            index = np.frombuffer(f.read(n_chunks * INDEX_DTYPE.itemsize), dtype=INDEX_DTYPE).copy()
+            return index, index_offset
+
+    records = []
+    pos = data_start
+    while pos + _CHUNK.size <= size:
+        f.seek(pos)
+        magic, first, n, timestamp, codec, stored = _CHUNK.unpack(f.read(_CHUNK.size))
+        if magic != CHUNK_MAGIC or pos + _CHUNK.size + stored > size:
+            break
+        records.append((first, n, timestamp, codec, pos + _CHUNK.size, stored))
+        pos += _CHUNK.size + stored
+
+    return np.array(records, dtype=INDEX_DTYPE), pos
+
+class SpadContainerWriter:
+    """
+    Appends batches of packed 1-bit frames to a .spad container. If path already exists, new chunks
+    are appended after the existing ones (the metadata of the existing file is kept).
+    """
+
+    def __init__(self, path, metadata=None, compression="none", level=1):
+        if compression not in CODECS:
+            raise ValueError(f"Unknown compression '{compression}'. Choose one of {', '.join(CODECS)}.")
+        if compression == "zstd" and zstandard is None:
+            raise RuntimeError("zstd compression requires the zstandard package")
+
+        self.path = path
+        self.codec = CODECS[compression]
+        self.level = level
+
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            self._f = open(path, 'r+b')
+            self.metadata, data_start = _read_header(self._f)
+            index, end = _read_index(self._f, data_start)
+            self._records = [tuple(r) for r in index.tolist()]
+            self._f.seek(end)
+            self._f.truncate() # drop the old index, it is rewritten on close
+        else:
+            self.metadata = dict(metadata or {})
+            self.metadata.setdefault('created', time.time())
+            self.metadata.setdefault('frame_shape', [IMG_HEIGHT, ROW_BYTES * 8])
+            self.metadata.setdefault('bit', 1)
+            self._f = open(path, 'wb')
+            meta = json.dumps(self.metadata).encode('utf8')
+            self._f.write(_HEADER.pack(HEADER_MAGIC, VERSION, len(meta)))
+            self._f.write(meta)
+            self._records = []
+
+        last = self._records[-1] if self._records else None
+        self.n_frames = int(last[0] + last[1]) if last else 0
+
+    def append(self, data, timestamp=None):
+        """
+        Appends one batch of packed frames (bytes-like or uint8 array). A trailing DONE footer, as
+        received from the camera, is removed. Returns the index of the first frame of the batch.
+        """
+        view = memoryview(data).cast('B')
+        if len(view) % FRAME_BYTES == len(FOOTER) and view[-len(FOOTER):] == FOOTER:
+            view = view[:-len(FOOTER)]
+        if len(view) % FRAME_BYTES:
+            raise ValueError(f"Batch of {len(view)} bytes is not a whole number of {FRAME_BYTES}-byte frames")
+
+        n = len(view) // FRAME_BYTES
+        timestamp = time.time() if timestamp is None else timestamp
+        payload = _compress(view, self.codec, self.level)
+        codec = self.codec
+        if len(payload) >= len(view): # not worth it, e.g. bright scenes
+            payload, codec = view, CODECS["none"]
+
+        first = self.n_frames
+        offset = self._f.tell() + _CHUNK.size
+        self._f.write(_CHUNK.pack(CHUNK_MAGIC, first, n, timestamp, codec, len(payload)))
+        self._f.write(payload)
+
+        self._records.append((first, n, timestamp, codec, offset, len(payload)))
+        self.n_frames += n
+        return first
+
+    def flush(self):
+        self._f.flush()
+
+    def close(self):
+        """Writes the index and the trailer and closes the file"""
+        if self._f.closed:
+            return
+        index = np.array(self._records, dtype=INDEX_DTYPE)
+        index_offset = self._f.tell()
+        self._f.write(index.tobytes())
+        self._f.write(_TRAILER.pack(index_offset, len(index), TRAILER_MAGIC))
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class SpadContainer:
+    """
+    Read access to a .spad container, with the same interface as SpadAcquisition: indexing returns
+    packed frames (512, 64) or (n, 512, 64), unpacked only by unpack().
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.metadata, data_start = _read_header(f)
+            self.index, _ = _read_index(f, data_start)
+
+        self.offsets = np.concatenate(([0], np.cumsum(self.index['n_frames'], dtype=np.int64)))
+        self.n_frames = int(self.offsets[-1])
+        self._mmap = np.memmap(path, dtype=np.uint8, mode='r') if self.n_frames else None
+        self._cache = (None, None) # last decompressed chunk
+
+    def __len__(self):
+        return self.n_frames
+
+    @property
+    def timestamps(self):
+        """Host timestamp of every chunk (batch)"""
+        return self.index['timestamp']
+
+    def chunk(self, k):
+        """Packed frames of chunk k, a view into the file if the chunk is not compressed"""
+        if self._cache[0] == k:
+            return self._cache[1]
+
+        rec = self.index[k]
+        n, offset, stored = int(rec['n_frames']), int(rec['offset']), int(rec['stored_bytes'])
+        raw = self._mmap[offset:offset + stored]
+        if rec['codec'] != CODECS["none"]:
+            raw = np.frombuffer(_decompress(raw, int(rec['codec']), n * FRAME_BYTES), dtype=np.uint8)
+        frames = raw.reshape(n, IMG_HEIGHT, ROW_BYTES)
+
+        self._cache = (k, frames)
+        return frames
+
+    def sparse_chunk(self, k):
+        """Photon events (SparseFrames) of chunk k, read directly if the chunk is stored sparse"""
+        rec = self.index[k]
+        if rec['codec'] != CODECS["sparse"]:
+            return SparseFrames.from_packed(self.chunk(k))
+        offset, stored = int(rec['offset']), int(rec['stored_bytes'])
+        return _sparse_events(self._mmap[offset:offset + stored], int(rec['n_frames']))
+
+    def locate(self, index):
+        """Returns (chunk number, local frame index) of the global frame index."""
+        if index < 0:
+            index += self.n_frames
+        if not 0 <= index < self.n_frames:
+            raise IndexError(f"frame {index} out of range for container with {self.n_frames} frames")
+        k = int(np.searchsorted(self.offsets, index, side='right')) - 1
+        return k, index - int(self.offsets[k])
+
+    def frame_timestamp(self, index):
+        """Host timestamp of the batch containing the frame"""
+        return float(self.index['timestamp'][self.locate(index)[0]])
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return slice_frames(self, key)
+
+        k, i = self.locate(int(key))
+        return self.chunk(k)[i]
+
+    def window(self, start, stop):
+        """Packed frames [start, stop). A view if the window lies within one uncompressed chunk."""
+        start = max(0, start)
+        stop = min(stop, self.n_frames)
+        if stop <= start:
+            return np.empty((0, IMG_HEIGHT, ROW_BYTES), dtype=np.uint8)
+
+        k0 = int(np.searchsorted(self.offsets, start, side='right')) - 1
+        k1 = int(np.searchsorted(self.offsets, stop - 1, side='right')) - 1
+        if k0 == k1:
+            o = int(self.offsets[k0])
+            return self.chunk(k0)[start - o:stop - o]
+
+        parts = []
+        for k in range(k0, k1 + 1):
+            o = int(self.offsets[k])
+            parts.append(self.chunk(k)[max(start - o, 0):stop - o])
+        return np.concatenate(parts)
+
+    def iter_chunks(self, chunk_frames=1000, start=0, stop=None):
+        """Yields (first frame index, packed frames) for consecutive windows of at most chunk_frames."""
+        stop = self.n_frames if stop is None else min(stop, self.n_frames)
+        for s in range(start, stop, chunk_frames):
+            yield s, self.window(s, min(s + chunk_frames, stop))
+
+    def unpack(self, key):
+        """Returns the 1-bit frame(s) at key unpacked and in the exported orientation."""
+        return unpack_frames(self[key])
+
+    def close(self):
+        self._cache = (None, None)
+        self._mmap = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __repr__(self):
+        return f"SpadContainer('{self.path}', chunks={len(self.index)}, n_frames={self.n_frames})"
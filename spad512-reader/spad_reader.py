@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+'''
+Last updated: 2026-Oct-17
+
+Memory-mapped reader for the RAW .bin files written by Pi-Imaging's SPAD512S, either through the
+camera GUI (acq0000X/RAW0000X.bin) or through the scripts in ./spad512-acquisition.
+
+This is the Python counterpart of read_512Sbin.m. Frames are never copied out of the file when
+indexed: both SpadBinFile and SpadAcquisition return packed (512, 64) uint8 views (8 pixels per byte)
+that are only unpacked into 1-bit images when unpack_frames() is called on them.
+
+IMPORTANT: Numpy uses a row-major order when reshaping arrays as opposed to matlab which uses a
+column-major order. unpack_frames() rotates the unpacked frames so that they match the orientation of
+the frames exported by export_spad_frames.m (and of the PNGs saved by the acquisition scripts).
+
+Example:
+    acq = SpadAcquisition('./data/intensity_images/acq00001')
+    img = unpack_frames(acq[1500])          # single 1-bit frame, 512x512
+    window = unpack_frames(acq[0:255])      # 255x512x512, only this window is read from disk
+
+'''
+import os
+import glob
+import numpy as np
+
+IMG_WIDTH = 512
+IMG_HEIGHT = 512
+ROW_BYTES = IMG_WIDTH // 8 # each byte contains 8 pixels in 1-bit format (512/8 = 64)
+FRAME_BYTES = IMG_HEIGHT * ROW_BYTES # 32 KB per packed 1-bit frame
+FOOTER = b"DONE" # terminator sent by the camera at the end of each acquisition
+
+def unpack_frames(packed, rotate=True):
+    """
+    Unpacks packed 1-bit frames of shape (..., 512, 64) into uint8 images of shape (..., 512, 512)
+    with values 0/1. If rotate is True, frames are rotated 90 deg to match the exported PNG orientation.
+    """
+    bits = np.unpackbits(packed, axis=-1)
+    if rotate:
+        bits = np.rot90(bits, k=1, axes=(-2, -1))
+    return bits
+
+class SpadBinFile:
+    """
+    Memory-mapped view of a single RAW .bin file. Indexing returns packed frame views of shape (512, 64)
+    (int index) or (n, 512, 64) (slice) without reading the rest of the file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        size = os.path.getsize(path)
+        self.n_frames = size // FRAME_BYTES
+        trailing = size - self.n_frames * FRAME_BYTES
+
+        if trailing == 0:
+            self.has_footer = False
+        elif trailing == len(FOOTER):
+            with open(path, 'rb') as f:
+                f.seek(-len(FOOTER), os.SEEK_END)
+                tail = f.read()
+            if tail != FOOTER:
+                raise ValueError(f"{path}: unexpected {trailing} trailing bytes {tail!r} (expected {FOOTER!r})")
+            self.has_footer = True
+        else:
+            raise ValueError(f"{path}: size {size} is not a whole number of {FRAME_BYTES}-byte frames")
+
+        if self.n_frames:
+            self._mmap = np.memmap(path, dtype=np.uint8, mode='r', shape=(self.n_frames, IMG_HEIGHT, ROW_BYTES))
+        else:
+            self._mmap = np.empty((0, IMG_HEIGHT, ROW_BYTES), dtype=np.uint8)
+
+    @property
+    def frames(self):
+        """Packed (n_frames, 512, 64) memory-mapped array."""
+        return self._mmap
+
+    def __len__(self):
+        return self.n_frames
+
+    def __getitem__(self, key):
+        return self._mmap[key]
+
+    def unpack(self, key):
+        """Returns the 1-bit frame(s) at key unpacked and in the exported orientation."""
+        return unpack_frames(self._mmap[key])
+
+    def close(self):
+        # the mapping is released once the views handed out are no longer referenced either
+        self._mmap = np.empty((0, IMG_HEIGHT, ROW_BYTES), dtype=np.uint8)
+        self.n_frames = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __repr__(self):
+        return f"SpadBinFile('{self.path}', n_frames={self.n_frames})"
+
+def slice_frames(source, key):
+    """
+    Packed frames source[key] for a slice with any step, negative ones included. source is a
+    SpadAcquisition or a SpadContainer (anything with n_frames, offsets, locate() and window()).
+    With a step, each file or chunk is only sliced for the frames it holds, and only the selected
+    frames are copied.
+    """
+    frames = range(*key.indices(source.n_frames))
+    if not frames:
+        return np.empty((0, IMG_HEIGHT, ROW_BYTES), dtype=np.uint8)
+    ascending = frames if frames.step > 0 else frames[::-1]
+    lo, hi, step = ascending[0], ascending[-1] + 1, ascending.step
+
+    if step == 1:
+        packed = source.window(lo, hi)
+    else:
+        parts = []
+        for k in range(source.locate(lo)[0], source.locate(hi - 1)[0] + 1):
+            s, e = max(lo, int(source.offsets[k])), min(hi, int(source.offsets[k + 1]))
+            first = s + (lo - s) % step # first selected frame of file/chunk k
+            if first < e:
+                parts.append(source.window(first, e)[::step])
+        packed = parts[0] if len(parts) == 1 else np.concatenate(parts)
+    return packed if frames.step > 0 else packed[::-1]
+
+class SpadAcquisition:
+    """
+    All the .bin files of a single acquisition folder (e.g. acq0000X) seen as one continuous sequence
+    of packed 1-bit frames. Files are sorted by name and memory-mapped lazily by the OS, so indexing
+    a frame or a window only touches the bytes of those frames.
+    """
+
+    def __init__(self, folder, pattern="RAW*.bin"):
+        if not os.path.isdir(folder):
+            raise FileNotFoundError(f"Input directory '{folder}' does not exist.")
+
+        self.folder = folder
+        paths = sorted(glob.glob(os.path.join(folder, pattern)))
+        if not paths:
+            raise FileNotFoundError(f"No files matching '{pattern}' found in directory '{folder}'.")
+
+        self.files = [SpadBinFile(p) for p in paths]
+        # offsets[k] is the global index of the first frame in files[k]
+        self.offsets = np.concatenate(([0], np.cumsum([len(f) for f in self.files])))
+        self.n_frames = int(self.offsets[-1])
+
+    def __len__(self):
+        return self.n_frames
+
+    def locate(self, index):
+        """Returns (file number, local frame index) of the global frame index."""
+        if index < 0:
+            index += self.n_frames
+        if not 0 <= index < self.n_frames:
+            raise IndexError(f"frame {index} out of range for acquisition with {self.n_frames} frames")
+        k = int(np.searchsorted(self.offsets, index, side='right')) - 1
+        return k, index - int(self.offsets[k])
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return slice_frames(self, key)
+
+        k, i = self.locate(int(key))
+        return self.files[k][i]
+
+    def frame_timestamp(self, index):
+        """Timestamp of the frame, taken from the modification time of its .bin file (as export_spad_frames.m)"""
+        return os.path.getmtime(self.files[self.locate(index)[0]].path)
+
+    def window(self, start, stop):
+        """
+        Packed frames [start, stop). Returns a view if the window lies within one file, otherwise only
+        the frames of the window are copied into a new array.
+        """
+        start = max(0, start)
+        stop = min(stop, self.n_frames)
+        if stop <= start:
+            return np.empty((0, IMG_HEIGHT, ROW_BYTES), dtype=np.uint8)
+
+        k0 = int(np.searchsorted(self.offsets, start, side='right')) - 1
+        k1 = int(np.searchsorted(self.offsets, stop - 1, side='right')) - 1
+        if k0 == k1:
+            o = int(self.offsets[k0])
+            return self.files[k0][start - o:stop - o]
+
+        parts = []
+        for k in range(k0, k1 + 1):
+            o = int(self.offsets[k])
+            parts.append(self.files[k][max(start - o, 0):min(stop - o, len(self.files[k]))])
+        return np.concatenate(parts)
+
+    def iter_chunks(self, chunk_frames=1000, start=0, stop=None):
+        """Yields (first frame index, packed frames) for consecutive windows of at most chunk_frames."""
+        stop = self.n_frames if stop is None else min(stop, self.n_frames)
+        for s in range(start, stop, chunk_frames):
+            yield s, self.window(s, min(s + chunk_frames, stop))
+
+    def unpack(self, key):
+        """Returns the 1-bit frame(s) at key unpacked and in the exported orientation."""
+        return unpack_frames(self[key])
+
+    def close(self):
+        for f in self.files:
+            f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __repr__(self):
+        return f"SpadAcquisition('{self.folder}', files={len(self.files)}, n_frames={self.n_frames})"
+
+def open_acquisition(path, pattern="RAW*.bin"):
+    """
+    Opens either an acquisition folder of .bin files (SpadAcquisition) or a single .spad container
+    (SpadContainer, see spad_container.py). Both give the same frame access interface.
+    """
+    if os.path.isfile(path):
+        from spad_container import SpadContainer
+        return SpadContainer(path)
+    return SpadAcquisition(path, pattern)
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+'''
+Last updated: 2026-Oct-17
+
+Sparse photon-event representation of 1-bit SPAD512S frames, for low-light (e.g. dark lunar) scenes
+where most pixels of a frame are zero.
+
+SparseFrames keeps, for n frames, the flat pixel index (row * 512 + column, in the orientation of the
+packed frames, uint32) of every detected photon, frame after frame and sorted within each frame, and
+an offsets array of n + 1 entries: the events of frame k are indices[offsets[k]:offsets[k + 1]]. A
+frame costs 4 bytes per photon instead of 32 KB packed, so it is smaller below a density of 1/32
+(3.1% of the pixels, ~8200 photons per frame).
+
+Frames are converted from packed frames (from_packed) by only expanding the non-zero bytes, and back
+(to_packed). Windows of frames are views (window), and photon counts are summed straight from the
+events with np.bincount (sum), in the same exported orientation as count_photons (see digitize_bin.py).
+bench_sparse.py measures the density below which this is faster than dense summation. Containers
+can store their chunks as events (spad_container.py, compression 'sparse'; SpadContainer.sparse_chunk).
+
+Example:
+    with open_acquisition('./data/intensity_images/acq00001') as acq:
+        sparse = SparseFrames.from_packed(acq.window(0, 1000))
+    counts = sparse.window(0, 255).sum()
+    python sparse_frames.py -f ./data/intensity_images/acq00001 -o ./acq00001_sparse.npz
+
+'''
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+from spad_reader import open_acquisition, IMG_WIDTH, IMG_HEIGHT, ROW_BYTES, FRAME_BYTES
+
+FRAME_PIXELS = IMG_WIDTH * IMG_HEIGHT
+_BIT_MASKS = np.array([0x80 >> b for b in range(8)], dtype=np.uint8) # bit 7 (MSB) is the first pixel, as in np.unpackbits
+
+class SparseFrames:
+    """Photon events of n 1-bit frames: sorted flat pixel indices per frame (indices) and n + 1 offsets"""
+
+    def __init__(self, indices, offsets):
+        self.indices = np.asarray(indices, dtype=np.uint32)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        if self.offsets[0] != 0 or self.offsets[-1] != len(self.indices):
+            raise ValueError("The offsets do not match the number of events")
+
+    @classmethod
+    def from_packed(cls, packed):
+        """Events of packed frames of shape (n, 512, 64) or (512, 64); only non-zero bytes are expanded"""
+        packed = np.ascontiguousarray(packed, dtype=np.uint8).reshape(-1, FRAME_BYTES)
+        flat = packed.reshape(-1)
+        nonzero = np.flatnonzero(flat)
+        byte_idx, bit = np.nonzero(flat[nonzero, np.newaxis] & _BIT_MASKS)
+        events = nonzero[byte_idx] * 8 + bit # global bit index, sorted
+        frames = events // FRAME_PIXELS
+        offsets = np.searchsorted(frames, np.arange(len(packed) + 1))
+        return cls((events - frames * FRAME_PIXELS).astype(np.uint32), offsets)
+
+    @classmethod
+    def from_acquisition(cls, path, pattern="RAW*.bin", start=0, stop=None, chunk_frames=1020):
+        """Events of the frames [start, stop) of a stored acquisition (.bin folder or .spad container)"""
+        parts = []
+        with open_acquisition(path, pattern) as acq:
+            for _, packed in acq.iter_chunks(chunk_frames, start, stop):
+                parts.append(cls.from_packed(packed))
+        return cls.concatenate(parts)
+
+    @classmethod
+    def concatenate(cls, parts):
+        if not parts:
+            return cls(np.zeros(0, dtype=np.uint32), np.zeros(1, dtype=np.int64))
+        counts = np.concatenate([np.diff(p.offsets) for p in parts])
+        return cls(np.concatenate([p.indices for p in parts]), np.concatenate(([0], np.cumsum(counts))))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, k):
+        """Events (flat pixel indices) of frame k"""
+        k = range(len(self))[k]
+        return self.indices[self.offsets[k]:self.offsets[k + 1]]
+
+    def window(self, start, stop):
+        """Frames [start, stop) as SparseFrames, sharing the events"""
+        start, stop, _ = slice(start, stop).indices(len(self))
+        stop = max(start, stop)
+        offsets = self.offsets[start:stop + 1]
+        return SparseFrames(self.indices[offsets[0]:offsets[-1]], offsets - offsets[0])
+
+    def sum(self, rotate=True):
+        """uint32 photon counts (512, 512) of all the frames, in the exported orientation if rotate is True"""
+        counts = np.bincount(self.indices, minlength=FRAME_PIXELS).astype(np.uint32).reshape(IMG_HEIGHT, IMG_WIDTH)
+        return np.rot90(counts) if rotate else counts
+
+    def to_packed(self):
+        """Packed frames (n, 512, 64)"""
+        bits = np.zeros(len(self) * FRAME_PIXELS, dtype=np.uint8)
+        frames = np.repeat(np.arange(len(self), dtype=np.int64), np.diff(self.offsets))
+        bits[frames * FRAME_PIXELS + self.indices] = 1
+        return np.packbits(bits).reshape(len(self), IMG_HEIGHT, ROW_BYTES)
+
+    @property
+    def density(self):
+        """Fraction of the pixels with a photon"""
+        return len(self.indices) / max(len(self) * FRAME_PIXELS, 1)
+
+    @property
+    def nbytes(self):
+        return self.indices.nbytes + self.offsets.nbytes
+
+    def save(self, path):
+        np.savez(path, indices=self.indices, offsets=self.offsets)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data['indices'], data['offsets'])
+
+    def __repr__(self):
+        return f"SparseFrames(n_frames={len(self)}, events={len(self.indices)}, density={self.density:.4f})"
+
+def main():
+    parser = argparse.ArgumentParser(description="user input")
+    parser.add_argument('-f', '--folder', type=str, help="Acquisition folder containing the .bin files, or .spad container", required=True)
+    parser.add_argument('-o', '--output', type=str, help="Output .npz (default: <folder>/sparse_frames.npz)", required=False, default=None)
+    parser.add_argument('-p', '--pattern', type=str, help="File pattern of the .bin files", required=False, default="RAW*.bin")
+
+    args = parser.parse_args()
+
+    start = time.time()
+    try:
+        sparse = SparseFrames.from_acquisition(args.folder, args.pattern)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    print("Conversion time: ", "{:.2f}".format((time.time() - start)*1000), " ms")
+    print(f"{len(sparse)} frames, density {sparse.density:.4f}, {sparse.nbytes / 1e6:.2f} MB sparse vs {len(sparse) * FRAME_BYTES / 1e6:.2f} MB packed")
+    if sparse.density >= 1 / 32:
+        print("Warning: above 1/32 density the sparse events are larger than the packed frames")
+
+    base = args.folder if os.path.isdir(args.folder) else os.path.splitext(args.folder)[0]
+    output = args.output or os.path.join(base, 'sparse_frames.npz')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    sparse.save(output)
+    print(f"Events saved as '{output}'")
+
+if __name__ == "__main__":
+    main()
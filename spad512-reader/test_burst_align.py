@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from spad_reader import unpack_frames
+from digitize_bin import count_photons
+from burst_align import subburst_sums, fit_linear, align_burst
+
+def moving_frames(n, velocity, seed=0):
+    """
+    Packed frames of a random block scene moving velocity (dy, dx) px per frame in the packed
+    orientation, and the photon probability of the scene at the middle frame
+    """
+    rng = np.random.default_rng(seed)
+    scene = 0.02 + 0.4 * np.kron(rng.random((38, 38)) < 0.5, np.ones((16, 16)))[:600, :600] # 16 px blocks
+    frames = np.empty((n, 512, 64), dtype=np.uint8)
+    positions = [np.rint(44 + np.multiply(velocity, i - n // 2)).astype(int) for i in range(n)]
+    for i, (y, x) in enumerate(positions):
+        frames[i] = np.packbits(rng.random((512, 512)) < scene[y:y + 512, x:x + 512], axis=-1)
+    return frames, scene[44:556, 44:556]
+
+def test_subburst_sums():
+    frames, _ = moving_frames(40, (0, 0))
+    sums, n = subburst_sums(frames, 15)
+    assert n.tolist() == [15, 15, 10]
+    bits = unpack_frames(frames, rotate=False)
+    for j, (a, b) in enumerate([(0, 15), (15, 30), (30, 40)]):
+        assert np.array_equal(sums[j], bits[a:b].sum(axis=0))
+
+def test_fit_linear():
+    times = np.array([7.5, 22.5, 37.5, 52.5, 67.5])
+    shifts = np.outer(times - times[2], [0.2, -0.1])
+    weights = np.ones(5)
+    assert np.allclose(fit_linear(shifts, times, 2, weights), shifts)
+    weights[[0, 4]] = 0 # only the inner shifts count
+    noisy = shifts.copy()
+    noisy[[0, 4]] += 5
+    assert np.allclose(fit_linear(noisy, times, 2, weights), shifts)
+    assert np.array_equal(fit_linear(shifts, times, 2, np.zeros(5)), np.zeros((5, 2)))
+
+def test_static_scene():
+    frames, _ = moving_frames(255, (0, 0))
+    counts, shifts = align_burst(frames, sub_frames=15, tiles=2)
+    assert shifts.shape == (2, 2, 17, 2) and np.all(np.abs(shifts) < 0.5)
+    assert np.array_equal(counts, count_photons(frames).astype(np.float32))
+
+@pytest.mark.parametrize("motion", ["linear", "free"])
+def test_moving_scene(motion):
+    # 0.1 px per frame: 25 px of blur over the block without compensation
+    frames, middle = moving_frames(255, (0, 0.1))
+    counts, shifts = align_burst(frames, sub_frames=15, motion=motion)
+    expected = np.rot90(middle) * 255
+    plain = count_photons(frames)
+    assert np.abs(counts - expected).mean() < 0.7 * np.abs(plain - expected).mean()
+    # the view moves +0.1 px/frame, so the content shifts by (0, -0.1) raw, i.e. (0.1, 0) exported
+    velocity = np.diff(shifts[0, 0], axis=0).mean(axis=0) / 15
+    assert velocity == pytest.approx([0.1, 0], abs=0.02)
+
+def test_invalid():
+    frames, _ = moving_frames(30, (0, 0))
+    with pytest.raises(ValueError):
+        align_burst(frames, motion="affine")
+    with pytest.raises(ValueError):
+        align_burst(frames, sub_frames=256)
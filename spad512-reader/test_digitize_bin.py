@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from spad_reader import SpadAcquisition, unpack_frames, IMG_HEIGHT, ROW_BYTES, FOOTER
+from digitize_bin import count_photons, image_starts, sliding_counts
+
+def random_frames(n, density=0.3, seed=0):
+    """n packed 1-bit frames with about `density` of the pixels set"""
+    rng = np.random.default_rng(seed)
+    return np.packbits(rng.random((n, IMG_HEIGHT, ROW_BYTES * 8)) < density, axis=-1)
+
+@pytest.mark.parametrize("n", [1, 7, 255, 256, 600])
+def test_count_photons(n):
+    packed = random_frames(n)
+    expected = unpack_frames(packed).sum(axis=0)
+    counts = count_photons(packed)
+    assert counts.dtype == np.uint16
+    assert np.array_equal(counts, expected)
+
+def test_count_photons_saturated():
+    # every bit set in more than 255 frames: the byte lanes must not carry into each other
+    packed = np.full((300, IMG_HEIGHT, ROW_BYTES), 0xFF, dtype=np.uint8)
+    assert np.all(count_photons(packed) == 300)
+
+def test_count_photons_single_frame():
+    packed = random_frames(1)
+    assert np.array_equal(count_photons(packed[0]), unpack_frames(packed[0]))
+
+def test_image_starts():
+    assert image_starts(1000, 8).tolist() == [0, 255, 510]
+    assert image_starts(1000, 4).tolist() == [0, 256, 512, 768]
+    assert image_starts(1000, 8, stride=16, num_images=3).tolist() == [0, 16, 32]
+    assert len(image_starts(100, 8)) == 0
+
+@pytest.mark.parametrize("window, stride, chunk_frames", [(15, 4, 10), (15, 15, 7), (7, 10, 64), (31, 1, 1020)])
+def test_sliding_counts(tmp_path, window, stride, chunk_frames):
+    packed = random_frames(90, density=0.05, seed=1)
+    for k, (a, b) in enumerate([(0, 20), (20, 53), (53, 90)]): # windows straddle the files and chunks
+        (tmp_path / f"RAW{k:05d}.bin").write_bytes(packed[a:b].tobytes() + FOOTER)
+    bits = unpack_frames(packed)
+
+    with SpadAcquisition(str(tmp_path)) as acq:
+        images = list(sliding_counts(acq, window, stride, chunk_frames=chunk_frames))
+    starts = list(range(0, 90 - window + 1, stride))
+    assert [(k, start) for k, start, _ in images] == list(enumerate(starts))
+    for _, start, counts in images:
+        assert np.array_equal(counts, bits[start:start + window].sum(axis=0))
+
+def test_sliding_counts_num_images(tmp_path):
+    packed = random_frames(40, density=0.05)
+    (tmp_path / "RAW00000.bin").write_bytes(packed.tobytes() + FOOTER)
+    with SpadAcquisition(str(tmp_path)) as acq:
+        assert [start for _, start, _ in sliding_counts(acq, 15, 5, num_images=3)] == [0, 5, 10]
+        assert list(sliding_counts(acq, 41, 5)) == []
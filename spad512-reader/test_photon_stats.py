@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from spad_reader import unpack_frames, FOOTER
+from photon_stats import PhotonStats
+
+def random_bits(n, p=0.05, seed=0):
+    """n frames of 1-bit pixels (packed orientation, unpacked) firing with probability p"""
+    return np.random.default_rng(seed).random((n, 512, 512)) < p
+
+def test_chunked_update():
+    bits = random_bits(70)
+    packed = np.packbits(bits, axis=-1)
+    stats = PhotonStats(block_frames=16)
+    for a, b in [(0, 5), (5, 40), (40, 41), (41, 70)]: # chunks straddle the blocks
+        stats.update(packed[a:b])
+    r = stats.result()
+
+    unpacked = unpack_frames(packed).astype(np.int64)
+    assert r['n_frames'] == 70 and r['n_blocks'] == 4
+    assert np.array_equal(r['counts'], unpacked.sum(axis=0)) # including the incomplete last block
+    assert np.array_equal(r['frame_totals'], bits.reshape(70, -1).sum(axis=1))
+
+    blocks = unpacked[:64].reshape(4, 16, 512, 512).sum(axis=1)
+    assert np.allclose(r['block_variance'], blocks.var(axis=0, ddof=1), atol=1e-4)
+    # binomial shot noise only: the variance ratio is close to 1 on average
+    assert np.mean(r['variance_ratio']) == pytest.approx(1, abs=0.05)
+
+def test_batch_with_footer():
+    packed = np.packbits(random_bits(3), axis=-1)
+    stats = PhotonStats()
+    stats.update(np.frombuffer(packed.tobytes() + FOOTER, dtype=np.uint8))
+    assert stats.n_frames == 3
+    assert np.array_equal(stats.result()['counts'], unpack_frames(packed).sum(axis=0))
+
+def test_hot_dead_pixels():
+    bits = random_bits(400)
+    bits[:, 100, 200] = True # hot
+    bits[::2, 300, 40] = True # half the frames: hot too
+    bits[:, 10, 10] = False # dead
+    stats = PhotonStats(exposure_us=0.1)
+    stats.update(np.packbits(bits, axis=-1))
+    r = stats.result()
+
+    hot, dead = np.zeros((512, 512), dtype=bool), np.zeros((512, 512), dtype=bool)
+    hot[100, 200] = hot[300, 40] = True
+    dead[10, 10] = True
+    assert np.array_equal(r['hot'], np.rot90(hot)) # exported orientation, as the counts
+    assert np.array_equal(r['dead'], np.rot90(dead))
+
+    # pile-up corrected rate: p = 1 - exp(-rate * exposure), capped for pixels firing in every frame
+    assert np.median(r['rate']) == pytest.approx(-np.log(1 - 0.05) / 0.1e-6, rel=0.05)
+    assert np.isfinite(r['rate']).all()
+
+def test_save(tmp_path):
+    stats = PhotonStats(block_frames=4)
+    stats.update(np.packbits(random_bits(10), axis=-1))
+    stats.save(tmp_path / "stats.npz")
+    with np.load(tmp_path / "stats.npz") as data:
+        assert data['counts'].shape == (512, 512) and int(data['n_blocks']) == 2
+    assert "10 frames" in stats.summary()
+
+def test_block_frames():
+    with pytest.raises(ValueError):
+        PhotonStats(block_frames=0)
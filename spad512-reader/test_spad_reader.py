@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+
+from spad_reader import SpadAcquisition, FRAME_BYTES, FOOTER
+from spad_container import SpadContainer, SpadContainerWriter, CODECS, zstandard
+
+def write_batches(folder, sizes):
+    """RAW .bin files of sizes frames each; frame i is filled with the byte i"""
+    n = 0
+    for k, size in enumerate(sizes):
+        frames = np.repeat(np.arange(n, n + size, dtype=np.uint8), FRAME_BYTES)
+        (folder / f"RAW{k:05d}.bin").write_bytes(frames.tobytes() + FOOTER)
+        n += size
+    return n
+
+@pytest.fixture
+def acq(tmp_path):
+    write_batches(tmp_path, [5, 7, 4])
+    with SpadAcquisition(str(tmp_path)) as acq:
+        yield acq
+
+@pytest.fixture(params=["none", "zlib"])
+def container(tmp_path, request):
+    write_batches(tmp_path, [5, 7, 4])
+    with SpadAcquisition(str(tmp_path)) as acq, SpadContainerWriter(str(tmp_path / "acq.spad"), compression=request.param) as w:
+        for f in acq.files:
+            w.append(f.frames)
+    with SpadContainer(str(tmp_path / "acq.spad")) as container:
+        yield container
+
+SLICES = [slice(None, None, -1), slice(None, None, 3), slice(5, 0, -1), slice(1, 15, 4),
+          slice(-2, None, -5), slice(3, 9), slice(9, 3), slice(2, 14, 20)]
+
+@pytest.mark.parametrize("key", SLICES)
+def test_slices(acq, key):
+    expected = np.arange(len(acq))[key]
+    assert np.array_equal(acq[key][:, 0, 0], expected)
+
+@pytest.mark.parametrize("key", SLICES)
+def test_container_slices(container, key):
+    expected = np.arange(len(container))[key]
+    assert np.array_equal(container[key][:, 0, 0], expected)
+
+CONTAINER_CODECS = ["none", "zlib", "sparse",
+                    pytest.param("zstd", marks=pytest.mark.skipif(zstandard is None, reason="zstandard not installed"))]
+
+def sparse_batches(sizes, density=0.01, seed=0):
+    rng = np.random.default_rng(seed)
+    return [np.packbits(rng.random((n, 512, 512)) < density, axis=-1) for n in sizes]
+
+@pytest.mark.parametrize("compression", CONTAINER_CODECS)
+def test_container_codecs(tmp_path, compression):
+    batches = sparse_batches([3, 5, 2])
+    path = str(tmp_path / "acq.spad")
+    with SpadContainerWriter(path, {'exposure_us': 0.1}, compression=compression) as w:
+        for k, batch in enumerate(batches):
+            assert w.append(batch.tobytes() + FOOTER, timestamp=100.0 + k) == sum(len(b) for b in batches[:k])
+
+    frames = np.concatenate(batches)
+    with SpadContainer(path) as container:
+        assert container.metadata['exposure_us'] == 0.1
+        assert list(container.index['codec']) == [CODECS[compression]] * 3
+        assert np.array_equal(container[:], frames)
+        assert np.array_equal(container.window(2, 9), frames[2:9])
+        assert container.frame_timestamp(4) == 101.0
+        for k, batch in enumerate(batches):
+            assert np.array_equal(container.sparse_chunk(k).to_packed(), batch)
+
+def test_container_incompressible(tmp_path):
+    # dense random frames do not compress: stored as they are
+    batch = sparse_batches([2], density=0.5)[0]
+    with SpadContainerWriter(str(tmp_path / "acq.spad"), compression="sparse") as w:
+        w.append(batch)
+    with SpadContainer(str(tmp_path / "acq.spad")) as container:
+        assert container.index['codec'][0] == CODECS["none"]
+        assert np.array_equal(container[:], batch)
+
+def test_container_unclosed_append(tmp_path):
+    batches = sparse_batches([3, 4, 2])
+    path = str(tmp_path / "acq.spad")
+    w = SpadContainerWriter(path, compression="zlib")
+    w.append(batches[0])
+    w.append(batches[1])
+    w._f.close() # crashed before close(): no index
+    with SpadContainer(path) as container:
+        assert np.array_equal(container[:], np.concatenate(batches[:2]))
+
+    with SpadContainerWriter(path, compression="zlib") as w2:
+        assert w2.append(batches[2]) == 7
+    with SpadContainer(path) as container:
+        assert len(container.index) == 3
+        assert np.array_equal(container[:], np.concatenate(batches))
+
+def test_container_bad_batch(tmp_path):
+    with SpadContainerWriter(str(tmp_path / "acq.spad")) as w:
+        with pytest.raises(ValueError):
+            w.append(b"x" * (FRAME_BYTES + 10))
+    with pytest.raises(ValueError):
+        SpadContainerWriter(str(tmp_path / "other.spad"), compression="lzma")
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from spad_reader import unpack_frames, IMG_HEIGHT, ROW_BYTES
+from digitize_bin import count_photons
+from sparse_frames import SparseFrames
+
+@pytest.fixture
+def packed():
+    rng = np.random.default_rng(0)
+    frames = np.packbits(rng.random((12, IMG_HEIGHT, ROW_BYTES * 8)) < 0.01, axis=-1)
+    frames[3] = 0 # an empty frame
+    frames[7, 0, 0] = 0x80 # first pixel
+    frames[7, -1, -1] |= 0x01 # last pixel
+    return frames
+
+def test_round_trip(packed):
+    sparse = SparseFrames.from_packed(packed)
+    assert len(sparse) == len(packed)
+    assert len(sparse[3]) == 0
+    assert np.array_equal(sparse.to_packed(), packed)
+    assert sparse.density == pytest.approx(unpack_frames(packed).mean())
+
+def test_events(packed):
+    sparse = SparseFrames.from_packed(packed)
+    for k in range(len(packed)):
+        expected = np.flatnonzero(unpack_frames(packed[k], rotate=False))
+        assert np.array_equal(sparse[k], expected)
+
+def test_window_sum(packed):
+    sparse = SparseFrames.from_packed(packed)
+    window = sparse.window(2, 9)
+    assert len(window) == 7
+    assert np.array_equal(window.to_packed(), packed[2:9])
+    assert np.array_equal(window.sum(), count_photons(packed[2:9]))
+    assert np.array_equal(window.sum(rotate=False), unpack_frames(packed[2:9], rotate=False).sum(axis=0))
+    assert len(sparse.window(9, 2)) == 0
+
+def test_concatenate(packed):
+    parts = [SparseFrames.from_packed(packed[a:b]) for a, b in [(0, 5), (5, 6), (6, 12)]]
+    sparse = SparseFrames.concatenate(parts)
+    assert np.array_equal(sparse.offsets, SparseFrames.from_packed(packed).offsets)
+    assert np.array_equal(sparse.to_packed(), packed)
+    assert len(SparseFrames.concatenate([])) == 0
+
+def test_save_load(packed, tmp_path):
+    sparse = SparseFrames.from_packed(packed)
+    sparse.save(tmp_path / "events.npz")
+    loaded = SparseFrames.load(tmp_path / "events.npz")
+    assert np.array_equal(loaded.indices, sparse.indices)
+    assert np.array_equal(loaded.offsets, sparse.offsets)
+
+def test_bad_offsets():
+    with pytest.raises(ValueError):
+        SparseFrames(np.arange(5), [0, 2, 4])